@@ -0,0 +1,69 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Learns a cache schedule from recorded director cycles.
+"""
+
+import json
+import sys
+
+from oslo_config import cfg
+
+from arsenal.common import service as arsenal_service
+from arsenal.director import recorder
+from arsenal.strategy import cache_schedule
+
+CONF = cfg.CONF
+
+cli_opts = [
+    cfg.StrOpt('schedule_history',
+               positional=True,
+               help='A recording made by arsenal-director with the '
+                    '[director] record_file option set. Covering at least a '
+                    'week gives every hour of the week its own target.'),
+    cfg.FloatOpt('coverage_hours',
+                 default=1.0,
+                 help='How many hours of typical demand each flavor\'s '
+                      'scheduled cache should cover.'),
+    cfg.FloatOpt('max_scheduled_percentage',
+                 default=0.5,
+                 help='The highest percentage to cache to schedule.'),
+    cfg.StrOpt('schedule_output',
+               help='Where to write the schedule. Printed if unset.'),
+]
+
+CONF.register_cli_opts(cli_opts)
+
+
+def main():
+    # Parse config file and command line options, then start logging
+    arsenal_service.prepare_service(sys.argv)
+
+    if not CONF.schedule_history:
+        sys.exit("A recording to learn from is required.")
+
+    schedule = cache_schedule.learn_schedule(
+        recorder.read_cycles(CONF.schedule_history),
+        coverage_hours=CONF.coverage_hours,
+        max_percentage=CONF.max_scheduled_percentage)
+    if CONF.schedule_output:
+        with open(CONF.schedule_output, 'w') as outfile:
+            json.dump(schedule, outfile, indent=4, sort_keys=True)
+    else:
+        json.dump(schedule, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write('\n')
@@ -0,0 +1,122 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Replays recorded director cycles through the configured strategy.
+"""
+
+import sys
+import time
+
+from oslo_config import cfg
+
+from arsenal.common import service as arsenal_service
+from arsenal.common import util
+from arsenal.director import recorder
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_schedule
+
+CONF = cfg.CONF
+
+cli_opts = [
+    cfg.StrOpt('recording',
+               positional=True,
+               help='A recording made by arsenal-director with the '
+                    '[director] record_file option set.'),
+    cfg.BoolOpt('verbose_cycles',
+                default=False,
+                help='Print a line for every replayed cycle, not just the '
+                     'totals.'),
+]
+
+CONF.register_cli_opts(cli_opts)
+
+
+def _directive_key(directive):
+    return (directive.name, directive.node_uuid,
+            getattr(directive, 'image_uuid', None))
+
+
+def replay_cycle(strat, cycle):
+    """Feed one recorded cycle through strat, at the time it was recorded
+    so time-dependent decisions, such as cache schedules and failure
+    backoff, are made as they were.
+
+    :returns: A dict comparing the replayed directives to the recorded ones.
+    """
+    clock = util.now.clock
+    if cycle.time:
+        clock = util.VirtualClock(cache_schedule.parse_time(cycle.time))
+    with util.use_clock(clock):
+        start = time.time()
+        strat.update_current_state(cycle.nodes, cycle.images, cycle.flavors)
+        directives = strat.directives()
+        elapsed = time.time() - start
+
+    recorded = set(map(_directive_key, cycle.directives))
+    replayed = set(map(_directive_key, directives))
+    return {
+        'seconds': elapsed,
+        'recorded': len(cycle.directives),
+        'replayed': len(directives),
+        'cache': len([d for d in directives if isinstance(d, sb.CacheNode)]),
+        'eject': len([d for d in directives if isinstance(d, sb.EjectNode)]),
+        'matching': len(recorded & replayed),
+    }
+
+
+def replay(strat, cycles, output=sys.stdout, verbose=False):
+    """Replay cycles through strat, writing a report to output.
+
+    Cache directives only match the recording when the same image is chosen
+    for the same node, so strategies choosing at random rarely match exactly.
+
+    :returns: A dict of totals over every cycle.
+    """
+    totals = {'cycles': 0, 'seconds': 0.0, 'recorded': 0, 'replayed': 0,
+              'cache': 0, 'eject': 0, 'matching': 0}
+    for cycle in cycles:
+        result = replay_cycle(strat, cycle)
+        totals['cycles'] += 1
+        for key, value in result.items():
+            totals[key] += value
+        if verbose:
+            result.update(time=cycle.time, nodes=len(cycle.nodes))
+            output.write(
+                "%(time)s: %(nodes)d node(s), %(recorded)d recorded and "
+                "%(replayed)d replayed directive(s), %(matching)d matching, "
+                "%(seconds).3fs\n" % result)
+
+    output.write(
+        "Replayed %(cycles)d cycle(s) in %(seconds).3fs of strategy time.\n"
+        "Recorded directives: %(recorded)d\n"
+        "Replayed directives: %(replayed)d (%(cache)d cache, %(eject)d "
+        "eject)\n"
+        "Matching directives: %(matching)d\n" % totals)
+    return totals
+
+
+def main():
+    # Parse config file and command line options, then start logging
+    arsenal_service.prepare_service(sys.argv)
+
+    if not CONF.recording:
+        sys.exit("A recording to replay is required.")
+
+    strat = sb.get_configured_strategy()
+    replay(strat, recorder.read_cycles(CONF.recording),
+           verbose=CONF.verbose_cycles)
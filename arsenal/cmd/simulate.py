@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Simulates arsenal-director against a synthetic or recorded fleet.
+"""
+
+import logging
+import sys
+import time
+
+from oslo_config import cfg
+
+from arsenal.common import service as arsenal_service
+from arsenal.director import recorder
+from arsenal.director import simulator
+from arsenal.director import synthetic_scout
+from arsenal.strategy import base as sb
+
+CONF = cfg.CONF
+
+cli_opts = [
+    cfg.FloatOpt('duration_days',
+                 default=7,
+                 help='How many days of director operation to simulate.'),
+    cfg.StrOpt('fleet_recording',
+               help='Start from the first cycle of a recording made with the '
+                    '[director] record_file option, instead of a fleet '
+                    'generated from the [synthetic_scout] options.'),
+    cfg.FloatOpt('steady_state_tolerance',
+                 default=0.1,
+                 help='How far, as a fraction, the number of cached nodes '
+                      'may stray from its final level once steady.'),
+]
+
+CONF.register_cli_opts(cli_opts)
+
+
+def build_fleet():
+    if CONF.fleet_recording:
+        # Image weights drive demand for recorded fleets.
+        sb.init_image_weights()
+        first_cycle = next(recorder.read_cycles(CONF.fleet_recording))
+        return synthetic_scout.SyntheticScout.from_cycle(first_cycle)
+    return synthetic_scout.SyntheticScout()
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return 'never'
+    return '%.1f hour(s)' % (seconds / 3600.0)
+
+
+def write_report(report, wall_seconds, output=sys.stdout):
+    steady_hit_rate = report['steady_state_hit_rate']
+    output.write(
+        "Simulated %(days).2f day(s) in %(wall).2fs, %(cycles)d cycle(s).\n"
+        "Nodes provisioned: %(provisioned)d\n"
+        "Cache hit rate: %(hit_rate).1f%%, %(steady_hit_rate)s once "
+        "steady\n"
+        "Cache directives: %(cache)d (%(cache_per_day).1f per day)\n"
+        "Eject directives: %(eject)d (%(eject_per_day).1f per day)\n"
+        "Time to steady state: %(steady)s\n"
+        "Cached nodes at the end: %(cached)d\n" % {
+            'days': report['simulated_seconds'] / 86400.0,
+            'wall': wall_seconds,
+            'cycles': report['cycles'],
+            'provisioned': report['provisioned'],
+            'hit_rate': report['hit_rate'] * 100,
+            'steady_hit_rate': ('%.1f%%' % (steady_hit_rate * 100)
+                                if steady_hit_rate is not None else 'n/a'),
+            'cache': report['cache_directives'],
+            'cache_per_day': report['cache_directives_per_day'],
+            'eject': report['eject_directives'],
+            'eject_per_day': report['eject_directives_per_day'],
+            'steady': _format_seconds(report['time_to_steady_state']),
+            'cached': report['final_cached_nodes'],
+        })
+
+
+def main():
+    # Parse config file and command line options, then start logging
+    arsenal_service.prepare_service(sys.argv)
+    if not CONF.debug:
+        # Strategies log every cycle, which drowns out the report.
+        logging.getLogger('arsenal').setLevel(logging.WARNING)
+
+    # Directives only ever reach the simulated fleet, and simulated cycles
+    # must not be mixed into real recordings.
+    CONF.set_override('dry_run', False, 'director')
+    CONF.set_override('record_file', None, 'director')
+    CONF.set_override('log_statistics', False, 'director')
+
+    started = time.time()
+    sim = simulator.Simulator(build_fleet())
+    sim.run(CONF.duration_days * 86400)
+    write_report(sim.report(CONF.steady_state_tolerance),
+                 time.time() - started)
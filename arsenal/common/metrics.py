@@ -0,0 +1,153 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process counters and histograms, labelled by things like image and
+flavor, which can be logged or written out as JSON.
+"""
+
+from __future__ import division
+
+import bisect
+import json
+
+import six
+
+# Upper bounds, in seconds, of the buckets cache latencies fall into.
+LATENCY_BUCKETS = (30, 60, 120, 300, 600, 900, 1200, 1800, 3600, 7200)
+
+
+def _label_key(labels):
+    return tuple(sorted(six.iteritems(labels or {})))
+
+
+def _label_string(key):
+    return ','.join('%s=%s' % pair for pair in key)
+
+
+class Counter(object):
+    """Counts events, separately for each set of labels."""
+    def __init__(self, name, description=''):
+        self.name = name
+        self.description = description
+        self.values = {}
+
+    def inc(self, labels=None, amount=1):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, labels=None):
+        return self.values.get(_label_key(labels), 0)
+
+    def as_dict(self):
+        return dict((_label_string(key), value)
+                    for key, value in six.iteritems(self.values))
+
+
+class HistogramSeries(object):
+    """Observations of a histogram for one set of labels."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One more count than buckets, for observations above the last.
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket holding it.
+
+        Observations above the last bucket are estimated as the last bound.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return float(self.buckets[-1])
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'buckets': dict(zip(bounds, self.counts)),
+                'count': self.count,
+                'sum': self.sum}
+
+
+class Histogram(object):
+    """Counts observations falling into buckets, separately for each set of
+    labels.
+    """
+    def __init__(self, name, buckets, description=''):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.description = description
+        self.series = {}
+
+    def observe(self, value, labels=None):
+        key = _label_key(labels)
+        if key not in self.series:
+            self.series[key] = HistogramSeries(self.buckets)
+        self.series[key].observe(value)
+
+    def get(self, labels=None):
+        """The HistogramSeries for labels, or None if nothing was observed."""
+        return self.series.get(_label_key(labels))
+
+    def as_dict(self):
+        return dict((_label_string(key), series.as_dict())
+                    for key, series in six.iteritems(self.series))
+
+
+class Registry(object):
+    """Holds metrics by name, creating them on first use."""
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name, description=''):
+        if name not in self.metrics:
+            self.metrics[name] = Counter(name, description)
+        return self.metrics[name]
+
+    def histogram(self, name, buckets, description=''):
+        if name not in self.metrics:
+            self.metrics[name] = Histogram(name, buckets, description)
+        return self.metrics[name]
+
+    def as_dict(self):
+        return dict((name, metric.as_dict())
+                    for name, metric in six.iteritems(self.metrics))
+
+    def write(self, filename):
+        """Write every metric to filename as JSON, replacing it."""
+        with open(filename, 'w') as outfile:
+            json.dump(self.as_dict(), outfile, indent=2, sort_keys=True)
+
+    def clear(self):
+        self.metrics = {}
+
+
+# Metrics gathered by the director.
+registry = Registry()
@@ -17,12 +17,14 @@
 
 import datetime
 
+from arsenal.common import util
+
 ZERO_DELTA = datetime.timedelta()
 
 
 # NOTE(ClifHouck): Wrapper function for datetime.now() to make it mockable.
 def now():
-    return datetime.datetime.now()
+    return util.now()
 
 
 class RateLimiter(object):
@@ -41,6 +41,8 @@ class ArsenalService(service.Service):
         super(ArsenalService, self).start()
         LOG.info('Started Arsenal service.')
         self.tg.add_dynamic_timer(self.scheduler.periodic_tasks, context={})
+        self.tg.add_timer(CONF.director.credential_refresh_spacing,
+                          self.scheduler.refresh_credentials)
 
     def stop(self):
         super(ArsenalService, self).stop(graceful=True)
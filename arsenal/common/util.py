@@ -15,11 +15,69 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import calendar
+import contextlib
+import datetime
 import importlib
 
 from arsenal.common import exception
 
 
+# Wrapper function for datetime.now() to make it mockable.
+def now():
+    if now.clock is not None:
+        return now.clock()
+    return datetime.datetime.now()
+
+now.clock = None
+
+
+@contextlib.contextmanager
+def use_clock(clock):
+    """Make now() return clock() instead of the wall clock.
+
+    Used to run the director on simulated time.
+
+    :param clock: A callable returning a naive datetime.
+    """
+    previous_clock = now.clock
+    now.clock = clock
+    try:
+        yield clock
+    finally:
+        now.clock = previous_clock
+
+
+class VirtualClock(object):
+    """A clock which only moves when told to."""
+
+    def __init__(self, start=None):
+        self.current = start or datetime.datetime(2016, 1, 1)
+
+    def __call__(self):
+        return self.current
+
+    def advance(self, seconds):
+        self.current += datetime.timedelta(seconds=seconds)
+
+    def advance_to(self, when):
+        if when > self.current:
+            self.current = when
+
+
+def to_local_naive_datetime(value):
+    """Convert a datetime to a naive datetime in local time.
+
+    Timezone aware datetimes are converted to local time. Naive datetimes are
+    assumed to already be in local time, matching now(), and are returned
+    unchanged.
+    """
+    if value.tzinfo is None or value.utcoffset() is None:
+        return value
+    return datetime.datetime.fromtimestamp(
+        calendar.timegm(value.utctimetuple()))
+
+
 class ImportModuleException(exception.ArsenalException):
     msg_fmt = ("Couldn't import module '%(module_name)s', with package "
                "'%(package)s'")
@@ -0,0 +1,225 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures whether cached images are actually deployed."""
+
+from __future__ import division
+
+import collections
+
+from oslo_log import log
+import six
+
+from arsenal.common import metrics
+
+LOG = log.getLogger(__name__)
+
+CACHE_SECONDS_BY_IMAGE = 'cache_seconds_by_image'
+CACHE_SECONDS_BY_FLAVOR = 'cache_seconds_by_flavor'
+CACHE_FAILURES = 'cache_failures'
+
+
+class HitStats(object):
+    """Cache outcomes for one image or flavor.
+
+    deployments - Nodes deployed, where the deployed image is known.
+    hits - Deployments onto a node which had that image cached.
+    wasted - Cached images discarded without being deployed, because the
+        node was deployed with another image, ejected or recached.
+    """
+    def __init__(self):
+        self.deployments = 0
+        self.hits = 0
+        self.wasted = 0
+
+    def hit_rate(self):
+        if self.deployments == 0:
+            return 0.0
+        return self.hits / self.deployments
+
+    def as_dict(self):
+        return {'deployments': self.deployments,
+                'hits': self.hits,
+                'wasted': self.wasted,
+                'hit_rate': self.hit_rate()}
+
+
+class CacheHitTracker(object):
+    """Follows nodes from one director cycle to the next.
+
+    An unprovisioned node cached with image X which shows up provisioned
+    with X as its deployed image is a hit. Provisioned with another image
+    it is a miss, and the download of X was wasted. So is a cache which
+    disappears or changes image while the node is unprovisioned. Nodes
+    provisioned without a known deployed image, such as nodes which went
+    into maintenance, are not counted as deployments.
+    """
+    def __init__(self):
+        # Cached image uuid by node uuid, for every unprovisioned node seen
+        # last cycle. Uncached nodes map to ''.
+        self.previous = None
+        self.image_stats = collections.defaultdict(HitStats)
+        self.flavor_stats = collections.defaultdict(HitStats)
+
+    def _cached_image(self, node):
+        if node.cached and node.cached_image_uuid:
+            return node.cached_image_uuid
+        return ''
+
+    def _record(self, node, was_cached):
+        """Count what happened to a node which was unprovisioned.
+
+        :returns: True if the node was deployed with a known image.
+        """
+        deployed = False
+        if node.provisioned:
+            if node.deployed_image_uuid:
+                deployed = True
+                hit = was_cached == node.deployed_image_uuid
+                for stats in (self.image_stats[node.deployed_image_uuid],
+                              self.flavor_stats[node.flavor]):
+                    stats.deployments += 1
+                    if hit:
+                        stats.hits += 1
+                if hit:
+                    return deployed
+        elif self._cached_image(node) == was_cached:
+            # Nothing happened to this node's cache.
+            return deployed
+        if was_cached:
+            self.image_stats[was_cached].wasted += 1
+            self.flavor_stats[node.flavor].wasted += 1
+        return deployed
+
+    def update(self, nodes):
+        """Count the transitions since the previous call.
+
+        The first call only establishes which nodes are cached.
+
+        :returns: A list of the nodes deployed since the previous call.
+        """
+        current = {}
+        deployed = []
+        for node in nodes:
+            if self.previous is not None:
+                was_cached = self.previous.get(node.node_uuid)
+                if (was_cached is not None and
+                        self._record(node, was_cached)):
+                    deployed.append(node)
+            if not node.provisioned:
+                current[node.node_uuid] = self._cached_image(node)
+        self.previous = current
+        return deployed
+
+    def totals(self):
+        """Sum the outcomes over every flavor."""
+        total = HitStats()
+        for stats in six.itervalues(self.flavor_stats):
+            total.deployments += stats.deployments
+            total.hits += stats.hits
+            total.wasted += stats.wasted
+        return total
+
+    def image_report(self, images=()):
+        """Return outcomes by image name, or uuid for unknown images.
+
+        :param images: ImageInput objects used to name images.
+        """
+        names = dict((image.uuid, image.name) for image in images)
+        return dict((names.get(uuid) or uuid, stats.as_dict())
+                    for uuid, stats in six.iteritems(self.image_stats))
+
+    def flavor_report(self):
+        """Return outcomes by flavor name."""
+        return dict((name, stats.as_dict())
+                    for name, stats in six.iteritems(self.flavor_stats))
+
+    def log_report(self, images=()):
+        """Log outcomes overall, by flavor and by image."""
+        def log_stats(label, stats):
+            LOG.info("    %(label)s: %(hits)d hit(s) in %(deployments)d "
+                     "deployment(s) (%(rate).1f%%), %(wasted)d wasted "
+                     "download(s)",
+                     {'label': label, 'hits': stats['hits'],
+                      'deployments': stats['deployments'],
+                      'rate': stats['hit_rate'] * 100,
+                      'wasted': stats['wasted']})
+
+        LOG.info("Cache hit statistics since startup:")
+        log_stats('overall', self.totals().as_dict())
+        LOG.info("Cache hit statistics by flavor:")
+        for name, stats in sorted(six.iteritems(self.flavor_report())):
+            log_stats(name, stats)
+        LOG.info("Cache hit statistics by image:")
+        for name, stats in sorted(six.iteritems(self.image_report(images))):
+            log_stats(name, stats)
+
+
+def record_cache_outcomes(outcomes, images=(), registry=None):
+    """Record how long caching took, and how often it failed, by image and
+    by flavor.
+
+    :param outcomes: CacheOutcome tuples, as returned by
+        arsenal.strategy.cache_tracking.CacheTimeTracker.update.
+    :param images: ImageInput objects used to name images.
+    :param registry: The metrics Registry to record to. Defaults to the
+        director's.
+    """
+    registry = registry or metrics.registry
+    names = dict((image.uuid, image.name) for image in images)
+    by_image = registry.histogram(CACHE_SECONDS_BY_IMAGE,
+                                  metrics.LATENCY_BUCKETS,
+                                  'Seconds from cache directive to cached.')
+    by_flavor = registry.histogram(CACHE_SECONDS_BY_FLAVOR,
+                                   metrics.LATENCY_BUCKETS,
+                                   'Seconds from cache directive to cached.')
+    failures = registry.counter(CACHE_FAILURES,
+                                'Cache directives which failed.')
+    for outcome in outcomes:
+        image = names.get(outcome.image_uuid) or outcome.image_uuid
+        flavor = outcome.node.flavor
+        if outcome.succeeded:
+            by_image.observe(outcome.seconds, {'image': image})
+            by_flavor.observe(outcome.seconds, {'flavor': flavor})
+        else:
+            failures.inc({'image': image, 'flavor': flavor})
+
+
+def log_cache_latency(registry=None):
+    """Log cache completion latency and failures by flavor and by image."""
+    registry = registry or metrics.registry
+    failures = collections.defaultdict(int)
+    counter = registry.metrics.get(CACHE_FAILURES)
+    if counter is not None:
+        for key, count in six.iteritems(counter.values):
+            for label in key:
+                failures[label] += count
+
+    for name, kind in ((CACHE_SECONDS_BY_FLAVOR, 'flavor'),
+                       (CACHE_SECONDS_BY_IMAGE, 'image')):
+        histogram = registry.metrics.get(name)
+        if histogram is None:
+            continue
+        LOG.info("Cache completion latency by %s:", kind)
+        for key, series in sorted(six.iteritems(histogram.series)):
+            LOG.info("    %(label)s: %(count)d cached, mean %(mean).0fs, "
+                     "p50 <= %(p50).0fs, p90 <= %(p90).0fs, %(failed)d "
+                     "failed",
+                     {'label': key[0][1], 'count': series.count,
+                      'mean': series.mean(), 'p50': series.quantile(0.5),
+                      'p90': series.quantile(0.9),
+                      'failed': failures[key[0]]})
@@ -0,0 +1,188 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.common import exception
+from arsenal.common import util
+from arsenal.director import openstack_scout
+from arsenal.director import scout
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.ListOpt('member_scouts',
+                default=[],
+                help='The scouts to run side by side in one director, as a '
+                     'comma separated list of module_name.ClassName strings. '
+                     'Each member must derive from OpenstackScout. Ironic, '
+                     'Nova and Glance are listed once per cycle and the '
+                     'listings are shared by every member.'),
+]
+
+composite_scout_group = cfg.OptGroup(name='composite_scout',
+                                     title='Composite Scout Options')
+
+CONF = cfg.CONF
+CONF.register_group(composite_scout_group)
+CONF.register_opts(opts, composite_scout_group)
+
+
+class NoMemberScoutsError(exception.ArsenalException):
+    msg_fmt = ("CompositeScout requires at least one member scout. Set "
+               "member_scouts in the [composite_scout] section.")
+
+
+class UnsupportedMemberScoutError(exception.ArsenalException):
+    msg_fmt = ("Member scout '%(member)s' does not derive from "
+               "OpenstackScout, so it can't share listings with other "
+               "member scouts.")
+
+
+def load_member_scout(module_class_string):
+    loader = util.LoadClass(module_class_string,
+                            package_prefix='arsenal.director')
+    return loader.loaded_class()
+
+
+def _dedupe(items, attr_name):
+    """Return items without repeats of attr_name, keeping the first seen."""
+    seen = set()
+    unique_items = []
+    for item in items:
+        key = getattr(item, attr_name)
+        if key not in seen:
+            seen.add(key)
+            unique_items.append(item)
+    return unique_items
+
+
+class CompositeScout(scout.Scout):
+    """Runs several OpenstackScout filters off one set of listings.
+
+    Nodes, flavors and images are fetched once per poll through the clients
+    of the first member, which every member shares, and then handed to each
+    member's filters. Each member owns the flavors its flavor filter accepts,
+    the nodes of those flavors, and the images its image filter accepts.
+    Directives are issued through the member owning the node.
+    """
+    def __init__(self, member_scouts=None):
+        if member_scouts is None:
+            member_scouts = CONF.composite_scout.member_scouts
+        if not member_scouts:
+            raise NoMemberScoutsError()
+
+        self.member_names = list(member_scouts)
+        self.members = []
+        for name in self.member_names:
+            member = load_member_scout(name)
+            if not isinstance(member, openstack_scout.OpenstackScout):
+                raise UnsupportedMemberScoutError(member=name)
+            self.members.append(member)
+
+        # Every member talks through the same clients, so tokens, sessions
+        # and cached responses are shared as well as the listings.
+        primary = self.members[0]
+        for member in self.members[1:]:
+            member.ironic_client = primary.ironic_client
+            member.nova_client = primary.nova_client
+            member.glance_client = primary.glance_client
+        self.primary = primary
+
+        self.member_flavor_names = [set() for member in self.members]
+        self.member_image_uuids = [set() for member in self.members]
+        self.node_owners = {}
+
+        LOG.info("Composite scout running member scouts: %(members)s",
+                 {'members': ', '.join(self.member_names)})
+
+    def retrieve_node_data(self):
+        """Get information about nodes to pass to a CachingStrategy object.
+
+        """
+        ironic_nodes = list(self.primary.fetch_node_listing())
+        node_owners = {}
+        all_nodes = []
+        for member, flavor_names in zip(self.members,
+                                        self.member_flavor_names):
+            for node in member.filter_node_data(ironic_nodes):
+                # A member may resolve nodes of other members' flavors, but
+                # only keeps nodes of flavors it owns.
+                if (node.flavor not in flavor_names or
+                        node.node_uuid in node_owners):
+                    continue
+                node_owners[node.node_uuid] = member
+                all_nodes.append(node)
+        self.node_owners = node_owners
+        return all_nodes
+
+    def retrieve_flavor_data(self):
+        """Get information about flavors to pass to a CachingStrategy object.
+
+        """
+        nova_flavors = list(self.primary.fetch_flavor_listing())
+        all_flavors = []
+        for index, member in enumerate(self.members):
+            flavors = member.filter_flavor_data(nova_flavors)
+            self.member_flavor_names[index] = sb.build_attribute_set(
+                flavors, 'name')
+            all_flavors.extend(flavors)
+        return _dedupe(all_flavors, 'name')
+
+    def retrieve_image_data(self):
+        """Get information about images to pass to a CachingStrategy object.
+
+        """
+        glance_images = list(self.primary.fetch_image_listing())
+        all_images = []
+        for index, member in enumerate(self.members):
+            images = member.filter_image_data(glance_images)
+            self.member_image_uuids[index] = sb.build_attribute_set(
+                images, 'uuid')
+            all_images.extend(images)
+        return _dedupe(all_images, 'uuid')
+
+    def partition(self, nodes, images, flavors):
+        """Split strategy inputs by the member scout that owns them.
+
+        :returns: A list of (member_name, nodes, images, flavors) tuples, one
+            per member scout, in configured order.
+        """
+        partitions = []
+        for name, flavor_names, image_uuids in zip(self.member_names,
+                                                   self.member_flavor_names,
+                                                   self.member_image_uuids):
+            partitions.append((
+                name,
+                [node for node in nodes if node.flavor in flavor_names],
+                [image for image in images if image.uuid in image_uuids],
+                [flavor for flavor in flavors if flavor.name in flavor_names]))
+        return partitions
+
+    def issue_action(self, action):
+        owner = self.node_owners.get(getattr(action, 'node_uuid', None))
+        if owner is None:
+            LOG.error("No member scout owns the node targeted by "
+                      "'%(action)s'. Doing nothing.", {'action': action})
+            return
+        return owner.issue_action(action)
+
+    def refresh_credentials(self):
+        """Reauthorize the shared clients whose tokens are about to expire."""
+        self.primary.refresh_credentials()
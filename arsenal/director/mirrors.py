@@ -0,0 +1,150 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Spreads image downloads over mirrors of Glance, nearest first."""
+
+import datetime
+import json
+
+from oslo_log import log
+import six
+
+from arsenal.common import exception
+from arsenal.common import util
+
+LOG = log.getLogger(__name__)
+
+
+class InvalidMirrorConfigError(exception.ArsenalException):
+    msg_fmt = "Invalid image mirror configuration: %(reason)s"
+
+
+class MirrorSet(object):
+    """Orders the URLs a node should download an image from.
+
+    Mirrors preferred for the node's topology domain come first, then every
+    other mirror, then Glance itself as a last resort. Within each tier,
+    mirrors with the fewest downloads outstanding come first. Ties keep the
+    domain's order of preference, or else go by mirror name.
+
+    A download is outstanding from when a node is told to cache until it has
+    reported caching and then finished or failed, or is provisioned. A node
+    which never reports caching is given up on after a timeout.
+    """
+    def __init__(self, mirrors, locality=None, timeout=0):
+        """Constructs a MirrorSet object.
+
+        :param: mirrors - A dict of mirror names to base URLs, which image
+            file paths are appended to exactly as they are to the Glance
+            endpoint.
+        :param: locality - A dict of topology domains to lists of preferred
+            mirror names, nearest first.
+        :param: timeout - Seconds to count a download for a node which
+            hasn't reported caching, or 0 to wait indefinitely.
+        """
+        locality = locality or {}
+        for domain, names in six.iteritems(locality):
+            unknown = set(names) - set(mirrors)
+            if unknown:
+                raise InvalidMirrorConfigError(
+                    reason="domain '%s' prefers unknown mirror(s) %s." % (
+                        domain, ', '.join(sorted(unknown))))
+        self.mirrors = mirrors
+        self.names = sorted(mirrors)
+        self.locality = locality
+        self.timeout = timeout
+        # The mirror each node was sent to first, by node uuid.
+        self.downloads = {}
+        # When each download was issued, by node uuid.
+        self.issued = {}
+        # Nodes which have reported caching since their download was issued.
+        self.seen_caching = set()
+
+    def outstanding(self):
+        """Outstanding downloads by mirror name."""
+        counts = dict((name, 0) for name in self.names)
+        for name in six.itervalues(self.downloads):
+            counts[name] += 1
+        return counts
+
+    def order(self, topology=''):
+        """Mirror names in the order a node in topology should try them."""
+        counts = self.outstanding()
+        preferred = self.locality.get(topology, [])
+        rest = [name for name in self.names if name not in preferred]
+        return (sorted(preferred, key=lambda name: counts[name]) +
+                sorted(rest, key=lambda name: counts[name]))
+
+    def urls(self, node_uuid, image_path, glance_endpoint, topology=''):
+        """The URLs a node should download image_path from, in order.
+
+        The node's download is counted against the first mirror.
+        """
+        names = self.order(topology)
+        if names:
+            self.downloads[node_uuid] = names[0]
+            self.issued[node_uuid] = util.now()
+            self.seen_caching.discard(node_uuid)
+        return ([self.mirrors[name] + image_path for name in names] +
+                [glance_endpoint + image_path])
+
+    def update(self, nodes):
+        """Stop counting downloads which are no longer outstanding.
+
+        Until a node reports caching, its status may still be from before
+        the download was issued, so only the timeout releases it.
+
+        :param nodes: NodeInput objects, including every node downloading.
+        """
+        nodes = dict((node.node_uuid, node) for node in nodes)
+        expired = None
+        if self.timeout:
+            expired = util.now() - datetime.timedelta(seconds=self.timeout)
+        for node_uuid in list(self.downloads):
+            node = nodes.get(node_uuid)
+            if node is None or node.provisioned:
+                self._release(node_uuid)
+            elif node.is_caching():
+                self.seen_caching.add(node_uuid)
+            elif node_uuid in self.seen_caching:
+                self._release(node_uuid)
+            elif expired is not None and self.issued[node_uuid] <= expired:
+                LOG.info("Node %(node)s never reported caching from mirror "
+                         "%(mirror)s, no longer counting its download.",
+                         {'node': node_uuid,
+                          'mirror': self.downloads[node_uuid]})
+                self._release(node_uuid)
+
+    def _release(self, node_uuid):
+        del self.downloads[node_uuid]
+        del self.issued[node_uuid]
+        self.seen_caching.discard(node_uuid)
+
+
+def load_mirrors(filename, timeout=0):
+    """Load a MirrorSet from a JSON file of the form::
+
+        {"mirrors": {"<name>": "<base url>", ...},
+         "locality": {"<topology domain>": ["<name>", ...], ...}}
+
+    timeout is passed on to the MirrorSet.
+    """
+    with open(filename, 'r') as infile:
+        config = json.load(infile)
+    if not config.get('mirrors'):
+        raise InvalidMirrorConfigError(reason="no mirrors are listed.")
+    return MirrorSet(config['mirrors'], config.get('locality'), timeout)
@@ -39,8 +39,13 @@ def get_pyrax_token(**kwargs):
     pyrax.set_setting('identity_type', 'rackspace')
     pyrax.set_setting('auth_endpoint', kwargs.get('auth_url'))
     pyrax.set_credentials(kwargs.get('username'), kwargs.get('password'))
+    # Publish the token's expiry so the Glance client wrapper can refresh it
+    # before it lapses.
+    get_pyrax_token.expires = pyrax.identity.expires
     return pyrax.identity.auth_token
 
+get_pyrax_token.expires = None
+
 
 KNOWN_V1_FLAVORS = {
     'onmetal-compute1': lambda node: node.properties['memory_mb'] == 32768,
@@ -22,16 +22,45 @@ from oslo_log import log
 import six
 
 from arsenal.common import exception as exc
+from arsenal.director import mirrors
 from arsenal.director import scout
 import arsenal.external.glance_client_wrapper as gcw
 import arsenal.external.ironic_client_wrapper as icw
+from arsenal.external import keystone_session
 import arsenal.external.nova_client_wrapper as ncw
 from arsenal.strategy import base as sb
 
 
 LOG = log.getLogger(__name__)
 
+opts = [
+    cfg.StrOpt('topology_key',
+               help='The key naming the failure domain of each node, such '
+                    'as its rack or switch, looked up in the Ironic node\'s '
+                    'properties, then its extra, then its own fields, such '
+                    'as conductor_group. Used by topology aware node '
+                    'selection. Unset by default, placing every node in '
+                    'one domain.'),
+    cfg.StrOpt('mirrors_filename',
+               help='The name of a JSON file listing mirrors of Glance '
+                    'image files, and which mirrors each topology domain '
+                    'prefers. Cache directives then list mirror URLs '
+                    'nearest and least busy first, with Glance last.'),
+    cfg.IntOpt('mirror_download_timeout',
+               default=3600,
+               min=0,
+               help='Seconds a download is counted against its mirror when '
+                    'the node never reports caching, after which the '
+                    'directive is assumed lost. 0 counts it until the node '
+                    'reports.'),
+]
+
+openstack_scout_group = cfg.OptGroup(name='openstack_scout',
+                                     title='Openstack Scout Options')
+
 CONF = cfg.CONF
+CONF.register_group(openstack_scout_group)
+CONF.register_opts(opts, openstack_scout_group)
 
 
 def is_node_provisioned(ironic_node):
@@ -44,6 +73,10 @@ def is_node_provisioned(ironic_node):
     return provision_state != 'available' or ironic_node.maintenance
 
 
+def get_node_cache_status(ironic_node):
+    return ironic_node.driver_info.get('cache_status') or ''
+
+
 def is_node_cached(ironic_node):
     cache_status = ironic_node.driver_info.get('cache_status')
     if cache_status is None or cache_status == 'failed':
@@ -56,6 +89,29 @@ def get_node_cached_image_uuid(ironic_node):
     return ironic_node.driver_info.get('cache_image_id') or ''
 
 
+def get_node_deployed_image_uuid(ironic_node):
+    if not is_node_provisioned(ironic_node):
+        return ''
+    instance_info = getattr(ironic_node, 'instance_info', None) or {}
+    return instance_info.get('image_source') or ''
+
+
+def get_node_topology(ironic_node):
+    key = CONF.openstack_scout.topology_key
+    if not key:
+        return ''
+    for source in ('properties', 'extra'):
+        value = (getattr(ironic_node, source, None) or {}).get(key)
+        if value is not None:
+            return six.text_type(value)
+    value = getattr(ironic_node, key, None)
+    return six.text_type(value) if value is not None else ''
+
+
+def get_node_conductor(ironic_node):
+    return getattr(ironic_node, 'conductor', None) or ''
+
+
 def resolve_flavor(ironic_node, known_flavors=None):
     """Attempt to identify the flavor of an ironic node.
 
@@ -100,13 +156,18 @@ def convert_ironic_node(ironic_node, known_flavors=None):
                         flavor_name,
                         is_node_provisioned(ironic_node),
                         is_node_cached(ironic_node),
-                        get_node_cached_image_uuid(ironic_node))
+                        get_node_cached_image_uuid(ironic_node),
+                        get_node_deployed_image_uuid(ironic_node),
+                        get_node_topology(ironic_node),
+                        get_node_cache_status(ironic_node),
+                        get_node_conductor(ironic_node))
 
 
 def convert_glance_image(glance_image):
     return sb.ImageInput(glance_image.get('name'),
                          glance_image.get('id'),
-                         glance_image.get('checksum'))
+                         glance_image.get('checksum'),
+                         glance_image.get('size'))
 
 
 def convert_nova_flavor(nova_flavor, known_flavors):
@@ -155,8 +216,19 @@ class OpenstackScout(scout.Scout):
         self.ironic_client = icw.IronicClientWrapper()
         self.nova_client = ncw.NovaClientWrapper()
         self.glance_client = gcw.GlanceClientWrapper(glance_auth_token_func)
+        if not CONF.client_wrapper.use_shared_session:
+            LOG.info("Ironic and Nova tokens are only refreshed ahead of "
+                     "expiry with [client_wrapper] use_shared_session. They "
+                     "will be reauthorized once they expire instead.")
         self.glance_data = []
         self.known_flavors = copy.deepcopy(known_flavors)
+        self.mirrors = None
+        if CONF.openstack_scout.mirrors_filename:
+            self.mirrors = mirrors.load_mirrors(
+                CONF.openstack_scout.mirrors_filename,
+                CONF.openstack_scout.mirror_download_timeout)
+        # Topology domains of the nodes last listed, by node uuid.
+        self.node_topology = {}
 
         def curried_convert_ironic_node(ironic_node):
             return convert_ironic_node(ironic_node, self.known_flavors)
@@ -168,20 +240,35 @@ class OpenstackScout(scout.Scout):
 
         self.curried_convert_nova_flavor = curried_convert_nova_flavor
 
-    def retrieve_node_data(self):
-        """Get information about nodes to pass to a CachingStrategy object.
+    def fetch_node_listing(self):
+        """Fetch the raw Ironic node listing, unfiltered."""
+        return self.ironic_client.call_iter("node.list", limit=0, detail=True)
 
-        """
-        node_list = self.ironic_client.call("node.list", limit=0, detail=True)
-        return list(filter(lambda n: n is not None,
-                    map(self.curried_convert_ironic_node, node_list)))
+    def fetch_flavor_listing(self):
+        """Fetch the raw Nova flavor listing, unfiltered."""
+        return self.nova_client.call("flavors.list")
 
-    def retrieve_flavor_data(self):
-        """Get information about flavors to pass to a CachingStrategy object.
+    def fetch_image_listing(self):
+        """Fetch the raw Glance image listing, unfiltered."""
+        return self.glance_client.call_iter("images.list")
+
+    def filter_node_data(self, ironic_nodes):
+        """Convert raw Ironic nodes into NodeInput objects.
 
+        Nodes whose flavor can't be identified are dropped.
         """
-        flavor_list = list(filter(self.flavor_filter,
-                           self.nova_client.call("flavors.list")))
+        nodes = [node for node in map(self.curried_convert_ironic_node,
+                                      ironic_nodes)
+                 if node is not None]
+        self.node_topology = dict((node.node_uuid, node.topology)
+                                  for node in nodes)
+        if self.mirrors is not None:
+            self.mirrors.update(nodes)
+        return nodes
+
+    def filter_flavor_data(self, nova_flavors):
+        """Filter and convert raw Nova flavors into FlavorInput objects."""
+        flavor_list = list(filter(self.flavor_filter, nova_flavors))
         unknown_flavors = list(filter(
             lambda f: self.known_flavors.get(f.id) is None, flavor_list))
         for flavor in unknown_flavors:
@@ -197,13 +284,43 @@ class OpenstackScout(scout.Scout):
                          'memory': flavor.ram})
         return list(map(self.curried_convert_nova_flavor, flavor_list))
 
+    def filter_image_data(self, glance_images):
+        """Filter and convert raw Glance images into ImageInput objects.
+
+        The raw data of the images kept is remembered for issuing cache
+        directives later.
+        """
+        self.glance_data = list(filter(self.image_filter, glance_images))
+        return list(map(convert_glance_image, self.glance_data))
+
+    def retrieve_node_data(self):
+        """Get information about nodes to pass to a CachingStrategy object.
+
+        """
+        # Convert nodes as they arrive rather than holding the raw listing.
+        return self.filter_node_data(self.fetch_node_listing())
+
+    def retrieve_flavor_data(self):
+        """Get information about flavors to pass to a CachingStrategy object.
+
+        """
+        return self.filter_flavor_data(self.fetch_flavor_listing())
+
     def retrieve_image_data(self):
         """Get information about images to pass to a CachingStrategy object.
 
         """
-        self.glance_data = list(filter(self.image_filter,
-                                       self.glance_client.call("images.list")))
-        return list(map(convert_glance_image, self.glance_data))
+        return self.filter_image_data(self.fetch_image_listing())
+
+    def refresh_credentials(self):
+        """Reauthorize clients whose tokens are about to expire."""
+        if CONF.client_wrapper.use_shared_session:
+            keystone_session.refresh_session()
+        for client in (self.ironic_client, self.nova_client,
+                       self.glance_client):
+            # The shared sessions cover clients which can't report expiry.
+            if client.reports_token_expiry:
+                client.refresh_if_expiring()
 
     def issue_action(self, action):
         # TODO(ClifHouck) I know type-testing is generally not a good pattern,
@@ -241,11 +358,18 @@ class OpenstackScout(scout.Scout):
             return
 
         image_url = glance_image_data.get('file')
+        if self.mirrors is not None:
+            urls = self.mirrors.urls(
+                cache_node_action.node_uuid, image_url,
+                CONF.glance.api_endpoint,
+                self.node_topology.get(cache_node_action.node_uuid, ''))
+        else:
+            urls = [CONF.glance.api_endpoint + image_url]
 
         args = {
             'image_info': {
                 'id': cache_node_action.image_uuid,
-                'urls': [CONF.glance.api_endpoint + image_url],
+                'urls': urls,
                 'checksum': cache_node_action.image_checksum
             }
         }
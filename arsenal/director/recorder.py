@@ -0,0 +1,135 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Records director cycles for replaying through strategies offline.
+
+A recording is a gzip file of JSON lines, one line per director cycle. Every
+cycle is written as its own gzip member appended to the file, so recordings
+can grow for as long as the director runs and a crash loses at most the cycle
+being written.
+
+Nodes are stored as rows holding the NodeInput constructor arguments in
+order, so new NodeInput arguments must only ever be appended. Older
+recordings then still load, with the new arguments taking their defaults.
+"""
+
+import collections
+import gzip
+import json
+
+from oslo_log import log
+
+from arsenal.common import util
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+# NodeInput attributes, in the order of the NodeInput constructor arguments
+# they are passed back as.
+NODE_FIELDS = ('node_uuid', 'flavor', 'provisioned', 'cached',
+               'cached_image_uuid', 'deployed_image_uuid', 'topology',
+               'cache_status', 'conductor')
+
+CACHE = 'cache'
+EJECT = 'eject'
+
+Cycle = collections.namedtuple('Cycle', ['time', 'nodes', 'images',
+                                         'flavors', 'directives'])
+
+
+def snapshot_inputs(nodes, images, flavors):
+    """Capture strategy inputs in their recorded form.
+
+    Must be called before the strategy is asked for directives, since
+    strategies may mark nodes they act on.
+    """
+    return {
+        'time': util.now().isoformat(),
+        'nodes': [[getattr(node, field) for field in NODE_FIELDS]
+                  for node in nodes],
+        'images': [[image.name, image.uuid, image.checksum, image.size]
+                   for image in images],
+        'flavors': [flavor.name for flavor in flavors],
+    }
+
+
+def serialize_directive(directive):
+    if isinstance(directive, sb.CacheNode):
+        return [CACHE, directive.node_uuid, directive.image_uuid,
+                directive.image_checksum]
+    elif isinstance(directive, sb.EjectNode):
+        return [EJECT, directive.node_uuid]
+    return None
+
+
+def deserialize_directive(row):
+    if row[0] == CACHE:
+        return sb.CacheNode(*row[1:])
+    elif row[0] == EJECT:
+        return sb.EjectNode(*row[1:])
+    return None
+
+
+def _flavor_input(name):
+    return sb.FlavorInput(name, lambda node: node.flavor == name)
+
+
+def deserialize_cycle(record):
+    return Cycle(record.get('time'),
+                 [sb.NodeInput(*row) for row in record['nodes']],
+                 [sb.ImageInput(*row) for row in record['images']],
+                 [_flavor_input(name) for name in record['flavors']],
+                 [directive for directive in
+                  map(deserialize_directive, record.get('directives', []))
+                  if directive is not None])
+
+
+def read_cycles(filename):
+    """Yield every Cycle recorded in filename, oldest first."""
+    with gzip.open(filename, 'rb') as recording:
+        for line in recording:
+            line = line.strip()
+            if line:
+                yield deserialize_cycle(json.loads(line.decode('utf-8')))
+
+
+class Recorder(object):
+    """Appends director cycles to a compressed recording."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        LOG.info("Recording director cycles to %(file)s.",
+                 {'file': filename})
+
+    def record(self, snapshot, directives):
+        """Append one cycle to the recording.
+
+        :param snapshot: The cycle's inputs, as returned by snapshot_inputs.
+        :param directives: The StrategyActions the strategy returned.
+        """
+        record = dict(snapshot)
+        record['directives'] = [row for row in
+                                map(serialize_directive, directives)
+                                if row is not None]
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        try:
+            with gzip.open(self.filename, 'ab') as recording:
+                recording.write(line.encode('utf-8'))
+        except (IOError, OSError):
+            # Recording is a diagnostic aid, it must never stop the director.
+            LOG.exception("Failed to record director cycle to %(file)s.",
+                          {'file': self.filename})
@@ -15,13 +15,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log
 from oslo_service import periodic_task
 
+from arsenal.common import metrics
 from arsenal.common import rate_limiter
 from arsenal.common import util
+from arsenal.director import cache_analytics
+from arsenal.director import composite_scout
+from arsenal.director import recorder
 from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.strategy import composite_strategy
 
 LOG = log.getLogger(__name__)
 
@@ -66,11 +74,55 @@ opts = [
                default=300,
                help='Determines the amount of time needed to pass before a '
                     'new rate-limit period for ejection directives begins.'),
+    cfg.IntOpt('max_caching_per_flavor',
+               default=0,
+               min=0,
+               help='The most nodes of one flavor which may be caching an '
+                    'image at once. Cache directives beyond it are dropped '
+                    'until downloads finish. 0 is no limit.'),
+    cfg.IntOpt('max_caching_per_conductor',
+               default=0,
+               min=0,
+               help='The most nodes managed by one Ironic conductor which '
+                    'may be caching an image at once. 0 is no limit.'),
+    cfg.IntOpt('max_skipped_cycles',
+               default=5,
+               min=0,
+               help='The most director cycles in a row which may skip '
+                    'consulting the strategy because the scouted nodes, '
+                    'images and flavors are unchanged since it last returned '
+                    'no directives. Bounded so that time driven behaviour, '
+                    'such as cache schedules and failure backoff, still '
+                    'takes effect. 0 never skips.'),
+    cfg.BoolOpt('incremental_node_updates',
+                default=False,
+                help='When True, strategies which support it are only given '
+                     'the nodes added, changed or removed since the previous '
+                     'cycle, found by comparing each node\'s state by uuid, '
+                     'rather than every node. Strategies which don\'t '
+                     'support it are given every node regardless.'),
+    cfg.IntOpt('credential_refresh_spacing',
+               default=60,
+               help='How long to wait, in seconds, between checks for '
+                    'credentials which are about to expire. Expiring '
+                    'credentials are refreshed in the background so '
+                    'reauthorization does not delay director cycles.'),
+    cfg.StrOpt('record_file',
+               help='When set, every director cycle\'s node, image and '
+                    'flavor data and the directives the strategy returned '
+                    'are appended to this gzip compressed file. Recordings '
+                    'can be fed through any strategy with arsenal-replay.'),
     cfg.BoolOpt('log_statistics',
                 default=True,
                 help='When True, Arsenal will log detailed information about '
                      'the state of nodes returned by the configured Scout. '
-                     'Including a breakdowns by flavor and images.')
+                     'Including a breakdowns by flavor and images, and '
+                     'cache hit rates.'),
+    cfg.StrOpt('metrics_file',
+               help='When set, the director\'s metrics, such as cache '
+                    'completion latency histograms and failure counts by '
+                    'image and flavor, are written to this file as JSON '
+                    'every cycle.'),
 ]
 
 director_group = cfg.OptGroup(name='director',
@@ -82,12 +134,26 @@ CONF.register_group(director_group)
 CONF.register_opts(opts, director_group)
 
 
+# Counts director cycles which skipped the strategy, their inputs unchanged.
+NO_OP_CYCLES = 'director_no_op_cycles'
+
+
 def get_configured_scout():
     loader = util.LoadClass(CONF.director.scout,
                             package_prefix='arsenal.director')
     return loader.loaded_class()
 
 
+def get_strategy_for_scout(scout):
+    """Build the configured strategy, one instance per fleet if the scout
+    runs several fleets.
+    """
+    if isinstance(scout, composite_scout.CompositeScout):
+        return composite_strategy.CompositeStrategy(scout.partition,
+                                                    scout.member_names)
+    return sb.get_configured_strategy()
+
+
 def get_configured_rate_limiter(name, rate_limit, limiting_period):
     if rate_limit == 0:
         LOG.info("%s directives will not be rate limited during this run." %
@@ -137,22 +203,138 @@ def rate_limit_directives(rate_limiter, directives, name, identity_func):
         return directives
 
 
+def limit_caching_in_flight(directives, nodes, max_per_flavor,
+                            max_per_conductor):
+    """Drop cache directives which would take the nodes caching at once,
+    per flavor or per conductor, above their limits.
+
+    :param directives: StrategyActions, in order of priority.
+    :param nodes: NodeInput objects. Nodes reporting a cache in progress
+        count towards the limits.
+    :param max_per_flavor: The most nodes of a flavor caching, 0 for none.
+    :param max_per_conductor: The most nodes of a conductor caching, 0 for
+        none. Nodes with no known conductor aren't limited by it.
+    :returns: The directives admitted, in their original order.
+    """
+    if not max_per_flavor and not max_per_conductor:
+        return directives
+    nodes_by_uuid = dict((node.node_uuid, node) for node in nodes)
+    by_flavor = collections.defaultdict(int)
+    by_conductor = collections.defaultdict(int)
+    for node in nodes:
+        if node.is_caching():
+            by_flavor[node.flavor] += 1
+            if node.conductor:
+                by_conductor[node.conductor] += 1
+
+    admitted = []
+    dropped = 0
+    for directive in directives:
+        node = nodes_by_uuid.get(getattr(directive, 'node_uuid', None))
+        if isinstance(directive, sb.CacheNode) and node is not None:
+            if ((max_per_flavor and
+                 by_flavor[node.flavor] >= max_per_flavor) or
+                    (max_per_conductor and node.conductor and
+                     by_conductor[node.conductor] >= max_per_conductor)):
+                dropped += 1
+                continue
+            by_flavor[node.flavor] += 1
+            if node.conductor:
+                by_conductor[node.conductor] += 1
+        admitted.append(directive)
+    if dropped:
+        LOG.info("Dropped %(num)d cache directive(s) to keep caching in "
+                 "flight within limits.", {'num': dropped})
+    return admitted
+
+
+def node_state(node):
+    """The state of a node which strategies consider."""
+    return tuple(getattr(node, field) for field in recorder.NODE_FIELDS)
+
+
+def diff_nodes(previous_states, nodes):
+    """Compare nodes with the previous cycle's.
+
+    :param previous_states: node_state tuples by node uuid.
+    :param nodes: The current NodeInput objects.
+    :returns: A tuple of the NodeInput objects added and changed, the uuids
+        of nodes removed, and the current node_state tuples by node uuid.
+    """
+    states = {}
+    added = []
+    changed = []
+    for node in nodes:
+        state = node_state(node)
+        states[node.node_uuid] = state
+        previous = previous_states.get(node.node_uuid)
+        if previous is None:
+            added.append(node)
+        elif previous != state:
+            changed.append(node)
+    removed = [uuid for uuid in previous_states if uuid not in states]
+    return added, changed, removed, states
+
+
+def fingerprint_inputs(nodes, images, flavors):
+    """Hash the state of strategy inputs, regardless of their order.
+
+    Must be called before the strategy is asked for directives, since
+    strategies may mark nodes they act on.
+    """
+    return hash((
+        frozenset(node_state(node) for node in nodes),
+        frozenset((image.name, image.uuid, image.checksum, image.size)
+                  for image in images),
+        frozenset(flavor.name for flavor in flavors)))
+
+
 class DirectorScheduler(periodic_task.PeriodicTasks):
     """Arsenal Director Scheduler class."""
 
-    def __init__(self):
+    def __init__(self, scout=None):
+        """Constructs a DirectorScheduler object.
+
+        :param: scout - The Scout object to use. If None, the configured
+            scout is loaded.
+        """
         super(DirectorScheduler, self).__init__(CONF)
         self.node_data = []
         self.image_data = []
         self.flavor_data = []
-        self.strat = sb.get_configured_strategy()
-        self.scout = get_configured_scout()
+        self.scout = scout if scout is not None else get_configured_scout()
+        self.strat = get_strategy_for_scout(self.scout)
         self.cache_rate_limiter = get_configured_cache_rate_limiter()
         self.eject_rate_limiter = get_configured_ejection_rate_limiter()
+        self.cache_hits = cache_analytics.CacheHitTracker()
+        # The inputs the strategy last returned no directives for.
+        self.idle_fingerprint = None
+        self.skipped_cycles = 0
+        # node_state tuples by uuid of the nodes the strategy last saw, when
+        # it is given only the nodes which change.
+        self.node_states = None
+        self.strat_takes_node_changes = (
+            CONF.director.incremental_node_updates and
+            hasattr(self.strat, 'apply_node_changes'))
+        self.recorder = None
+        if CONF.director.record_file:
+            self.recorder = recorder.Recorder(CONF.director.record_file)
 
     def periodic_tasks(self, context, raise_on_error=False):
         return self.run_periodic_tasks(context, raise_on_error)
 
+    def refresh_credentials(self):
+        """Ask the scout to reauthorize credentials ahead of expiry.
+
+        Runs on its own timer, separate from the periodic tasks, so that
+        reauthorization never adds latency to scouting or issuing directives.
+        """
+        try:
+            self.scout.refresh_credentials()
+        except Exception:
+            # Never let an error stop the refresh timer.
+            LOG.exception("Failed to refresh credentials.")
+
     @periodic_task.periodic_task(run_immediately=True,
                                  spacing=CONF.director.poll_spacing)
     def poll_for_flavor_data(self, context):
@@ -183,17 +365,108 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
                                      'eject',
                                      is_eject_directive)
 
+    def track_caching(self):
+        """Time and count failures of caching, keeping the quarantine file
+        in step.
+
+        :returns: CacheOutcome tuples for nodes which finished or failed
+            caching since the previous cycle.
+        """
+        tracker = cache_tracking.cache_times
+        filename = CONF.node_selection.quarantine_file
+        if filename:
+            try:
+                tracker.load_quarantine(filename)
+            except (IOError, OSError, ValueError):
+                LOG.exception("Failed to read quarantined nodes from "
+                              "%(file)s.", {'file': filename})
+        quarantined = set(tracker.quarantined)
+        outcomes = tracker.update(self.node_data)
+        if filename and set(tracker.quarantined) != quarantined:
+            try:
+                tracker.write_quarantine(filename)
+            except (IOError, OSError):
+                LOG.exception("Failed to write quarantined nodes to "
+                              "%(file)s.", {'file': filename})
+        return outcomes
+
+    def write_metrics(self, filename):
+        try:
+            metrics.registry.write(filename)
+        except (IOError, OSError):
+            # Like recording, metrics must never stop the director.
+            LOG.exception("Failed to write metrics to %(file)s.",
+                          {'file': filename})
+
+    def update_strategy(self):
+        """Give the strategy the scouted nodes, images and flavors, only
+        passing the nodes which changed if it supports that.
+        """
+        nodes = self.node_data
+        if self.strat_takes_node_changes:
+            added, changed, removed, states = diff_nodes(
+                self.node_states or {}, self.node_data)
+            if self.node_states is not None:
+                try:
+                    self.strat.apply_node_changes(added, changed, removed)
+                    nodes = None
+                    LOG.debug("Gave the strategy %(added)d added, "
+                              "%(changed)d changed and %(removed)d removed "
+                              "node(s).",
+                              {'added': len(added), 'changed': len(changed),
+                               'removed': len(removed)})
+                except NotImplementedError:
+                    LOG.info("The strategy doesn't support being given "
+                             "only changed nodes, every node will be given "
+                             "to it instead.")
+                    self.strat_takes_node_changes = False
+                    states = None
+            self.node_states = states
+        self.strat.update_current_state(nodes, self.image_data,
+                                        self.flavor_data)
+
+    def strategy_has_pending_work(self):
+        """Whether the strategy may return directives for unchanged inputs
+        once more cycles or time pass, so cycles must not be skipped.
+        """
+        return (self.strat.has_pending_work() or
+                cache_tracking.cache_times.backing_off())
+
+    def skip_unchanged_cycle(self, fingerprint):
+        """Whether the strategy need not be consulted this cycle, because
+        it returned no directives for the same inputs last time.
+        """
+        if (fingerprint != self.idle_fingerprint or
+                self.skipped_cycles >= CONF.director.max_skipped_cycles):
+            self.skipped_cycles = 0
+            return False
+        self.skipped_cycles += 1
+        metrics.registry.counter(
+            NO_OP_CYCLES,
+            'Director cycles which skipped the strategy as nothing '
+            'changed.').inc()
+        return True
+
     @periodic_task.periodic_task(spacing=CONF.director.directive_spacing)
     def issue_directives(self, context):
-        LOG.info("Consulting strategy and issuing directives.")
-
         # NOTE(ClifHouck): It's really important to have node state be as
         # current as possible. So instead of polling for it, I'm leaving it
         # tied to updating the state of the strategy.
         self.node_data = self.scout.retrieve_node_data()
 
-        self.strat.update_current_state(self.node_data, self.image_data,
-                                        self.flavor_data)
+        fingerprint = fingerprint_inputs(self.node_data, self.image_data,
+                                         self.flavor_data)
+        if self.skip_unchanged_cycle(fingerprint):
+            LOG.info("Nodes, images and flavors are unchanged since the "
+                     "strategy last returned no directives. Skipping this "
+                     "cycle.")
+            if CONF.director.metrics_file:
+                self.write_metrics(CONF.director.metrics_file)
+            return
+
+        LOG.info("Consulting strategy and issuing directives.")
+        self.idle_fingerprint = None
+        self.update_strategy()
 
         if CONF.director.log_statistics:
             sb.log_overall_node_statistics(self.node_data,
@@ -219,8 +492,34 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
                       "directives until scouting returns to normal.")
             return
 
+        outcomes = self.track_caching()
+        cache_analytics.record_cache_outcomes(outcomes, self.image_data)
+        deployed = self.cache_hits.update(self.node_data)
+        # Observed demand feeds adaptive image weights.
+        sb.image_demand.record(deployed, self.image_data)
+        if CONF.director.log_statistics:
+            self.cache_hits.log_report(self.image_data)
+            cache_analytics.log_cache_latency()
+        if CONF.director.metrics_file:
+            self.write_metrics(CONF.director.metrics_file)
+
+        snapshot = None
+        if self.recorder is not None:
+            # Snapshot before consulting the strategy, which may mark nodes.
+            snapshot = recorder.snapshot_inputs(self.node_data,
+                                                self.image_data,
+                                                self.flavor_data)
+
         directives = self.strat.directives()
+        if not directives and not self.strategy_has_pending_work():
+            self.idle_fingerprint = fingerprint
+
+        if snapshot is not None:
+            self.recorder.record(snapshot, directives)
 
+        directives = limit_caching_in_flight(
+            directives, self.node_data, CONF.director.max_caching_per_flavor,
+            CONF.director.max_caching_per_conductor)
         directives = self.rate_limit_cache_directives(directives)
         directives = self.rate_limit_eject_directives(directives)
 
@@ -236,5 +535,6 @@ class DirectorScheduler(periodic_task.PeriodicTasks):
             LOG.info("Issuing all directives through configured scout.")
             for directive in directives:
                 self.scout.issue_action(directive)
+            cache_tracking.cache_times.issued(directives)
 
         LOG.info("Finished issuing directives.")
@@ -57,3 +57,12 @@ class Scout(object):
         :param action: A StrategyAction object.
         """
         pass
+
+    def refresh_credentials(self):
+        """Reauthorize any credentials which are about to expire.
+
+        Called periodically by the director, independently of scouting and
+        issuing directives. Scouts without expiring credentials need not
+        override this.
+        """
+        pass
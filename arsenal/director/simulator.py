@@ -0,0 +1,163 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Drives a DirectorScheduler against a SyntheticScout on simulated time."""
+
+from __future__ import division
+
+import collections
+import datetime
+
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.common import util
+from arsenal.director import scheduler
+
+LOG = log.getLogger(__name__)
+
+CONF = cfg.CONF
+
+# One sample is taken after every directive cycle.
+Sample = collections.namedtuple('Sample', ['elapsed', 'provisioned',
+                                           'cache_hits', 'cache_directives',
+                                           'eject_directives',
+                                           'cached_nodes'])
+
+
+def time_to_steady_state(samples, tolerance):
+    """Find when the number of cached nodes settled.
+
+    The steady state level is the mean number of cached nodes over the last
+    quarter of the samples. The fleet is considered steady from the first
+    sample after which every sample stays within tolerance of that level.
+
+    :param samples: A list of Sample objects, in time order.
+    :param tolerance: The allowed deviation, as a fraction of the steady
+        state level. At least one node of deviation is always allowed.
+    :returns: Elapsed seconds until steady state, or None if the fleet
+        never settled.
+    """
+    if not samples:
+        return None
+    tail = samples[-max(1, len(samples) // 4):]
+    level = sum(sample.cached_nodes for sample in tail) / len(tail)
+    allowed = max(1.0, level * tolerance)
+
+    steady_since = None
+    for sample in samples:
+        if abs(sample.cached_nodes - level) <= allowed:
+            if steady_since is None:
+                steady_since = sample.elapsed
+        else:
+            steady_since = None
+    return steady_since
+
+
+class Simulator(object):
+    """Runs the director's periodic tasks on a virtual clock.
+
+    Flavor and image polls and directive cycles run at their configured
+    spacing in simulated time, so days of operation take seconds.
+    """
+    def __init__(self, fleet, clock=None):
+        """Constructs a Simulator object.
+
+        :param: fleet - The SyntheticScout to direct.
+        :param: clock - The VirtualClock to run on. A new one is created if
+            None.
+        """
+        self.fleet = fleet
+        self.clock = clock or util.VirtualClock()
+        self.start = self.clock()
+        self.samples = []
+        with util.use_clock(self.clock):
+            # Rate limiters read the clock when constructed.
+            self.scheduler = scheduler.DirectorScheduler(scout=fleet)
+
+    def _take_sample(self):
+        stats = self.fleet.stats
+        cached_nodes = sum(len(pool) for pools in self.fleet.cached
+                           for pool in pools.values())
+        self.samples.append(Sample(
+            (self.clock() - self.start).total_seconds(),
+            stats['provisioned'], stats['cache_hits'],
+            stats['cache_actions'], stats['eject_actions'], cached_nodes))
+
+    def run(self, duration):
+        """Simulate duration seconds of director operation."""
+        end = self.clock() + datetime.timedelta(seconds=duration)
+        poll_spacing = datetime.timedelta(seconds=CONF.director.poll_spacing)
+        directive_spacing = datetime.timedelta(
+            seconds=CONF.director.directive_spacing)
+        next_poll = self.clock()
+        next_directives = self.clock() + directive_spacing
+
+        with util.use_clock(self.clock):
+            while True:
+                now = min(next_poll, next_directives)
+                if now > end:
+                    break
+                self.clock.advance_to(now)
+                if now == next_poll:
+                    self.scheduler.poll_for_flavor_data(None)
+                    self.scheduler.poll_for_image_data(None)
+                    next_poll += poll_spacing
+                if now == next_directives:
+                    self.scheduler.issue_directives(None)
+                    self._take_sample()
+                    next_directives += directive_spacing
+            self.clock.advance_to(end)
+
+    def report(self, tolerance):
+        """Summarize the simulation so far.
+
+        :param tolerance: See time_to_steady_state.
+        :returns: A dict of results.
+        """
+        stats = self.fleet.stats
+        elapsed = (self.clock() - self.start).total_seconds()
+        days = elapsed / 86400 if elapsed else 0
+        steady = time_to_steady_state(self.samples, tolerance)
+
+        steady_hit_rate = None
+        if steady is not None:
+            before = [sample for sample in self.samples
+                      if sample.elapsed < steady]
+            start_provisioned = before[-1].provisioned if before else 0
+            start_hits = before[-1].cache_hits if before else 0
+            provisioned = stats['provisioned'] - start_provisioned
+            if provisioned:
+                steady_hit_rate = ((stats['cache_hits'] - start_hits) /
+                                   provisioned)
+
+        return {
+            'simulated_seconds': elapsed,
+            'cycles': len(self.samples),
+            'provisioned': stats['provisioned'],
+            'hit_rate': self.fleet.hit_rate(),
+            'steady_state_hit_rate': steady_hit_rate,
+            'cache_directives': stats['cache_actions'],
+            'eject_directives': stats['eject_actions'],
+            'cache_directives_per_day': (stats['cache_actions'] / days
+                                         if days else 0),
+            'eject_directives_per_day': (stats['eject_actions'] / days
+                                         if days else 0),
+            'time_to_steady_state': steady,
+            'final_cached_nodes': (self.samples[-1].cached_nodes
+                                   if self.samples else 0),
+        }
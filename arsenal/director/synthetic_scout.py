@@ -0,0 +1,460 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import division
+
+import bisect
+import datetime
+import random
+
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.common import util
+from arsenal.director import scout
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.IntOpt('node_count',
+               default=1000,
+               help='The number of nodes in the synthetic fleet.'),
+    cfg.IntOpt('flavor_count',
+               default=4,
+               help='The number of flavors nodes are spread evenly across.'),
+    cfg.IntOpt('image_count',
+               default=20,
+               help='The number of images available for provisioning and '
+                    'caching.'),
+    cfg.FloatOpt('image_popularity_skew',
+                 default=1.0,
+                 help='How unevenly provisioning requests are spread across '
+                      'images. The n-th image is requested in proportion to '
+                      '1 / n ** image_popularity_skew, so 0 requests every '
+                      'image equally.'),
+    cfg.FloatOpt('initial_utilization',
+                 default=0.5,
+                 help='The fraction of nodes provisioned when the fleet is '
+                      'generated.'),
+    cfg.FloatOpt('provision_rate',
+                 default=0.05,
+                 help='The fraction of available nodes of each flavor which '
+                      'are provisioned every time node data is retrieved.'),
+    cfg.FloatOpt('release_rate',
+                 default=0.05,
+                 help='The fraction of provisioned nodes of each flavor '
+                      'which are released every time node data is '
+                      'retrieved.'),
+    cfg.IntOpt('cache_latency',
+               default=0,
+               help='Seconds between a cache directive being issued and the '
+                    'image being ready on the node. Provisioning the node '
+                    'before then is a cache miss.'),
+    cfg.IntOpt('eject_latency',
+               default=0,
+               help='Seconds a node is unavailable for after an eject '
+                    'directive, while it is cleaned.'),
+    cfg.IntOpt('seed',
+               help='Seed for the fleet\'s random number generator. Set it to '
+                    'make runs reproducible.'),
+]
+
+synthetic_scout_group = cfg.OptGroup(name='synthetic_scout',
+                                     title='Synthetic Scout Options')
+
+CONF = cfg.CONF
+CONF.register_group(synthetic_scout_group)
+CONF.register_opts(opts, synthetic_scout_group)
+
+NODE_UUID_PREFIX = 'synthetic-node-'
+IMAGE_UUID_PREFIX = 'synthetic-image-'
+FLAVOR_NAME_PREFIX = 'synthetic-flavor-'
+
+# Node states.
+AVAILABLE = 0
+CACHED = 1
+PROVISIONED = 2
+EJECTING = 3
+
+
+def _parse_index(identifier, prefix, count):
+    """Return the index encoded in a synthetic identifier, or None."""
+    if not identifier or not identifier.startswith(prefix):
+        return None
+    try:
+        index = int(identifier[len(prefix):])
+    except ValueError:
+        return None
+    if index < 0 or index >= count:
+        return None
+    return index
+
+
+class SyntheticScout(scout.Scout):
+    """Simulates a fleet of nodes entirely in memory.
+
+    Every time node data is retrieved the fleet advances one step: some
+    provisioned nodes are released and some available nodes are provisioned
+    with an image drawn from a skewed popularity distribution. Provisioning
+    prefers a node which has finished caching the requested image, which
+    counts as a cache hit. Cache and eject actions take effect after the
+    configured latencies, measured with util.now, so the fleet follows a
+    virtual clock when one is in use.
+
+    No external services are contacted, so the scheduler, strategies and
+    directive dispatch can be exercised at any fleet size.
+    """
+    def __init__(self, node_count=None, flavor_count=None, image_count=None,
+                 image_popularity_skew=None, initial_utilization=None,
+                 provision_rate=None, release_rate=None, cache_latency=None,
+                 eject_latency=None, seed=None):
+        group = CONF.synthetic_scout
+
+        def configured(value, name):
+            return getattr(group, name) if value is None else value
+
+        self.node_count = configured(node_count, 'node_count')
+        self.flavor_count = configured(flavor_count, 'flavor_count')
+        self.image_count = configured(image_count, 'image_count')
+        self.provision_rate = configured(provision_rate, 'provision_rate')
+        self.release_rate = configured(release_rate, 'release_rate')
+        self.cache_latency = datetime.timedelta(
+            seconds=configured(cache_latency, 'cache_latency'))
+        self.eject_latency = datetime.timedelta(
+            seconds=configured(eject_latency, 'eject_latency'))
+        initial_utilization = configured(initial_utilization,
+                                         'initial_utilization')
+        self.random = random.Random(configured(seed, 'seed'))
+
+        self.flavor_names = [FLAVOR_NAME_PREFIX + str(index)
+                             for index in range(self.flavor_count)]
+        self.image_uuids = [IMAGE_UUID_PREFIX + str(index)
+                            for index in range(self.image_count)]
+        self.image_names = list(self.image_uuids)
+        self._image_indices = dict((uuid, index) for index, uuid in
+                                   enumerate(self.image_uuids))
+
+        skew = configured(image_popularity_skew, 'image_popularity_skew')
+        self.set_image_popularity([1.0 / rank ** skew for rank in
+                                   range(1, self.image_count + 1)])
+
+        # Generated fleets derive node uuids and flavors from node numbers.
+        # Fleets loaded from a recording look them up in these instead.
+        self.node_uuids = None
+        self._node_indices = None
+        self._node_flavors = None
+
+        # Per-node state is held in flat lists indexed by node number, so
+        # that fleets of millions of nodes stay compact.
+        self.node_state = [AVAILABLE] * self.node_count
+        self.node_image = [-1] * self.node_count
+        self.node_deployed = [-1] * self.node_count
+
+        # Nodes with a cache or eject in progress, mapped to its completion
+        # time.
+        self.pending_caches = {}
+        self.pending_ejects = {}
+
+        self._reset_pools()
+        for index in range(self.node_count):
+            if self.random.random() < initial_utilization:
+                self.node_state[index] = PROVISIONED
+                self.provisioned[self.node_flavor(index)].add(index)
+            else:
+                self.idle[self.node_flavor(index)].add(index)
+
+        self.stats = {
+            'provisioned': 0,
+            'cache_hits': 0,
+            'released': 0,
+            'cache_actions': 0,
+            'eject_actions': 0,
+            'ignored_actions': 0,
+        }
+
+        LOG.info("Generated a synthetic fleet of %(nodes)d node(s) across "
+                 "%(flavors)d flavor(s) and %(images)d image(s).",
+                 {'nodes': self.node_count, 'flavors': self.flavor_count,
+                  'images': self.image_count})
+
+    @classmethod
+    def from_cycle(cls, cycle, **kwargs):
+        """Build a fleet matching a director cycle read from a recording.
+
+        Node uuids, flavors and states, and the image list, are taken from
+        the cycle. Images are requested in proportion to their configured
+        image weights. kwargs are passed to the constructor.
+        """
+        flavor_names = [flavor.name for flavor in cycle.flavors]
+        flavor_indices = dict((name, index)
+                              for index, name in enumerate(flavor_names))
+        nodes = [node for node in cycle.nodes
+                 if node.flavor in flavor_indices]
+        kwargs.update(node_count=len(nodes), flavor_count=len(flavor_names),
+                      image_count=len(cycle.images), initial_utilization=0)
+        fleet = cls(**kwargs)
+
+        fleet.flavor_names = flavor_names
+        fleet.image_uuids = [image.uuid for image in cycle.images]
+        fleet.image_names = [image.name for image in cycle.images]
+        fleet._image_indices = dict((uuid, index) for index, uuid in
+                                    enumerate(fleet.image_uuids))
+        fleet.set_image_popularity(sb.get_image_weights(fleet.image_names))
+        fleet.node_uuids = [node.node_uuid for node in nodes]
+        fleet._node_indices = dict((uuid, index) for index, uuid in
+                                   enumerate(fleet.node_uuids))
+        fleet._node_flavors = [flavor_indices[node.flavor] for node in nodes]
+
+        fleet._reset_pools()
+        for index, node in enumerate(nodes):
+            flavor = fleet.node_flavor(index)
+            image = fleet.image_index(node.cached_image_uuid)
+            if node.provisioned:
+                deployed = fleet.image_index(node.deployed_image_uuid)
+                fleet.node_state[index] = PROVISIONED
+                if deployed is not None:
+                    fleet.node_deployed[index] = deployed
+                fleet.provisioned[flavor].add(index)
+            elif node.cached and image is not None:
+                fleet.node_state[index] = CACHED
+                fleet.node_image[index] = image
+                fleet.cached[flavor].setdefault(image, set()).add(index)
+            else:
+                fleet.node_state[index] = AVAILABLE
+                fleet.idle[flavor].add(index)
+        return fleet
+
+    def _reset_pools(self):
+        # Pools of node indices by flavor, for constant time selection.
+        self.idle = [set() for flavor in self.flavor_names]
+        self.cached = [{} for flavor in self.flavor_names]
+        self.provisioned = [set() for flavor in self.flavor_names]
+
+    def set_image_popularity(self, weights):
+        """Set how often each image is requested, relative to the others.
+
+        :param weights: A list of non-negative weights, in image order, or a
+            dict mapping image names to weights.
+        """
+        if isinstance(weights, dict):
+            weights = [weights[name] for name in self.image_names]
+        # Cumulative popularity of images, for weighted draws with bisect.
+        self._cumulative_popularity = []
+        total = 0.0
+        for weight in weights:
+            total += weight
+            self._cumulative_popularity.append(total)
+
+    def node_flavor(self, index):
+        if self._node_flavors is not None:
+            return self._node_flavors[index]
+        return index % self.flavor_count
+
+    def node_uuid(self, index):
+        if self.node_uuids is not None:
+            return self.node_uuids[index]
+        return NODE_UUID_PREFIX + str(index)
+
+    def node_index(self, node_uuid):
+        """Return the index of the node with node_uuid, or None."""
+        if self._node_indices is not None:
+            return self._node_indices.get(node_uuid)
+        return _parse_index(node_uuid, NODE_UUID_PREFIX, self.node_count)
+
+    def image_index(self, image_uuid):
+        """Return the index of the image with image_uuid, or None."""
+        return self._image_indices.get(image_uuid)
+
+    def _image_uuid(self, image):
+        return self.image_uuids[image] if image >= 0 else ''
+
+    def hit_rate(self):
+        """The fraction of provisions so far which found their image cached."""
+        if self.stats['provisioned'] == 0:
+            return 0.0
+        return self.stats['cache_hits'] / self.stats['provisioned']
+
+    def _stochastic_round(self, value):
+        """Round value up or down at random, preserving its expectation."""
+        whole = int(value)
+        if self.random.random() < value - whole:
+            whole += 1
+        return whole
+
+    def _draw_image(self):
+        if not self._cumulative_popularity:
+            return None
+        point = self.random.random() * self._cumulative_popularity[-1]
+        return bisect.bisect_left(self._cumulative_popularity, point)
+
+    def _remove_cached(self, flavor, index):
+        image = self.node_image[index]
+        pool = self.cached[flavor][image]
+        pool.discard(index)
+        if not pool:
+            del self.cached[flavor][image]
+        self.node_image[index] = -1
+        self.pending_caches.pop(index, None)
+
+    def _take_node_for(self, flavor, image):
+        """Pick an available node of flavor to provision image on.
+
+        :returns: A (node_index, cache_hit) tuple, or (None, False) if the
+            flavor has no available nodes.
+        """
+        for index in self.cached[flavor].get(image, ()):
+            if index not in self.pending_caches:
+                self._remove_cached(flavor, index)
+                return index, True
+        if self.idle[flavor]:
+            return self.idle[flavor].pop(), False
+        # Only nodes caching other images, or still caching, are left.
+        # Provisioning wipes their cache.
+        for pool in self.cached[flavor].values():
+            index = next(iter(pool))
+            self._remove_cached(flavor, index)
+            return index, False
+        return None, False
+
+    def _complete_pending(self):
+        now = util.now()
+        for index, due in list(self.pending_caches.items()):
+            if due <= now:
+                del self.pending_caches[index]
+        for index, due in list(self.pending_ejects.items()):
+            if due <= now:
+                del self.pending_ejects[index]
+                self.node_state[index] = AVAILABLE
+                self.idle[self.node_flavor(index)].add(index)
+
+    def step(self):
+        """Advance the fleet by one round of releases and provisions."""
+        self._complete_pending()
+        for flavor in range(self.flavor_count):
+            provisioned = self.provisioned[flavor]
+            releases = min(self._stochastic_round(self.release_rate *
+                                                  len(provisioned)),
+                           len(provisioned))
+            for _ in range(releases):
+                index = provisioned.pop()
+                # Cleaning wipes whatever image the node was deployed with.
+                self.node_state[index] = AVAILABLE
+                self.node_deployed[index] = -1
+                self.idle[flavor].add(index)
+            self.stats['released'] += releases
+
+            available = (len(self.idle[flavor]) +
+                         sum(len(pool) for pool in
+                             self.cached[flavor].values()))
+            provisions = self._stochastic_round(self.provision_rate *
+                                                available)
+            for _ in range(provisions):
+                image = self._draw_image()
+                if image is None:
+                    break
+                index, hit = self._take_node_for(flavor, image)
+                if index is None:
+                    break
+                self.node_state[index] = PROVISIONED
+                self.node_deployed[index] = image
+                provisioned.add(index)
+                self.stats['provisioned'] += 1
+                if hit:
+                    self.stats['cache_hits'] += 1
+
+    def _node_input(self, index):
+        state = self.node_state[index]
+        image = self.node_image[index]
+        deployed = self.node_deployed[index]
+        cache_status = ''
+        if index in self.pending_caches:
+            cache_status = 'caching'
+        elif state == CACHED:
+            cache_status = 'cached'
+        # Nodes being ejected are unavailable, as they are in Ironic while
+        # they're cleaned.
+        return sb.NodeInput(self.node_uuid(index),
+                            self.flavor_names[self.node_flavor(index)],
+                            state in (PROVISIONED, EJECTING),
+                            state == CACHED,
+                            self._image_uuid(image),
+                            self._image_uuid(deployed),
+                            cache_status=cache_status)
+
+    def retrieve_node_data(self):
+        """Advance the fleet one step, then report every node.
+
+        """
+        self.step()
+        return [self._node_input(index) for index in range(self.node_count)]
+
+    def retrieve_flavor_data(self):
+        """Report the fleet's flavors.
+
+        """
+        def identity_func(name):
+            return lambda node: node.flavor == name
+
+        return [sb.FlavorInput(name, identity_func(name))
+                for name in self.flavor_names]
+
+    def retrieve_image_data(self):
+        """Report the fleet's images.
+
+        """
+        return [sb.ImageInput(name, uuid, uuid + '-checksum')
+                for name, uuid in zip(self.image_names, self.image_uuids)]
+
+    def issue_action(self, action):
+        index = self.node_index(getattr(action, 'node_uuid', None))
+        if index is None or self.node_state[index] in (PROVISIONED,
+                                                       EJECTING):
+            LOG.debug("Ignoring '%(action)s', the node is unknown or "
+                      "unavailable.", {'action': action})
+            self.stats['ignored_actions'] += 1
+            return
+
+        flavor = self.node_flavor(index)
+        if isinstance(action, sb.CacheNode):
+            image = self.image_index(action.image_uuid)
+            if image is None:
+                self.stats['ignored_actions'] += 1
+                return
+            if self.node_state[index] == CACHED:
+                self._remove_cached(flavor, index)
+            else:
+                self.idle[flavor].discard(index)
+            self.node_state[index] = CACHED
+            self.node_image[index] = image
+            self.cached[flavor].setdefault(image, set()).add(index)
+            if self.cache_latency:
+                self.pending_caches[index] = util.now() + self.cache_latency
+            self.stats['cache_actions'] += 1
+        elif isinstance(action, sb.EjectNode):
+            if self.node_state[index] == CACHED:
+                self._remove_cached(flavor, index)
+                if self.eject_latency:
+                    self.node_state[index] = EJECTING
+                    self.pending_ejects[index] = (util.now() +
+                                                  self.eject_latency)
+                else:
+                    self.node_state[index] = AVAILABLE
+                    self.idle[flavor].add(index)
+            self.stats['eject_actions'] += 1
+        else:
+            self.stats['ignored_actions'] += 1
@@ -17,6 +17,7 @@
 #    under the License.
 
 import abc
+import datetime
 import time
 import types
 
@@ -25,6 +26,7 @@ from oslo_log import log as logging
 import six
 
 from arsenal.common import exception
+from arsenal.common import util
 
 
 LOG = logging.getLogger(__name__)
@@ -60,6 +62,18 @@ opts = [
     cfg.StrOpt('auth_system',
                default='keystone',
                help='Openstack auth_system argument.'),
+    cfg.IntOpt('response_cache_ttl',
+               default=0,
+               help='How long, in seconds, to reuse the response of a '
+                    'cacheable read call, such as listing Nova flavors or '
+                    'Glance images, before fetching it again. 0 disables '
+                    'the response cache.'),
+    cfg.IntOpt('token_refresh_margin',
+               default=300,
+               help='How long, in seconds, before a known token expiry the '
+                    'client wrappers should reauthorize in the background. '
+                    'Refreshing early keeps token rollover from failing '
+                    'requests during a director cycle.'),
 ]
 
 client_wrapper_group = cfg.OptGroup(name='client_wrapper',
@@ -88,10 +102,15 @@ class OpenstackClientWrapper(object):
     """An abstract interface for wrapping an Openstack client.
 
         """
+    # Whether _get_new_client records the expiry of its token, so it can be
+    # refreshed ahead of time by refresh_if_expiring.
+    reports_token_expiry = True
+
     def __init__(self,
                  retry_exceptions,
                  auth_exceptions,
-                 name="Openstack"):
+                 name="Openstack",
+                 cacheable_methods=()):
         """Initialise the OpenstackClientWrapper for use.
 
         :param retry_exceptions: A tuple of default client exceptions which
@@ -100,15 +119,76 @@ class OpenstackClientWrapper(object):
             should cause the call method wrapper to attempt to reauthorize the
             client.
         :param name: The name of the client.
+        :param cacheable_methods: Names of read-only client methods whose
+            responses change rarely, and so may be served from the response
+            cache for up to response_cache_ttl seconds.
         """
         self._cached_client = None
+        self._token_expires = None
+        self._response_cache = {}
         self.name = name
         self.retry_exceptions = retry_exceptions
         self.auth_exceptions = auth_exceptions
+        self.cacheable_methods = frozenset(cacheable_methods)
 
     def _invalidate_cached_client(self):
         """Tell the wrapper to invalidate the cached client."""
         self._cached_client = None
+        self._token_expires = None
+
+    def _set_token_expiry(self, expires):
+        """Record when the token used by the newest client expires.
+
+        Wrapped clients call this from _get_new_client whenever the expiry of
+        their token is known. Naive datetimes are taken to be local time.
+
+        :param expires: A datetime, or None if the expiry is unknown.
+        """
+        if isinstance(expires, datetime.datetime):
+            self._token_expires = util.to_local_naive_datetime(expires)
+        else:
+            self._token_expires = None
+
+    def token_expires_soon(self):
+        """Whether the cached client's token is about to expire.
+
+        Returns False when there is no cached client, or when the expiry of
+        its token is unknown.
+        """
+        if self._cached_client is None or self._token_expires is None:
+            return False
+        margin = datetime.timedelta(
+            seconds=CONF.client_wrapper.token_refresh_margin)
+        return util.now() + margin >= self._token_expires
+
+    def refresh_if_expiring(self):
+        """Reauthorize ahead of token expiry.
+
+        Builds a fresh client and swaps it in place of the cached one, so
+        callers never observe a missing client and never wait on an expired
+        token. Meant to be called periodically, away from the director's
+        critical path.
+
+        :returns: True if the client was refreshed, False otherwise.
+        """
+        if not self.token_expires_soon():
+            return False
+
+        LOG.info("The token used by the wrapped %(name)s client expires at "
+                 "%(expires)s. Reauthorizing ahead of time.",
+                 {'name': self.name, 'expires': self._token_expires})
+        old_expiry = self._token_expires
+        self._token_expires = None
+        try:
+            self._cached_client = self._get_new_client()
+        except Exception as e:
+            # Keep the current client, the next refresh or the reauthorizing
+            # logic in call will try again.
+            LOG.warning("Could not refresh the wrapped %(name)s client: "
+                        "%(error)s", {'name': self.name, 'error': e})
+            self._token_expires = old_expiry
+            return False
+        return True
 
     @abc.abstractmethod
     def _get_new_client(self):
@@ -121,6 +201,35 @@ class OpenstackClientWrapper(object):
             self._cached_client = self._get_new_client()
         return self._cached_client
 
+    def invalidate_response_cache(self, method_name=None):
+        """Drop cached responses, forcing the next calls to fetch anew.
+
+        :param method_name: Only drop responses for this client method. Drops
+            every cached response when None.
+        """
+        if method_name is None:
+            self._response_cache = {}
+            return
+        for key in list(self._response_cache.keys()):
+            if key[0] == method_name:
+                del self._response_cache[key]
+
+    def _response_cache_key(self, method_name, args, kwargs):
+        return (method_name, repr(args), repr(sorted(kwargs.items())))
+
+    def _get_cached_response(self, key):
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        fetched_at, response = entry
+        ttl = datetime.timedelta(
+            seconds=CONF.client_wrapper.response_cache_ttl)
+        age = util.now() - fetched_at
+        if age >= ttl or age < datetime.timedelta():
+            del self._response_cache[key]
+            return None
+        return response
+
     def _multi_getattr(self, obj, attr):
         """Support nested attribute path for getattr().
 
@@ -143,49 +252,139 @@ class OpenstackClientWrapper(object):
 
         :raises: ArsenalException if all retries failed.
         """
+        if (method_name not in self.cacheable_methods or
+                CONF.client_wrapper.response_cache_ttl <= 0):
+            return self._call(method_name, *args, **kwargs)
+
+        key = self._response_cache_key(method_name, args, kwargs)
+        response = self._get_cached_response(key)
+        if response is None:
+            response = self._call(method_name, *args, **kwargs)
+            self._response_cache[key] = (util.now(), response)
+        else:
+            LOG.debug("Using cached %(name)s response for '%(method)s'.",
+                      {'name': self.name, 'method': method_name})
+        # Hand out copies of listings so callers can't alter the cache.
+        if isinstance(response, list):
+            return list(response)
+        return response
+
+    def call_iter(self, method_name, *args, **kwargs):
+        """Call the specified client method and iterate over its results.
+
+        Unlike call, results produced by a generator, such as paginated
+        listings, are not collected into a list first. Each item is handed to
+        the consumer as soon as it arrives, so it can be processed before the
+        last page is fetched, without holding the whole listing in memory.
+
+        Retry and reauthorization behave as they do for call, including for
+        failures part way through the results. The method is called again and
+        the items already produced are skipped, so the consumer sees each item
+        once as long as the listing's order is stable.
+
+        :param method_name: Name of the client method to call as a string.
+        :param args: Client method arguments.
+        :param kwargs: Client method keyword arguments.
+
+        :raises: ArsenalException if all retries failed.
+        """
+        if (method_name in self.cacheable_methods and
+                CONF.client_wrapper.response_cache_ttl > 0):
+            return iter(self.call(method_name, *args, **kwargs))
+
+        result = self._invoke(method_name, args, kwargs)
+        if isinstance(result, types.GeneratorType):
+            return self._iterate(method_name, args, kwargs, result)
+        return iter(result)
+
+    def _call(self, method_name, *args, **kwargs):
+        result = self._invoke(method_name, args, kwargs)
+        # Generators are unwound through _iterate, so that failures part way
+        # through the results get the same wrapping behavior as the call.
+        if isinstance(result, types.GeneratorType):
+            return list(self._iterate(method_name, args, kwargs, result))
+        return result
+
+    def _iterate(self, method_name, args, kwargs, result):
+        """Yield items from a generator result, retrying on failures."""
+        yielded = 0
+        attempt = 1
+        reauthorized = False
+        while True:
+            try:
+                for index, item in enumerate(result):
+                    # Skip items already produced before a retry.
+                    if index < yielded:
+                        continue
+                    yield item
+                    yielded += 1
+                return
+            except self.auth_exceptions:
+                self._handle_auth_failure()
+                auth_failure = True
+            except self.retry_exceptions as err:
+                LOG.exception("Got a retry-able exception: %s", err)
+                auth_failure = False
+
+            reauthorized = self._wait_to_retry(method_name, attempt,
+                                               auth_failure, reauthorized)
+            attempt += 1
+            result = self._invoke(method_name, args, kwargs)
+
+    def _invoke(self, method_name, args, kwargs):
+        """Call the client method, retrying until it returns a result."""
         retry_exceptions = self.retry_exceptions
         auth_exceptions = self.auth_exceptions
         max_retries = CONF.client_wrapper.call_max_retries
-        retry_interval = CONF.client_wrapper.call_retry_interval
 
+        reauthorized = False
         for attempt in range(1, max_retries + 1):
             client = self._get_client()
 
             try:
-                result = self._multi_getattr(client, method_name)(*args,
-                                                                  **kwargs)
-                # NOTE(ClifHouck): If the return type is a generator,
-                # then force the generator to unwind, because otherwise we
-                # won't get the wrapping behavior this method provides.
-                # FIXME(ClifHouck): Instead of forcing a complete unwind,
-                # wrap the generator with our own, which provides individually
-                # wrapped calls, and return that.
-                if isinstance(result, types.GeneratorType):
-                    return list(result)
-
-                return result
+                return self._multi_getattr(client, method_name)(*args,
+                                                                **kwargs)
             except auth_exceptions:
-                # In this case, the authorization token of the cached
-                # client probably expired. So invalidate the cached
-                # client and the next try will start with a fresh one.
-                self._invalidate_cached_client()
-                LOG.info("The wrapped %(name)s client became unauthorized. "
-                         "Will attempt to reauthorize and try again." %
-                         {'name': self.name})
+                self._handle_auth_failure()
+                auth_failure = True
             except retry_exceptions as err:
                 LOG.exception("Got a retry-able exception: %s", err)
-                pass
-
-            # We want to perform this logic for all exception cases listed
-            # above.
-            msg = ("Error contacting %(name)s server for "
-                   "'%(method)s'. Attempt %(attempt)d of %(total)d" %
-                   {'name': self.name,
-                    'method': method_name,
-                    'attempt': attempt,
-                    'total': max_retries})
-            if attempt == max_retries:
-                LOG.error(msg)
-                raise exception.ArsenalException(msg)
-            LOG.warning(msg)
-            time.sleep(retry_interval)
+                auth_failure = False
+
+            reauthorized = self._wait_to_retry(method_name, attempt,
+                                               auth_failure, reauthorized)
+
+    def _handle_auth_failure(self):
+        # In this case, the authorization token of the cached
+        # client probably expired. So invalidate the cached
+        # client and the next try will start with a fresh one.
+        self._invalidate_cached_client()
+        LOG.info("The wrapped %(name)s client became unauthorized. "
+                 "Will attempt to reauthorize and try again." %
+                 {'name': self.name})
+
+    def _wait_to_retry(self, method_name, attempt, auth_failure,
+                       reauthorized):
+        """Log a failed attempt, then wait until the next one may start.
+
+        :returns: Whether an immediate reauthorized retry has been used up.
+        :raises: ArsenalException if this was the last attempt.
+        """
+        max_retries = CONF.client_wrapper.call_max_retries
+        msg = ("Error contacting %(name)s server for "
+               "'%(method)s'. Attempt %(attempt)d of %(total)d" %
+               {'name': self.name,
+                'method': method_name,
+                'attempt': attempt,
+                'total': max_retries})
+        if attempt >= max_retries:
+            LOG.error(msg)
+            raise exception.ArsenalException(msg)
+        LOG.warning(msg)
+        # A fresh client can be tried right away after the first
+        # authorization failure. Sleep for anything else, or if
+        # reauthorizing already failed to help once.
+        if auth_failure and not reauthorized:
+            return True
+        time.sleep(CONF.client_wrapper.call_retry_interval)
+        return reauthorized
@@ -23,6 +23,7 @@ from oslo_log import log as logging
 
 from arsenal.common import exception
 from arsenal.external import client_wrapper
+from arsenal.external import keystone_session
 
 LOG = logging.getLogger(__name__)
 
@@ -74,19 +75,31 @@ class GlanceClientWrapper(client_wrapper.OpenstackClientWrapper):
             retry_exceptions=(glanceclient.exc.Conflict),
             auth_exceptions=(glanceclient.exc.Unauthorized,
                              glanceclient.exc.HTTPForbidden),
-            name="Glance")
+            name="Glance",
+            cacheable_methods=('images.list',))
         self.get_token_fun = get_token_fun
 
     def _get_new_client(self):
         auth_token = first_not_none([CONF.glance.admin_auth_token,
                                      CONF.client_wrapper.os_auth_token])
+        token_expires = None
         endpoint = first_not_none([CONF.glance.api_endpoint,
                                    CONF.client_wrapper.os_api_url])
         if endpoint is None:
             raise exception.ArsenalException(
                 "There was no endpoint specified for the glance client!")
 
-        if auth_token is None:
+        if (auth_token is None and self.get_token_fun is None and
+                CONF.client_wrapper.use_shared_session):
+            # Reuse the shared session's token cache and connection pool
+            # rather than minting a token through a new keystone client.
+            kwargs = {'session': keystone_session.get_session(
+                auth_url=CONF.glance.auth_endpoint,
+                username=CONF.glance.admin_username,
+                password=CONF.glance.admin_password,
+                tenant_name=CONF.glance.admin_tenant_name,
+                tenant_id=CONF.glance.admin_tenant_id)}
+        elif auth_token is None:
             kwargs = {'username':
                       first_not_none([CONF.glance.admin_username,
                                       CONF.client_wrapper.os_username]),
@@ -111,13 +124,17 @@ class GlanceClientWrapper(client_wrapper.OpenstackClientWrapper):
             # NOTE(ClifHouck): Glanceclient doesn't currently actually try
             # to auth, so get a token from a user-specified source, or
             # the keystone client instead.
+            # Token functions may publish the expiry of the token they
+            # returned as an 'expires' attribute.
             if self.get_token_fun:
                 auth_token = self.get_token_fun(**kwargs)
+                token_expires = getattr(self.get_token_fun, 'expires', None)
             else:
                 ks_cli = keystone_client.Client(**kwargs)
                 auth_token_obj = (
                     ks_cli.get_raw_token_from_identity_service(**kwargs))
                 auth_token = auth_token_obj['token']['id']
+                token_expires = getattr(auth_token_obj, 'expires', None)
 
             kwargs = {'token': auth_token}
         else:
@@ -131,4 +148,5 @@ class GlanceClientWrapper(client_wrapper.OpenstackClientWrapper):
             LOG.error(msg)
             raise exception.ArsenalException(msg)
 
+        self._set_token_expiry(token_expires)
         return cli
@@ -25,6 +25,7 @@ from oslo_log import log as logging
 
 from arsenal.common import exception
 from arsenal.external import client_wrapper
+from arsenal.external import keystone_session
 
 
 LOG = logging.getLogger(__name__)
@@ -72,7 +73,13 @@ first_not_none = client_wrapper.first_not_none
 
 
 class IronicClientWrapper(client_wrapper.OpenstackClientWrapper):
-    """Ironic client wrapper class that encapsulates retry logic."""
+    """Ironic client wrapper class that encapsulates retry logic.
+
+    ironicclient authenticates internally and doesn't expose when its token
+    expires, so it is only refreshed in the background through the shared
+    keystone session. Otherwise it is reauthorized once the token expires.
+    """
+    reports_token_expiry = False
 
     def __init__(self):
         """Initialise the IronicClientWrapper for use."""
@@ -87,7 +94,18 @@ class IronicClientWrapper(client_wrapper.OpenstackClientWrapper):
         auth_token = first_not_none([CONF.ironic.admin_auth_token,
                                      CONF.client_wrapper.os_auth_token])
 
-        if auth_token is None:
+        if auth_token is None and CONF.client_wrapper.use_shared_session:
+            session = keystone_session.get_session(
+                auth_url=CONF.ironic.admin_url,
+                username=CONF.ironic.admin_username,
+                password=CONF.ironic.admin_password,
+                tenant_name=CONF.ironic.admin_tenant_name)
+            kwargs = {'session': session,
+                      'os_service_type': 'baremetal',
+                      'os_endpoint_type': 'public',
+                      'ironic_url': CONF.ironic.api_endpoint
+                      }
+        elif auth_token is None:
             kwargs = {'os_username':
                       first_not_none([CONF.ironic.admin_username,
                                       CONF.client_wrapper.os_username]),
@@ -0,0 +1,141 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from keystoneauth1.identity import v2
+from keystoneauth1 import session as ks_session
+from oslo_config import cfg
+from oslo_log import log as logging
+import requests
+
+from arsenal.common import exception
+from arsenal.external import client_wrapper
+
+LOG = logging.getLogger(__name__)
+
+
+opts = [
+    cfg.BoolOpt('use_shared_session',
+                default=False,
+                help='When True, the Ironic, Nova and Glance client wrappers '
+                     'authenticate through keystone sessions which cache one '
+                     'token and pool HTTP connections, instead of each '
+                     'client authenticating on its own. Clients with the '
+                     'same credentials share a session. Only used when no '
+                     'auth token is configured for a client.'),
+    cfg.IntOpt('connection_pool_size',
+               default=10,
+               help='The number of keep-alive connections per host kept open '
+                    'by the shared keystone session.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts, client_wrapper.client_wrapper_group)
+
+# Shared sessions, by (auth url, username, password, tenant name, tenant id).
+_shared_sessions = {}
+
+first_not_none = client_wrapper.first_not_none
+
+
+def _create_session(auth_url, username, password, tenant_name, tenant_id):
+    if auth_url is None:
+        raise exception.ArsenalException(
+            "There was no os_api_url specified for the shared keystone "
+            "session!")
+
+    auth = v2.Password(auth_url=auth_url,
+                       username=username,
+                       password=password,
+                       tenant_name=tenant_name,
+                       tenant_id=tenant_id)
+
+    # Mount a pooled adapter for both schemes so every client sharing this
+    # session reuses the same keep-alive connections instead of performing
+    # a new TLS handshake for each request.
+    pool_size = CONF.client_wrapper.connection_pool_size
+    http_session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                            pool_maxsize=pool_size)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+
+    LOG.info("Created shared keystone session for %(user)s against "
+             "%(url)s with a connection pool size of %(size)d.",
+             {'user': username, 'url': auth_url, 'size': pool_size})
+    # The client wrappers have always talked to services insecurely,
+    # keep doing so here.
+    return ks_session.Session(auth=auth, session=http_session, verify=False)
+
+
+def get_session(auth_url=None, username=None, password=None,
+                tenant_name=None, tenant_id=None):
+    """Return the keystone session shared by client wrappers using the same
+    credentials.
+
+    Credentials not given fall back to the [client_wrapper] os_* options, so
+    services configured with their own credentials get their own session.
+    Each session is created on first use and reused afterwards, so its token
+    cache and connection pool persist across director cycles.
+    """
+    group = CONF.client_wrapper
+    credentials = (first_not_none([auth_url, group.os_api_url]),
+                   first_not_none([username, group.os_username]),
+                   first_not_none([password, group.os_password]),
+                   first_not_none([tenant_name, group.os_tenant_name]),
+                   first_not_none([tenant_id, group.os_tenant_id]))
+    if credentials not in _shared_sessions:
+        _shared_sessions[credentials] = _create_session(*credentials)
+    return _shared_sessions[credentials]
+
+
+def reset_session():
+    """Forget the shared sessions. The next get_session calls create anew."""
+    _shared_sessions.clear()
+
+
+def refresh_session():
+    """Reauthorize the shared sessions ahead of their tokens expiring.
+
+    A new token is fetched when the current one expires within
+    token_refresh_margin seconds, or when a session has not authenticated
+    yet. The new token replaces the old one in place, so requests made in the
+    meantime keep using a valid token.
+
+    :returns: True if any new token was fetched, False otherwise.
+    """
+    refreshed = False
+    for session in list(_shared_sessions.values()):
+        refreshed = _refresh(session) or refreshed
+    return refreshed
+
+
+def _refresh(session):
+    auth = session.auth
+    margin = CONF.client_wrapper.token_refresh_margin
+    if auth.auth_ref is not None and not auth.auth_ref.will_expire_soon(
+            stale_duration=margin):
+        return False
+
+    LOG.info("Reauthorizing the shared keystone session ahead of token "
+             "expiry.")
+    try:
+        auth.auth_ref = auth.get_auth_ref(session)
+    except Exception as e:
+        LOG.warning("Could not refresh the shared keystone session: "
+                    "%(error)s", {'error': e})
+        return False
+    return True
@@ -25,6 +25,7 @@ from oslo_log import log as logging
 
 from arsenal.common import exception
 from arsenal.external import client_wrapper
+from arsenal.external import keystone_session
 
 
 LOG = logging.getLogger(__name__)
@@ -79,7 +80,13 @@ first_not_none = client_wrapper.first_not_none
 
 
 class NovaClientWrapper(client_wrapper.OpenstackClientWrapper):
-    """Nova client wrapper class that encapsulates retry logic."""
+    """Nova client wrapper class that encapsulates retry logic.
+
+    novaclient authenticates internally and doesn't expose when its token
+    expires, so it is only refreshed in the background through the shared
+    keystone session. Otherwise it is reauthorized once the token expires.
+    """
+    reports_token_expiry = False
 
     def __init__(self):
         """Initialise the NovaClientWrapper for use."""
@@ -87,7 +94,8 @@ class NovaClientWrapper(client_wrapper.OpenstackClientWrapper):
             retry_exceptions=(nova_exc.ConnectionRefused,
                               nova_exc.Conflict),
             auth_exceptions=(nova_exc.Unauthorized),
-            name="Nova")
+            name="Nova",
+            cacheable_methods=('flavors.list',))
 
     def _get_new_client(self):
         auth_plugin = None
@@ -109,8 +117,6 @@ class NovaClientWrapper(client_wrapper.OpenstackClientWrapper):
         auth_url = first_not_none([CONF.nova.admin_url,
                                    CONF.client_wrapper.os_api_url])
 
-        args = (version, username, api_key, project_id, auth_url)
-
         kwargs = {
             'insecure': True,
             'service_name':
@@ -119,12 +125,33 @@ class NovaClientWrapper(client_wrapper.OpenstackClientWrapper):
             'region_name':
                 first_not_none([CONF.nova.region_name,
                                 CONF.client_wrapper.region_name]),
-            'auth_system':
-                first_not_none([CONF.nova.auth_system,
-                                CONF.client_wrapper.auth_system]),
-            'auth_plugin': auth_plugin
         }
 
+        auth_system = first_not_none([CONF.nova.auth_system,
+                                      CONF.client_wrapper.auth_system])
+        use_shared_session = CONF.client_wrapper.use_shared_session
+        if use_shared_session and (auth_system not in (None, 'keystone') or
+                                   auth_plugin is not None):
+            # The shared session only knows keystone password auth.
+            LOG.warning("Nova is configured with auth_system '%(system)s' "
+                        "and auth_plugin '%(plugin)s', which the shared "
+                        "keystone session can't authenticate with. Nova "
+                        "will authenticate on its own.",
+                        {'system': auth_system,
+                         'plugin': CONF.nova.auth_plugin})
+            use_shared_session = False
+
+        if use_shared_session:
+            # The shared session already holds the credentials and token.
+            args = (version,)
+            kwargs['session'] = keystone_session.get_session(
+                auth_url=auth_url, username=username, password=api_key,
+                tenant_name=project_id)
+        else:
+            args = (version, username, api_key, project_id, auth_url)
+            kwargs['auth_system'] = auth_system
+            kwargs['auth_plugin'] = auth_plugin
+
         try:
             cli = client.Client(*args, **kwargs)
         except nova_exc.Unauthorized:
@@ -47,7 +47,25 @@ opts = [
     cfg.IntOpt('default_image_weight',
                default=1,
                help='The integral weight to use if a given image has '
-                    'no corresponding entry in image_weights. Default is 1.')
+                    'no corresponding entry in image_weights. Default is 1.'),
+    cfg.BoolOpt('adaptive_image_weights',
+                default=False,
+                help='When True, image weights follow observed demand: each '
+                     'image\'s weight is its recent deployment count, '
+                     'decayed over time, plus its share of the configured '
+                     'weights as a prior.'),
+    cfg.IntOpt('image_demand_half_life',
+               default=86400,
+               min=1,
+               help='How long, in seconds, until an observed deployment '
+                    'counts half as much towards adaptive image weights.'),
+    cfg.FloatOpt('image_weight_prior_deployments',
+                 default=10.0,
+                 min=0,
+                 help='How many deployments the configured image weights '
+                      'are worth when blended with observed demand. Higher '
+                      'values make adaptive weights follow demand more '
+                      'slowly.'),
 ]
 
 strategy_group = cfg.OptGroup(name='strategy',
@@ -81,13 +99,33 @@ class NodeInput(StrategyInput):
                  flavor,
                  is_provisioned=False,
                  is_cached=False,
-                 image_uuid='', ):
+                 image_uuid='',
+                 deployed_image_uuid='',
+                 topology='',
+                 cache_status='',
+                 conductor='', ):
         super(NodeInput, self).__init__()
         self.node_uuid = node_uuid
         self.flavor = flavor
         self.provisioned = is_provisioned
         self.cached = is_cached
         self.cached_image_uuid = image_uuid
+        # The image the node was deployed with, if it is provisioned and
+        # the scout knows.
+        self.deployed_image_uuid = deployed_image_uuid
+        # The failure domain the node is in, such as its rack, if the scout
+        # knows.
+        self.topology = topology
+        # Ironic's report of the node's caching progress, such as 'cached'
+        # or 'failed', if the scout knows.
+        self.cache_status = cache_status
+        # The Ironic conductor managing the node, if the scout knows.
+        self.conductor = conductor
+
+    def is_caching(self):
+        # A cache has been requested, but the image isn't ready yet.
+        return (not self.provisioned and bool(self.cache_status) and
+                self.cache_status not in ('cached', 'failed'))
 
     def can_cache(self):
         # If the node is not provisioned and not already caching an image,
@@ -114,11 +152,13 @@ class FlavorInput(StrategyInput):
 
 
 class ImageInput(StrategyInput):
-    def __init__(self, name, uuid, checksum):
+    def __init__(self, name, uuid, checksum, size=None):
         super(ImageInput, self).__init__()
         self.name = name
         self.uuid = uuid
         self.checksum = checksum
+        # Size in bytes, if known.
+        self.size = size
 
     def __str__(self):
         return "[ImageInput]: %s, %s, %s" % (self.name,
@@ -172,10 +212,33 @@ class CachingStrategy(object):
     def update_current_state(self, nodes, images, flavors):
         """update_current_state should be called periodically to allow the
         strategy to see what the current state of nodes, images, and flavors
-        are in the system.
+        are in the system. nodes is None when apply_node_changes was given
+        the nodes which changed instead.
         """
         pass
 
+    def apply_node_changes(self, added, changed, removed):
+        """apply_node_changes optionally lets a strategy keep its view of
+        nodes current from only the nodes which changed since it was last
+        updated, rather than being given every node each cycle. It is
+        followed by a call to update_current_state with nodes of None.
+
+        :param added: NodeInput objects for new nodes.
+        :param changed: NodeInput objects for nodes whose state changed.
+        :param removed: The uuids of nodes which are gone.
+        :raises: NotImplementedError if the strategy must be given every
+            node through update_current_state.
+        """
+        raise NotImplementedError()
+
+    def has_pending_work(self):
+        """Whether the strategy may return directives later even if its
+        inputs don't change, because it is counting cycles or waiting on the
+        clock. The director only skips consulting a strategy with unchanged
+        inputs when this is False.
+        """
+        return False
+
     @abc.abstractmethod
     def directives(self):
         """directives will return a list of StrategyActionsArsenal should take
@@ -392,6 +455,66 @@ def init_image_weights():
     _load_image_weights_file()
 
 
+class ImageDemand(object):
+    """Exponentially decayed counts of deployments by image name."""
+    def __init__(self):
+        self.counts = {}
+        self.updated = None
+
+    def _decay_to(self, when):
+        if self.updated is not None and when > self.updated:
+            elapsed = (when - self.updated).total_seconds()
+            factor = 0.5 ** (elapsed / CONF.strategy.image_demand_half_life)
+            for name in self.counts:
+                self.counts[name] *= factor
+        if self.updated is None or when > self.updated:
+            self.updated = when
+
+    def record(self, nodes, images):
+        """Count deployments of nodes, which are newly provisioned.
+
+        :param nodes: NodeInput objects with a deployed_image_uuid.
+        :param images: ImageInput objects used to name deployed images.
+            Deployments of other images are not counted.
+        """
+        self._decay_to(util.now())
+        names = {image.uuid: image.name for image in images}
+        for node in nodes:
+            name = names.get(node.deployed_image_uuid)
+            if name is not None:
+                self.counts[name] = self.counts.get(name, 0.0) + 1
+
+    def current_counts(self):
+        """Return the decayed deployment counts as of now."""
+        self._decay_to(util.now())
+        return dict(self.counts)
+
+    def clear(self):
+        self.counts = {}
+        self.updated = None
+
+image_demand = ImageDemand()
+
+
+def blend_image_weights(configured_weights, demand):
+    """Blend configured image weights with observed demand.
+
+    The configured weights are normalized to add up to
+    image_weight_prior_deployments, then each image's decayed deployment
+    count is added. With no observed demand the result is proportional to
+    the configured weights.
+    """
+    total = sum(six.itervalues(configured_weights))
+    prior = CONF.strategy.image_weight_prior_deployments
+    blended = {}
+    for name, weight in six.iteritems(configured_weights):
+        share = weight / total if total else 0
+        blended[name] = share * prior + demand.get(name, 0)
+    if not any(six.itervalues(blended)):
+        return configured_weights
+    return blended
+
+
 def get_image_weights(image_names):
     """Return a dictionary of requested image names to weights."""
     default_weight = CONF.strategy.default_image_weight
@@ -401,6 +524,9 @@ def get_image_weights(image_names):
         if weight is None:
             weight = default_weight
         weights_by_name[name] = weight
+    if CONF.strategy.adaptive_image_weights:
+        weights_by_name = blend_image_weights(weights_by_name,
+                                              image_demand.current_counts())
     return weights_by_name
 
 
@@ -492,7 +618,9 @@ def _get_named_image_distribution(images, nodes):
 
     named_distribution = collections.defaultdict(lambda: 0)
     for uuid, frequency in six.iteritems(uuid_distribution):
-        named_distribution[image_uuids_to_names[uuid]] = frequency
+        # Nodes may still be cached with images no longer listed.
+        if uuid in image_uuids_to_names:
+            named_distribution[image_uuids_to_names[uuid]] = frequency
 
     return named_distribution
 
@@ -0,0 +1,245 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache targets which follow the time of day and day of week."""
+
+from __future__ import division
+
+import collections
+import datetime
+import json
+
+from oslo_config import cfg
+from oslo_log import log
+import six
+
+from arsenal.common import exception
+from arsenal.common import util
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.StrOpt('schedule_filename',
+               help='The name of a file containing a JSON cache schedule: '
+                    'for each flavor name, or "*" for any other flavor, a '
+                    'list of 24 percentages to cache by hour of day, or 168 '
+                    'by hour of week starting Monday at midnight. Can be '
+                    'learned from director recordings with '
+                    'arsenal-learn-schedule.'),
+    cfg.IntOpt('prewarm_lookahead',
+               default=3600,
+               min=0,
+               help='How far ahead, in seconds, to look for a higher '
+                    'scheduled percentage, so the cache is warm when a peak '
+                    'begins.'),
+]
+
+cache_schedule_group = cfg.OptGroup(name='cache_schedule',
+                                    title='Cache Schedule Options')
+
+CONF = cfg.CONF
+CONF.register_group(cache_schedule_group)
+CONF.register_opts(opts, cache_schedule_group)
+
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = 7 * HOURS_PER_DAY
+
+# Schedule key applying to flavors without their own profile.
+ANY_FLAVOR = '*'
+
+
+class InvalidCacheScheduleError(exception.ArsenalException):
+    msg_fmt = "Invalid cache schedule for flavor '%(flavor)s': %(reason)s"
+
+
+def hour_of_week(when):
+    """The hour of the week of a datetime, from 0 at Monday midnight."""
+    return when.weekday() * HOURS_PER_DAY + when.hour
+
+
+def parse_time(value):
+    """Parse a datetime written by datetime.isoformat."""
+    for time_format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+    raise ValueError("Unrecognized time '%s'." % value)
+
+
+class CacheSchedule(object):
+    """Scheduled percentages to cache, by flavor and hour of the week."""
+    def __init__(self, profiles, prewarm_lookahead=0):
+        """Constructs a CacheSchedule object.
+
+        :param: profiles - A dict mapping flavor names, or ANY_FLAVOR, to
+            lists of 24 or 168 percentages between 0 and 1 inclusive.
+        :param: prewarm_lookahead - Seconds ahead to look for higher targets.
+        """
+        self.profiles = {}
+        for flavor, profile in six.iteritems(profiles):
+            if len(profile) == HOURS_PER_DAY:
+                profile = list(profile) * 7
+            if len(profile) != HOURS_PER_WEEK:
+                raise InvalidCacheScheduleError(
+                    flavor=flavor,
+                    reason="expected 24 or 168 percentages, got %d." % (
+                        len(profile)))
+            for percentage in profile:
+                if not 0 <= percentage <= 1:
+                    raise InvalidCacheScheduleError(
+                        flavor=flavor,
+                        reason="%s is not between 0 and 1." % percentage)
+            self.profiles[flavor] = profile
+        self.prewarm_lookahead = datetime.timedelta(seconds=prewarm_lookahead)
+
+    def target(self, flavor_name, when=None):
+        """The percentage to cache for a flavor.
+
+        The highest scheduled percentage from when until prewarm_lookahead
+        later, so caching starts ahead of a peak and a peak's target holds
+        until it is over.
+
+        :returns: The percentage, or None if the flavor isn't scheduled.
+        """
+        profile = self.profiles.get(flavor_name,
+                                    self.profiles.get(ANY_FLAVOR))
+        if profile is None:
+            return None
+        when = when or util.now()
+        end = when + self.prewarm_lookahead
+        target = profile[hour_of_week(when)]
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        hour += datetime.timedelta(hours=1)
+        while hour <= end:
+            target = max(target, profile[hour_of_week(hour)])
+            hour += datetime.timedelta(hours=1)
+        return target
+
+
+def load_schedule(filename, prewarm_lookahead=0):
+    with open(filename, 'r') as infile:
+        return CacheSchedule(json.load(infile), prewarm_lookahead)
+
+
+def get_configured_schedule():
+    """Load the configured cache schedule.
+
+    :returns: A CacheSchedule, or None if no schedule is configured or it
+        could not be loaded.
+    """
+    filename = CONF.cache_schedule.schedule_filename
+    if filename is None:
+        return None
+    try:
+        schedule = load_schedule(filename,
+                                 CONF.cache_schedule.prewarm_lookahead)
+    except Exception as e:
+        LOG.exception("Caught an exception when trying to load the cache "
+                      "schedule '%(filename)s'. Scheduled targets will not be "
+                      "used. Exception message: %(message)s",
+                      {'filename': filename, 'message': e})
+        return None
+    LOG.info("Loaded a cache schedule for %(num)d flavor(s) from "
+             "'%(filename)s'.",
+             {'num': len(schedule.profiles), 'filename': filename})
+    return schedule
+
+
+def _fill_unobserved(values, observed):
+    """Fill hours of the week never observed from the same hour on other
+    days, or else from the mean of every observed hour.
+    """
+    observed_values = [value for value, seen in zip(values, observed) if seen]
+    if not observed_values:
+        return values
+    overall = sum(observed_values) / len(observed_values)
+    filled = list(values)
+    for slot in range(HOURS_PER_WEEK):
+        if observed[slot]:
+            continue
+        same_hour = [values[other] for other in
+                     range(slot % HOURS_PER_DAY, HOURS_PER_WEEK,
+                           HOURS_PER_DAY) if observed[other]]
+        filled[slot] = (sum(same_hour) / len(same_hour) if same_hour
+                        else overall)
+    return filled
+
+
+def learn_schedule(cycles, coverage_hours=1.0, max_percentage=0.5):
+    """Learn a cache schedule from recorded director cycles.
+
+    For each flavor and hour of the week, the average number of nodes
+    provisioned in that hour is divided by the average number of
+    unprovisioned nodes, then multiplied by coverage_hours: the schedule
+    caches enough nodes to cover that many hours of typical demand. Nodes
+    ejected by the recorded directives are not counted as provisioned.
+
+    :param cycles: Recorded cycles, in time order, as read by
+        arsenal.director.recorder.read_cycles.
+    :param coverage_hours: How many hours of demand to keep cached.
+    :param max_percentage: The highest percentage to schedule.
+    :returns: A dict of flavor names to lists of 168 percentages, suitable
+        for CacheSchedule and for writing to a schedule file.
+    """
+    provisions = collections.defaultdict(lambda: [0] * HOURS_PER_WEEK)
+    unprovisioned_totals = collections.defaultdict(
+        lambda: [0] * HOURS_PER_WEEK)
+    samples = [0] * HOURS_PER_WEEK
+    # The distinct dates each hour of the week was seen on.
+    occurrences = [set() for _ in range(HOURS_PER_WEEK)]
+
+    previous = None
+    ejected = set()
+    for cycle in cycles:
+        when = parse_time(cycle.time)
+        slot = hour_of_week(when)
+        samples[slot] += 1
+        occurrences[slot].add(when.date())
+
+        unprovisioned = set()
+        for node in cycle.nodes:
+            counts = unprovisioned_totals[node.flavor]
+            if node.provisioned:
+                if (previous is not None and node.node_uuid in previous and
+                        node.node_uuid not in ejected):
+                    provisions[node.flavor][slot] += 1
+            else:
+                counts[slot] += 1
+                unprovisioned.add(node.node_uuid)
+        previous = unprovisioned
+        ejected = set(directive.node_uuid for directive in cycle.directives
+                      if isinstance(directive, sb.EjectNode))
+
+    observed = [bool(count) for count in samples]
+    schedule = {}
+    for flavor, totals in six.iteritems(unprovisioned_totals):
+        percentages = [0.0] * HOURS_PER_WEEK
+        for slot in range(HOURS_PER_WEEK):
+            if not observed[slot]:
+                continue
+            mean_unprovisioned = totals[slot] / samples[slot]
+            if mean_unprovisioned == 0:
+                continue
+            hourly_demand = provisions[flavor][slot] / len(occurrences[slot])
+            percentages[slot] = min(
+                max_percentage,
+                hourly_demand * coverage_hours / mean_unprovisioned)
+        schedule[flavor] = [round(percentage, 4) for percentage in
+                            _fill_unobserved(percentages, observed)]
+    return schedule
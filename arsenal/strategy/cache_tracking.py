@@ -0,0 +1,293 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tracks how long nodes take to cache images."""
+
+from __future__ import division
+
+import collections
+import datetime
+import json
+import os
+import random
+
+from oslo_config import cfg
+from oslo_log import log
+
+from arsenal.common import util
+from arsenal.strategy import base as sb
+from arsenal.strategy import node_selection
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.FloatOpt('cache_time_smoothing',
+                 default=0.3,
+                 min=0,
+                 max=1,
+                 help='With FastCacherNodeSelector, the weight of each '
+                      'observed time to cache in a node\'s moving average.'),
+    cfg.IntOpt('failure_backoff',
+               default=300,
+               min=0,
+               help='How long, in seconds, a node which failed to cache is '
+                    'left alone before it may be cached again. Doubles with '
+                    'each consecutive failure.'),
+    cfg.IntOpt('max_failure_backoff',
+               default=21600,
+               min=0,
+               help='The longest, in seconds, a node is left alone after '
+                    'failing to cache.'),
+    cfg.IntOpt('quarantine_after_failures',
+               default=5,
+               min=0,
+               help='Nodes which fail to cache this many times in a row are '
+                    'quarantined, and not cached again until an operator '
+                    'releases them. 0 never quarantines nodes.'),
+    cfg.StrOpt('quarantine_file',
+               help='When set, quarantined nodes are kept in this JSON file, '
+                    'mapping node uuids to their failure count and when '
+                    'they were quarantined. It is reread every cycle: '
+                    'remove a node to release it.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts, node_selection.node_selection_group)
+
+# Ironic driver_info cache_status values. Any other status, once a cache has
+# been requested, means the image is still downloading.
+CACHED = 'cached'
+FAILED = 'failed'
+
+# How a node's attempt to cache an image ended. seconds is None on failure.
+CacheOutcome = collections.namedtuple(
+    'CacheOutcome', ['node', 'image_uuid', 'seconds', 'succeeded'])
+
+
+class CacheTimeTracker(object):
+    """Measures how long each node takes from being told to cache an image
+    until it reports the image cached, and how often it fails in a row.
+
+    Timing starts when a cache directive is issued for the node, or failing
+    that when the node is first seen caching. On the first update after a
+    node is told to cache, a status unchanged since the directive was issued
+    is taken as left over from its previous attempt. A finished or failed
+    status still unchanged an update later is the new attempt's outcome, so
+    a node failing again straight away is still counted.
+
+    Nodes which fail are held back from caching for an exponentially growing
+    backoff, and quarantined after quarantine_after_failures failures in a
+    row, until an operator releases them.
+    """
+    def __init__(self, smoothing=None):
+        """Constructs a CacheTimeTracker object.
+
+        :param: smoothing - The weight of each observed time in a node's
+            moving average. Defaults to the configured
+            cache_time_smoothing.
+        """
+        self.smoothing = smoothing
+        # When caching started, the image being cached, until the node
+        # reports a new status its status when the directive was issued, and
+        # whether it has been updated since, by node uuid.
+        self.started = {}
+        # Cache status at the last update, by node uuid.
+        self.statuses = {}
+        # Moving average of seconds to cache, by node uuid.
+        self.cache_times = {}
+        # Consecutive failures to cache, by node uuid.
+        self.failures = {}
+        # When nodes which failed may be cached again, by node uuid.
+        self.retry_after = {}
+        # Failure count and time of quarantine, by node uuid.
+        self.quarantined = {}
+
+    def issued(self, directives, now=None):
+        """Start timing the nodes told to cache by directives."""
+        now = now or util.now()
+        for directive in directives:
+            if isinstance(directive, sb.CacheNode):
+                uuid = directive.node_uuid
+                self.started[uuid] = (now, directive.image_uuid,
+                                      self.statuses.get(uuid), False)
+
+    def update(self, nodes, now=None):
+        """Observe the cache status of nodes.
+
+        :param nodes: NodeInput objects.
+        :returns: A list of CacheOutcome tuples for nodes which finished or
+            failed caching since the last update.
+        """
+        now = now or util.now()
+        outcomes = []
+        statuses = {}
+        for node in nodes:
+            uuid = node.node_uuid
+            status = node.cache_status
+            statuses[uuid] = status
+            started = self.started.get(uuid)
+            if (not node.provisioned and started is not None and
+                    status == started[2] and
+                    (status not in (FAILED, CACHED) or not started[3])):
+                # Ironic may not have caught up with the directive yet.
+                self.started[uuid] = started[:3] + (True,)
+                continue
+            if node.provisioned or not status:
+                self.started.pop(uuid, None)
+            elif status == FAILED:
+                started = self.started.pop(uuid, None)
+                if started is not None:
+                    self._record_failure(uuid, now)
+                    outcomes.append(CacheOutcome(node, started[1], None,
+                                                 False))
+            elif status == CACHED:
+                started = self.started.pop(uuid, None)
+                if started is not None:
+                    seconds = (now - started[0]).total_seconds()
+                    self._record(uuid, seconds)
+                    outcomes.append(CacheOutcome(node, started[1], seconds,
+                                                 True))
+            elif started is None:
+                self.started[uuid] = (now, node.cached_image_uuid, None,
+                                      True)
+            elif started[2] is not None:
+                self.started[uuid] = started[:2] + (None, True)
+        self.statuses = statuses
+        return outcomes
+
+    def _record(self, uuid, seconds):
+        smoothing = self.smoothing
+        if smoothing is None:
+            smoothing = CONF.node_selection.cache_time_smoothing
+        previous = self.cache_times.get(uuid)
+        if previous is None:
+            self.cache_times[uuid] = seconds
+        else:
+            self.cache_times[uuid] = (smoothing * seconds +
+                                      (1 - smoothing) * previous)
+        self.failures.pop(uuid, None)
+        self.retry_after.pop(uuid, None)
+
+    def _record_failure(self, uuid, now):
+        group = CONF.node_selection
+        failures = self.failures.get(uuid, 0) + 1
+        self.failures[uuid] = failures
+        limit = group.quarantine_after_failures
+        if limit and failures >= limit:
+            self.retry_after.pop(uuid, None)
+            self.quarantined[uuid] = {'failures': failures,
+                                      'since': now.isoformat()}
+            LOG.warning("Node '%(node)s' failed to cache %(num)d times in a "
+                        "row and is quarantined. It will not be cached "
+                        "again until released.",
+                        {'node': uuid, 'num': failures})
+            return
+        backoff = min(group.failure_backoff * 2 ** (failures - 1),
+                      group.max_failure_backoff)
+        self.retry_after[uuid] = now + datetime.timedelta(seconds=backoff)
+        LOG.debug("Node '%(node)s' failed to cache, %(num)d time(s) in a "
+                  "row. Not caching it for %(backoff)d second(s).",
+                  {'node': uuid, 'num': failures, 'backoff': backoff})
+
+    def held_back(self, now=None):
+        """The uuids of nodes which must not be cached: those quarantined
+        or waiting out a backoff.
+        """
+        now = now or util.now()
+        for uuid, when in list(self.retry_after.items()):
+            if when <= now:
+                del self.retry_after[uuid]
+        return set(self.retry_after) | set(self.quarantined)
+
+    def backing_off(self, now=None):
+        """Whether any node is waiting out a backoff, and so will become
+        available to cache with no other change.
+        """
+        self.held_back(now)
+        return bool(self.retry_after)
+
+    def load_quarantine(self, filename):
+        """Replace the quarantined nodes with those in filename, if it
+        exists, so nodes an operator removed are released.
+        """
+        if not os.path.exists(filename):
+            return
+        with open(filename, 'r') as infile:
+            quarantined = json.load(infile)
+        for uuid in set(self.quarantined) - set(quarantined):
+            LOG.info("Node '%(node)s' was released from quarantine.",
+                     {'node': uuid})
+            self.failures.pop(uuid, None)
+        self.quarantined = quarantined
+
+    def write_quarantine(self, filename):
+        with open(filename, 'w') as outfile:
+            json.dump(self.quarantined, outfile, indent=2, sort_keys=True)
+
+    def typical_cache_time(self):
+        """The median of every node's average time to cache, or 0 if none
+        have been observed.
+        """
+        times = sorted(self.cache_times.values())
+        if not times:
+            return 0.0
+        middle = len(times) // 2
+        if len(times) % 2:
+            return times[middle]
+        return (times[middle - 1] + times[middle]) / 2
+
+    def expected_cache_time(self, uuid, typical=None):
+        """A node's average time to cache, or the typical time for nodes
+        never observed, so they are neither favoured nor avoided.
+        """
+        if uuid in self.cache_times:
+            return self.cache_times[uuid]
+        if typical is None:
+            typical = self.typical_cache_time()
+        return typical
+
+    def clear(self):
+        self.started = {}
+        self.statuses = {}
+        self.cache_times = {}
+        self.failures = {}
+        self.retry_after = {}
+        self.quarantined = {}
+
+
+# Cache times observed by the director, shared with node selection.
+cache_times = CacheTimeTracker()
+
+
+class FastCacherNodeSelector(node_selection.NodeSelector):
+    """Chooses the nodes which cache images fastest.
+
+    Nodes which failed to cache most times in a row come last, then nodes
+    are ordered by their average time to cache. Nodes never observed are
+    assumed typical. Ties are broken at random.
+    """
+    def __init__(self, tracker=None):
+        self.tracker = tracker or cache_times
+
+    def select(self, nodes, count):
+        available = [node for node in nodes if node.can_cache()]
+        random.shuffle(available)
+        typical = self.tracker.typical_cache_time()
+        available.sort(key=lambda node: (
+            self.tracker.failures.get(node.node_uuid, 0),
+            self.tracker.expected_cache_time(node.node_uuid, typical)))
+        return available[:count]
@@ -0,0 +1,288 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Keeps strategies from wiping and re-downloading cached images needlessly.
+"""
+
+from __future__ import division
+
+from oslo_log import log
+import six
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.strategy import node_selection
+
+LOG = log.getLogger(__name__)
+
+
+class RetirementDebouncer(object):
+    """Confirms images are gone before nodes cached with them are ejected.
+
+    An image uuid missing from the image listing is only considered retired
+    once it has been missing for a number of consecutive cycles, so an image
+    briefly dropping out of Glance doesn't wipe every node caching it.
+    """
+    def __init__(self, cycles):
+        """Constructs a RetirementDebouncer object.
+
+        :param: cycles - How many consecutive cycles an image uuid must be
+            missing to be retired. 1 retires it as soon as it's missing.
+        """
+        self.cycles = cycles
+        # Consecutive cycles missing, by image uuid.
+        self.missing = {}
+
+    def observe(self, image_uuids, cached_image_uuids):
+        """Track which cached image uuids are missing.
+
+        :param image_uuids: The uuids of currently listed images.
+        :param cached_image_uuids: The image uuids cached on unprovisioned
+            nodes.
+        :returns: The set of cached image uuids which are retired.
+        """
+        image_uuids = set(image_uuids)
+        missing = dict((uuid, self.missing.get(uuid, 0) + 1)
+                       for uuid in cached_image_uuids
+                       if uuid not in image_uuids)
+        self.missing = missing
+        return set(uuid for uuid, count in six.iteritems(missing)
+                   if count >= self.cycles)
+
+    def pending(self):
+        """Image uuids missing, but not yet retired."""
+        return set(uuid for uuid, count in six.iteritems(self.missing)
+                   if count < self.cycles)
+
+
+def _download_costs(images, churn_cost):
+    """The cost of downloading each image, by name.
+
+    Images cost churn_cost times their size relative to the average size,
+    or just churn_cost when sizes aren't known.
+    """
+    sizes = [image.size for image in images if image.size]
+    mean_size = sum(sizes) / len(sizes) if sizes else None
+    costs = {}
+    for image in images:
+        if mean_size and image.size:
+            costs[image.name] = churn_cost * image.size / mean_size
+        else:
+            costs[image.name] = churn_cost
+    return costs
+
+
+def plan_rebalance(images, nodes, hysteresis=0.0, churn_cost=1.0,
+                   limit=None):
+    """Choose cached nodes to eject so the cache approaches the weighted
+    distribution of images, without churning it needlessly.
+
+    Each ejection frees a slot for the most under-cached image, so it is
+    planned as a swap of one copy of an over-cached image for one of an
+    under-cached image. A swap is only planned while:
+
+    * the over-cached image exceeds its target number of nodes by more than
+      hysteresis times that target, and
+    * the swap reduces the total distance from the target distribution, in
+      nodes, by more than the cost of downloading the under-cached image.
+
+    :param images: ImageInput objects to distribute.
+    :param nodes: NodeInput objects. Only unprovisioned nodes cached with a
+        listed image are considered.
+    :param hysteresis: The fraction of an image's target it may exceed
+        before copies of it are ejected.
+    :param churn_cost: The cost of one eject and re-download of an image of
+        average size, in nodes of distribution error.
+    :param limit: The most nodes to eject, or None for no limit.
+    :returns: A list of NodeInput objects to eject, most over-cached image
+        first.
+    """
+    names_by_uuid = dict((image.uuid, image.name) for image in images)
+    cached_by_name = dict((image.name, []) for image in images)
+    for node in nodes:
+        if node.cached and not node.provisioned:
+            name = names_by_uuid.get(node.cached_image_uuid)
+            if name is not None:
+                cached_by_name[name].append(node)
+    for cached in six.itervalues(cached_by_name):
+        cached.sort(key=lambda node: node.node_uuid)
+
+    counts = dict((name, len(cached))
+                  for name, cached in six.iteritems(cached_by_name))
+    total = sum(six.itervalues(counts))
+    weights = sb.get_image_weights(list(counts))
+    weight_sum = sum(six.itervalues(weights))
+    if total == 0 or weight_sum == 0:
+        return []
+    targets = dict((name, total * weights[name] / weight_sum)
+                   for name in counts)
+    costs = _download_costs(images, churn_cost)
+
+    planned = []
+    while limit is None or len(planned) < limit:
+        over = max(counts, key=lambda name: counts[name] - targets[name])
+        under = min(counts, key=lambda name: counts[name] - targets[name])
+        excess = counts[over] - targets[over]
+        if over == under or excess <= hysteresis * targets[over]:
+            break
+        deficit = targets[under] - counts[under]
+        reduction = (abs(excess) - abs(excess - 1) +
+                     abs(deficit) - abs(deficit - 1))
+        if reduction <= costs[under]:
+            break
+        planned.append(cached_by_name[over].pop(0))
+        counts[over] -= 1
+        counts[under] += 1
+    return planned
+
+
+class StagedRollout(object):
+    """Replaces cached copies of an image make-before-break when its uuid
+    changes.
+
+    When an image name is listed with a new uuid, the nodes cached with the
+    old uuid are kept while the new uuid is cached on free nodes, up to as
+    many nodes per flavor as had the old uuid. Old copies are then retired
+    in batches, only as far as new copies replace them, so the number of
+    cached copies of the image never drops below where it started.
+    """
+    def __init__(self, batch_size):
+        """Constructs a StagedRollout object.
+
+        :param: batch_size - The most old copies of an image to retire per
+            flavor in one cycle.
+        """
+        self.batch_size = batch_size
+        # By image name, a dict with the 'old_uuids' being replaced and the
+        # 'targets' number of copies to keep, by flavor name.
+        self.rollouts = {}
+
+    def start(self, previous_images, images, nodes):
+        """Begin rolling out images whose uuid changed.
+
+        :param previous_images: ImageInput objects listed the previous cycle.
+        :param images: ImageInput objects listed this cycle.
+        :param nodes: NodeInput objects.
+        """
+        previous_uuids = dict((image.name, image.uuid)
+                              for image in previous_images)
+        for image in images:
+            old_uuid = previous_uuids.get(image.name)
+            if old_uuid is None or old_uuid == image.uuid:
+                continue
+            rollout = self.rollouts.setdefault(
+                image.name, {'old_uuids': set(), 'targets': {}})
+            rollout['old_uuids'].add(old_uuid)
+            if rollout['targets']:
+                # Changed again mid-rollout, keep the original targets.
+                continue
+            for node in nodes:
+                if (node.cached and not node.provisioned and
+                        node.cached_image_uuid == old_uuid):
+                    targets = rollout['targets']
+                    targets[node.flavor] = targets.get(node.flavor, 0) + 1
+            LOG.info("Image '%(name)s' changed from %(old)s to %(new)s, "
+                     "rolling out the new image to %(num)d node(s) before "
+                     "retiring the old one.",
+                     {'name': image.name, 'old': old_uuid, 'new': image.uuid,
+                      'num': sum(six.itervalues(rollout['targets']))})
+
+    def flavor_names(self):
+        """The flavors holding copies of an image being rolled out."""
+        names = set()
+        for rollout in six.itervalues(self.rollouts):
+            names.update(rollout['targets'])
+        return names
+
+    def retiring(self):
+        """The old image uuids which must not be ejected wholesale yet."""
+        uuids = set()
+        for rollout in six.itervalues(self.rollouts):
+            uuids.update(rollout['old_uuids'])
+        return uuids
+
+    def directives(self, nodes_by_flavor, images, selector=None):
+        """Cache new copies and retire old ones for every image rolling out.
+
+        Nodes cached or ejected are marked internally, so later stages of the
+        cycle don't consider them. Old copies are only retired once new
+        copies report they have finished caching and can replace them, so
+        downloads still in progress are never relied on.
+
+        :param nodes_by_flavor: Lists of NodeInput objects, by flavor name.
+        :param images: ImageInput objects listed this cycle.
+        :param selector: The NodeSelector choosing which nodes to cache new
+            copies on. Nodes are chosen at random by default.
+        :returns: A list of CacheNode and EjectNode directives.
+        """
+        if selector is None:
+            selector = node_selection.RandomNodeSelector()
+        # Nodes which recently failed to cache, or keep failing, are left
+        # alone, as they are by the other stages.
+        held_back = cache_tracking.cache_times.held_back()
+        images_by_name = dict((image.name, image) for image in images)
+        todo = []
+        for name in sorted(self.rollouts):
+            rollout = self.rollouts[name]
+            image = images_by_name.get(name)
+            if image is None:
+                # Retired outright, so its copies are ejected as usual.
+                del self.rollouts[name]
+                continue
+            remaining = 0
+            for flavor_name, target in sorted(
+                    six.iteritems(rollout['targets'])):
+                flavor_nodes = nodes_by_flavor.get(flavor_name, [])
+                old = sorted(
+                    (node for node in flavor_nodes
+                     if node.cached and not node.provisioned and
+                     node.cached_image_uuid in rollout['old_uuids']),
+                    key=lambda node: node.node_uuid)
+                new = [node for node in flavor_nodes
+                       if node.cached and not node.provisioned and
+                       node.cached_image_uuid == image.uuid]
+                # Copies still downloading can't stand in for old ones yet.
+                new_count = len([
+                    node for node in new
+                    if node.cache_status == cache_tracking.CACHED])
+
+                candidates = [node for node in flavor_nodes
+                              if node.node_uuid not in held_back]
+                for node in selector.select(
+                        candidates, max(target - len(new), 0)):
+                    todo.append(sb.CacheNode(node.node_uuid, image.uuid,
+                                             image.checksum))
+                    node.cached = True
+                    node.cached_image_uuid = image.uuid
+
+                retire = min(self.batch_size, len(old),
+                             max(new_count + len(old) - target, 0))
+                for node in old[:retire]:
+                    todo.append(sb.EjectNode(node.node_uuid))
+                    node.provisioned = True
+                remaining += len(old) - retire
+                LOG.debug("Rolling out image '%(name)s' to flavor "
+                          "'%(flavor)s': %(new)d of %(target)d new copies, "
+                          "retiring %(retire)d of %(old)d old copies.",
+                          {'name': name, 'flavor': flavor_name,
+                           'new': new_count, 'target': target,
+                           'retire': retire, 'old': len(old)})
+            if not remaining:
+                LOG.info("Finished rolling out image '%(name)s'.",
+                         {'name': name})
+                del self.rollouts[name]
+        return todo
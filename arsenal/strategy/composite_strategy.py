@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log
+import six
+
+from arsenal.strategy import base as sb
+
+LOG = log.getLogger(__name__)
+
+
+class CompositeStrategy(sb.CachingStrategy):
+    """Runs one instance of the configured strategy per fleet.
+
+    Used alongside CompositeScout, so that each member scout's nodes, images
+    and flavors are considered in isolation, exactly as if each fleet ran in
+    its own director.
+    """
+    def __init__(self, partition_func, member_names):
+        """Constructs a CompositeStrategy object.
+
+        :param: partition_func - A function accepting nodes, images and
+            flavors, and returning a list of (member_name, nodes, images,
+            flavors) tuples. See CompositeScout.partition.
+        :param: member_names - The names of the fleets to build strategies
+            for.
+        """
+        self.partition = partition_func
+        self.member_names = list(member_names)
+        self.strategies = dict((name, sb.get_configured_strategy())
+                               for name in self.member_names)
+        self.runnable = set()
+
+    def update_current_state(self, nodes, images, flavors):
+        self.runnable = set()
+        for name, member_nodes, member_images, member_flavors in (
+                self.partition(nodes, images, flavors)):
+            self.strategies[name].update_current_state(
+                member_nodes, member_images, member_flavors)
+            if member_nodes and member_images and member_flavors:
+                self.runnable.add(name)
+            else:
+                LOG.warning("Fleet '%(name)s' is missing nodes, images or "
+                            "flavors. Skipping its strategy this cycle.",
+                            {'name': name})
+
+    def has_pending_work(self):
+        return any(strat.has_pending_work()
+                   for strat in six.itervalues(self.strategies))
+
+    def directives(self):
+        todo = []
+        for name in self.member_names:
+            if name in self.runnable:
+                todo.extend(self.strategies[name].directives())
+        return todo
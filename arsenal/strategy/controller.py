@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Feedback control for cache targets."""
+
+
+def clamp(value, lower, upper):
+    return max(lower, min(upper, value))
+
+
+class PIController(object):
+    """A proportional-integral controller with bounded output.
+
+    Each update moves the output towards holding the measurement at the
+    setpoint. Three things keep it from oscillating: measurements are
+    smoothed with an exponentially weighted moving average, the output
+    moves at most max_step per update, and the integral stops accumulating
+    while the output is pinned at a bound (anti-windup).
+
+    Updates are assumed to be evenly spaced, so gains are per update.
+    """
+    def __init__(self, setpoint, proportional_gain, integral_gain,
+                 initial_output, output_min, output_max, smoothing=1.0,
+                 max_step=None):
+        """Constructs a PIController object.
+
+        :param: setpoint - The measurement to hold.
+        :param: proportional_gain - Output change per unit of error.
+        :param: integral_gain - Output change per unit of error accumulated
+            over updates.
+        :param: initial_output - The output before any measurement, which
+            the output is computed relative to.
+        :param: output_min, output_max - Bounds on the output.
+        :param: smoothing - Weight of each new measurement in the moving
+            average, from 0 to 1. 1 disables smoothing.
+        :param: max_step - The most the output may change in one update, or
+            None for no limit.
+        """
+        self.setpoint = setpoint
+        self.proportional_gain = proportional_gain
+        self.integral_gain = integral_gain
+        self.bias = initial_output
+        self.output_min = output_min
+        self.output_max = output_max
+        self.smoothing = smoothing
+        self.max_step = max_step
+        self.integral = 0.0
+        self.filtered = None
+        self.output = clamp(initial_output, output_min, output_max)
+
+    def _raw_output(self, error, integral):
+        return (self.bias + self.proportional_gain * error +
+                self.integral_gain * integral)
+
+    def update(self, measurement):
+        """Feed a measurement, returning the new output."""
+        if self.filtered is None:
+            self.filtered = measurement
+        else:
+            self.filtered = (self.smoothing * measurement +
+                             (1 - self.smoothing) * self.filtered)
+        error = self.setpoint - self.filtered
+
+        integral = self.integral + error
+        raw = self._raw_output(error, integral)
+        saturated_high = raw > self.output_max and error > 0
+        saturated_low = raw < self.output_min and error < 0
+        if not (saturated_high or saturated_low):
+            self.integral = integral
+        output = clamp(self._raw_output(error, self.integral),
+                       self.output_min, self.output_max)
+
+        if self.max_step is not None:
+            output = clamp(output, self.output - self.max_step,
+                           self.output + self.max_step)
+        self.output = output
+        return output
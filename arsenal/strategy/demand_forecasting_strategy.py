@@ -0,0 +1,192 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from __future__ import division
+
+import math
+
+from oslo_config import cfg
+from oslo_log import log
+import six
+
+from arsenal.common import util
+from arsenal.strategy import base as sb
+from arsenal.strategy import node_selection
+from arsenal.strategy import simple_proportional_strategy as sps
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.FloatOpt('smoothing',
+                 default=0.1,
+                 min=0,
+                 max=1,
+                 help='How much weight each cycle\'s observed provisioning '
+                      'rate gets in a flavor\'s moving average. Higher '
+                      'values follow changes in demand faster, lower values '
+                      'ride out bursts.'),
+    cfg.IntOpt('refill_time',
+               default=1800,
+               min=0,
+               help='How long, in seconds, it takes to replace a cached node '
+                    'once it has been provisioned. The cache of each flavor '
+                    'is sized to cover the demand expected over this time.'),
+    cfg.FloatOpt('safety_factor',
+                 default=1.5,
+                 min=0,
+                 help='Multiplies the expected demand of every flavor, to '
+                      'absorb bursts above the average rate.'),
+    cfg.IntOpt('min_cached_per_flavor',
+               default=0,
+               min=0,
+               help='The least number of nodes to keep cached in each '
+                    'flavor, however cold.'),
+    cfg.FloatOpt('max_percentage_to_cache',
+                 default=0.5,
+                 min=0,
+                 max=1,
+                 help='The most unprovisioned nodes of each flavor to cache, '
+                      'as a floating point number between 0 and 1 '
+                      'inclusive.'),
+]
+
+dfs_group = cfg.OptGroup(name='demand_forecasting_strategy',
+                         title='Demand Forecasting Strategy Options')
+
+CONF = cfg.CONF
+CONF.register_group(dfs_group)
+CONF.register_opts(opts, dfs_group)
+
+
+class DemandForecastingStrategy(sb.CachingStrategy):
+    """Sizes each flavor's cache to the demand expected before it refills.
+
+    Each flavor's provisioning rate is estimated with an exponentially
+    weighted moving average of how many unprovisioned nodes were found
+    provisioned since the previous update. Nodes this strategy ejected are
+    not counted, since they look provisioned while they're cleaned.
+    """
+    def __init__(self):
+        group = CONF.demand_forecasting_strategy
+        self.smoothing = group.smoothing
+        self.refill_time = group.refill_time
+        self.safety_factor = group.safety_factor
+        self.min_cached_per_flavor = group.min_cached_per_flavor
+        self.max_percentage_to_cache = group.max_percentage_to_cache
+        self.node_selector = node_selection.get_configured_node_selector()
+
+        LOG.info("Initializing with a refill time of %(refill)d second(s) "
+                 "and a safety factor of %(safety)f.",
+                 {'refill': self.refill_time, 'safety': self.safety_factor})
+
+        self.current_flavors = []
+        self.current_images = []
+        self.current_nodes = []
+        # Estimated provisions per second, by flavor name.
+        self.arrival_rates = {}
+        self.last_update = None
+        # Uuids of nodes unprovisioned as of the previous update.
+        self.unprovisioned = None
+        self.ejected = set()
+
+    def _observe_arrivals(self, nodes, now):
+        arrivals = dict((flavor.name, 0) for flavor in self.current_flavors)
+        for node in nodes:
+            if (node.provisioned and node.node_uuid in self.unprovisioned and
+                    node.node_uuid not in self.ejected and
+                    node.flavor in arrivals):
+                arrivals[node.flavor] += 1
+
+        elapsed = (now - self.last_update).total_seconds()
+        for name, count in six.iteritems(arrivals):
+            observed = count / elapsed
+            previous = self.arrival_rates.get(name)
+            if previous is None:
+                self.arrival_rates[name] = observed
+            else:
+                self.arrival_rates[name] = (self.smoothing * observed +
+                                            (1 - self.smoothing) * previous)
+            LOG.debug("Flavor '%(flavor)s' saw %(count)d provision(s), "
+                      "estimated rate is now %(rate)f per hour.",
+                      {'flavor': name, 'count': count,
+                       'rate': self.arrival_rates[name] * 3600})
+
+    def update_current_state(self, nodes, images, flavors):
+        self.flavor_diff = sb.find_flavor_differences(self.current_flavors,
+                                                      flavors)
+        sb.log_flavor_differences(self.flavor_diff)
+        self.current_flavors = flavors
+        for name in self.flavor_diff['retired']:
+            self.arrival_rates.pop(name, None)
+
+        self.image_diff = sb.find_image_differences(self.current_images,
+                                                    images)
+        sb.log_image_differences(self.image_diff)
+        self.current_images = images
+
+        now = util.now()
+        if self.unprovisioned is not None and now > self.last_update:
+            self._observe_arrivals(nodes, now)
+            self.ejected = set()
+        if self.last_update is None or now > self.last_update:
+            self.unprovisioned = set(node.node_uuid for node in nodes
+                                     if not node.provisioned)
+            self.last_update = now
+        self.current_nodes = nodes
+
+    def target_cached(self, flavor_name, flavor_nodes):
+        """How many nodes of a flavor should be cached.
+
+        The expected provisions over refill_time, scaled by safety_factor,
+        bounded below by min_cached_per_flavor and above by
+        max_percentage_to_cache of the flavor's unprovisioned nodes.
+        """
+        expected = (self.arrival_rates.get(flavor_name, 0) *
+                    self.refill_time * self.safety_factor)
+        ceiling = int(math.floor(self.max_percentage_to_cache *
+                                 len(sps.unprovisioned_nodes(flavor_nodes))))
+        target = max(int(math.ceil(expected)), self.min_cached_per_flavor)
+        return min(target, ceiling)
+
+    def directives(self):
+        """Eject nodes with retired images, then top up each flavor's cache
+        to its forecast demand.
+        """
+        todo = []
+        ejections = sps.eject_nodes(
+            self.current_nodes,
+            [image.uuid for image in self.current_images])
+        self.ejected.update(ejection.node_uuid for ejection in ejections)
+        todo.extend(ejections)
+
+        nodes_by_flavor = sps.segregate_nodes(self.current_nodes,
+                                              self.current_flavors)
+        for flavor_name, flavor_nodes in six.iteritems(nodes_by_flavor):
+            target = self.target_cached(flavor_name, flavor_nodes)
+            needed = min(
+                max(target - len(sps.cached_nodes(flavor_nodes)), 0),
+                len(sps.nodes_available_for_caching(flavor_nodes)))
+            LOG.debug("Flavor '%(flavor)s' should have %(target)d cached "
+                      "node(s), caching %(needed)d more.",
+                      {'flavor': flavor_name, 'target': target,
+                       'needed': needed})
+            todo.extend(sps.cache_nodes(flavor_nodes, needed,
+                                        self.current_images,
+                                        self.node_selector))
+
+        LOG.debug("Issuing %(num)d directives(s).", {'num': len(todo)})
+        return todo
@@ -0,0 +1,150 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Policies for choosing which nodes to cache images on."""
+
+import abc
+import random
+
+from oslo_config import cfg
+from oslo_log import log
+import six
+
+from arsenal.common import util
+
+LOG = log.getLogger(__name__)
+
+opts = [
+    cfg.StrOpt('selector_class',
+               default='node_selection.RandomNodeSelector',
+               help='The node selector to load, as module.ClassName within '
+                    'arsenal.strategy. node_selection.RandomNodeSelector '
+                    'picks nodes at random. '
+                    'node_selection.TopologySpreadingNodeSelector spreads '
+                    'cached nodes and downloads over the topology domains '
+                    'reported by the scout.'),
+    cfg.IntOpt('max_caching_per_domain',
+               default=0,
+               min=0,
+               help='With TopologySpreadingNodeSelector, the most nodes of '
+                    'a flavor in one topology domain caching at once, '
+                    'counting downloads still in progress from earlier '
+                    'cycles, bounding the downloads sharing a domain\'s '
+                    'uplink. 0 is no limit.'),
+]
+
+node_selection_group = cfg.OptGroup(name='node_selection',
+                                    title='Node Selection Options')
+
+CONF = cfg.CONF
+CONF.register_group(node_selection_group)
+CONF.register_opts(opts, node_selection_group)
+
+
+def get_configured_node_selector():
+    loader = util.LoadClass(CONF.node_selection.selector_class,
+                            package_prefix='arsenal.strategy')
+    return loader.loaded_class()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class NodeSelector(object):
+    """Base object for policies choosing the nodes to cache images on."""
+
+    @abc.abstractmethod
+    def select(self, nodes, count):
+        """Choose nodes to cache.
+
+        :param nodes: NodeInput objects of a single flavor, including those
+            which can't be cached, for context.
+        :param count: How many nodes to choose.
+        :returns: Up to count NodeInput objects which can be cached. Fewer
+            if the policy holds some back.
+        """
+        pass
+
+
+class RandomNodeSelector(NodeSelector):
+    """Chooses nodes available for caching at random."""
+
+    def select(self, nodes, count):
+        available = [node for node in nodes if node.can_cache()]
+        random.shuffle(available)
+        return available[:count]
+
+
+class TopologySpreadingNodeSelector(NodeSelector):
+    """Spreads cached nodes evenly over topology domains, such as racks.
+
+    Each node is chosen from the domain with the fewest cached nodes,
+    counting nodes chosen so far, so neither downloads nor the cache
+    concentrate in one failure domain. Nodes without a topology share one
+    domain. Within a domain, nodes are chosen at random.
+    """
+    def __init__(self, max_caching_per_domain=None):
+        """Constructs a TopologySpreadingNodeSelector object.
+
+        :param: max_caching_per_domain - The most nodes of one domain which
+            may be caching at once, counting nodes still caching from
+            earlier cycles, or 0 for no limit. Defaults to the configured
+            max_caching_per_domain.
+        """
+        if max_caching_per_domain is None:
+            max_caching_per_domain = (
+                CONF.node_selection.max_caching_per_domain)
+        self.max_caching_per_domain = max_caching_per_domain
+
+    def select(self, nodes, count):
+        available = {}
+        load = {}
+        caching = {}
+        for node in nodes:
+            if node.provisioned:
+                continue
+            load.setdefault(node.topology, 0)
+            caching.setdefault(node.topology, 0)
+            if node.is_caching():
+                caching[node.topology] += 1
+            if node.cached:
+                load[node.topology] += 1
+            else:
+                available.setdefault(node.topology, []).append(node)
+        for domain_nodes in six.itervalues(available):
+            random.shuffle(domain_nodes)
+
+        chosen = []
+        while len(chosen) < count:
+            candidates = [
+                domain for domain, domain_nodes in six.iteritems(available)
+                if domain_nodes and not (
+                    self.max_caching_per_domain and
+                    caching[domain] >= self.max_caching_per_domain)]
+            if not candidates:
+                break
+            domain = min(candidates,
+                         key=lambda domain: (load[domain], domain))
+            chosen.append(available[domain].pop())
+            caching[domain] += 1
+            load[domain] += 1
+
+        if len(chosen) < count:
+            LOG.debug("Chose %(chosen)d of %(count)d node(s) to cache, the "
+                      "rest of the available nodes are in domains at their "
+                      "limit of %(limit)d caching at once.",
+                      {'chosen': len(chosen), 'count': count,
+                       'limit': self.max_caching_per_domain})
+        return chosen
@@ -17,15 +17,23 @@
 
 from __future__ import division
 
+import collections
+import datetime
+import itertools
 import math
-import random
 
 from oslo_config import cfg
 from oslo_log import log
 import six
 
 from arsenal.common import exception
+from arsenal.common import util
 from arsenal.strategy import base as sb
+from arsenal.strategy import cache_schedule
+from arsenal.strategy import cache_tracking
+from arsenal.strategy import churn
+from arsenal.strategy import controller
+from arsenal.strategy import node_selection
 
 LOG = log.getLogger(__name__)
 
@@ -37,7 +45,93 @@ opts = [
                  help='The percentage of unprovisioned nodes in each flavor to'
                  'schedule for image caching. Expressed as a floating '
                  'point number between 0 and 1 inclusive, '
-                 'where 0 is 0%, 1 is 100%, and 0.5 is 50%.')
+                 'where 0 is 0%, 1 is 100%, and 0.5 is 50%.'),
+    cfg.IntOpt('retirement_debounce_cycles',
+               default=1,
+               min=1,
+               help='How many consecutive cycles an image must be missing '
+                    'from the image listing before nodes cached with it are '
+                    'ejected. 1 ejects them as soon as it is missing. Higher '
+                    'values ride out images briefly disappearing.'),
+    cfg.BoolOpt('staged_rollout',
+                default=False,
+                help='When an image is listed with a new uuid, keep the '
+                     'nodes cached with the old uuid until the new uuid is '
+                     'cached on as many free nodes, then eject the old '
+                     'copies in batches of rollout_batch_size. Otherwise '
+                     'every old copy is ejected at once.'),
+    cfg.IntOpt('rollout_batch_size',
+               default=5,
+               min=1,
+               help='With staged_rollout, the most nodes cached with an old '
+                    'image uuid to eject per flavor each cycle.'),
+    cfg.IntOpt('rebalance_ejections_per_cycle',
+               default=0,
+               min=0,
+               help='The most cached nodes per flavor to eject each cycle '
+                    'because their image is cached more than its weight '
+                    'calls for, beyond rebalance_hysteresis and worth '
+                    'rebalance_churn_cost, freeing them to cache '
+                    'under-weighted images. 0 disables rebalancing. '
+                    'Ejections are still subject to the director\'s '
+                    'eject_directive_rate_limit.'),
+    cfg.FloatOpt('rebalance_hysteresis',
+                 default=0.1,
+                 min=0,
+                 help='When rebalancing, the fraction of an image\'s target '
+                      'number of cached nodes it may exceed before copies '
+                      'of it are ejected, so small weight changes don\'t '
+                      'churn the cache.'),
+    cfg.FloatOpt('rebalance_churn_cost',
+                 default=1.0,
+                 min=0,
+                 help='When rebalancing, the cost of ejecting a node and '
+                      'downloading an image of average size onto it, in '
+                      'nodes of distance from the weighted distribution. '
+                      'Swaps which don\'t reduce the distance by more are '
+                      'not made. Larger images cost proportionally more.'),
+    cfg.FloatOpt('target_hit_rate',
+                 min=0,
+                 max=1,
+                 help='When set, the percentage of each flavor to cache is '
+                      'adjusted every cycle to hold this fraction of '
+                      'provisions landing on a node with the deployed image '
+                      'already cached. percentage_to_cache is the starting '
+                      'point.'),
+    cfg.FloatOpt('controller_proportional_gain',
+                 default=0.1,
+                 min=0,
+                 help='How much the percentage to cache moves per unit of '
+                      'hit rate error.'),
+    cfg.FloatOpt('controller_integral_gain',
+                 default=0.02,
+                 min=0,
+                 help='How much the percentage to cache moves per unit of '
+                      'hit rate error accumulated over cycles.'),
+    cfg.FloatOpt('controller_smoothing',
+                 default=0.3,
+                 min=0,
+                 max=1,
+                 help='Weight of each cycle\'s observed hit rate in the '
+                      'moving average the controller acts on.'),
+    cfg.FloatOpt('controller_max_step',
+                 default=0.02,
+                 min=0,
+                 max=1,
+                 help='The most the percentage to cache may change in one '
+                      'cycle.'),
+    cfg.FloatOpt('min_percentage_to_cache',
+                 default=0.0,
+                 min=0,
+                 max=1,
+                 help='The lowest percentage to cache the controller may '
+                      'choose.'),
+    cfg.FloatOpt('max_percentage_to_cache',
+                 default=0.5,
+                 min=0,
+                 max=1,
+                 help='The highest percentage to cache the controller may '
+                      'choose.'),
 ]
 
 sps_group = cfg.OptGroup(name='simple_proportional_strategy',
@@ -96,21 +190,74 @@ def eject_nodes(nodes, image_uuids):
     return ejections
 
 
-def cache_nodes(nodes, num_nodes_needed, images):
-    available_nodes = nodes_available_for_caching(nodes)
+def rebalance_nodes(nodes, images, max_ejections, hysteresis=0.0,
+                    churn_cost=1.0):
+    """Eject cached nodes whose images are cached more than their weights
+    call for, and mark them as provisioned internally.
 
-    # Choose the images to cache in advance, based on how many nodes we should
+    churn.plan_rebalance gates how many copies of each image may go, so
+    images within hysteresis of their target, and swaps not worth their
+    download cost, are left alone. Within that allowance, images are ejected
+    in the order sb.image_weight_guided_ejection gives, so each ejection does
+    the most for the weighted distribution.
+
+    :param nodes: NodeInput objects of a single flavor.
+    :param images: ImageInput objects to distribute.
+    :param max_ejections: The most nodes to eject.
+    :param hysteresis: See churn.plan_rebalance.
+    :param churn_cost: See churn.plan_rebalance.
+    :returns: A list of EjectNode directives.
+    """
+    planned = churn.plan_rebalance(images, nodes, hysteresis, churn_cost,
+                                   limit=max_ejections)
+    if not planned:
+        return []
+    allowed = collections.OrderedDict()
+    for node in planned:
+        allowed.setdefault(node.cached_image_uuid, []).append(node)
+    ordered = []
+    for image in sb.image_weight_guided_ejection(images, nodes):
+        if allowed.get(image.uuid):
+            ordered.append(allowed[image.uuid].pop(0))
+    # Anything the gate allows but the weights don't call for goes last.
+    for image_nodes in six.itervalues(allowed):
+        ordered.extend(image_nodes)
+
+    ejections = []
+    for node in ordered:
+        ejections.append(sb.EjectNode(node.node_uuid))
+        node.provisioned = True
+    return ejections
+
+
+def cache_nodes(nodes, num_nodes_needed, images, selector=None):
+    """Cache images on up to num_nodes_needed nodes.
+
+    :param nodes: NodeInput objects of a single flavor.
+    :param num_nodes_needed: How many nodes to cache.
+    :param images: ImageInput objects to choose from.
+    :param selector: The NodeSelector choosing which nodes to cache. Nodes
+        are chosen at random by default.
+    :returns: A list of CacheNode directives.
+    """
+    if selector is None:
+        selector = node_selection.RandomNodeSelector()
+    # Nodes which recently failed to cache, or keep failing, are left alone.
+    held_back = cache_tracking.cache_times.held_back()
+    if held_back:
+        nodes = [node for node in nodes if node.node_uuid not in held_back]
+    chosen_nodes = selector.select(nodes, num_nodes_needed)
+
+    # Choose the images to cache in advance, based on how many nodes we will
     # use for caching.
     chosen_images = sb.choose_weighted_images_forced_distribution(
-        num_nodes_needed, images, nodes)
+        len(chosen_nodes), images, nodes)
 
     # If we're not meeting or exceeding our proportion goal,
     # schedule (node, image) pairs to cache until we would meet
     # our proportion goal.
     nodes_to_cache = []
-    random.shuffle(available_nodes)
-    for n in range(0, num_nodes_needed):
-        node = available_nodes.pop()
+    for node in chosen_nodes:
         image = chosen_images.pop()
         nodes_to_cache.append(sb.CacheNode(node.node_uuid,
                                            image.uuid,
@@ -119,8 +266,14 @@ def cache_nodes(nodes, num_nodes_needed, images):
 
 
 def how_many_nodes_should_cache(nodes, percentage_to_cache):
-    should_cache = int(math.floor(percentage_to_cache * len(
-        unprovisioned_nodes(nodes)))) - len(cached_nodes(nodes))
+    return nodes_to_cache_for(len(unprovisioned_nodes(nodes)),
+                              len(cached_nodes(nodes)),
+                              percentage_to_cache)
+
+
+def nodes_to_cache_for(num_unprovisioned, num_cached, percentage_to_cache):
+    should_cache = int(math.floor(
+        percentage_to_cache * num_unprovisioned)) - num_cached
     if should_cache < 0:
         should_cache = 0
     LOG.debug("Should cache %(should_cache)d node(s), based on number "
@@ -128,35 +281,264 @@ def how_many_nodes_should_cache(nodes, percentage_to_cache):
               "nodes %(cached)d, and the percentage of unprovisioned nodes "
               "to cache: %(to_cache_percentage)f",
               {'should_cache': should_cache,
-               'unpro': len(unprovisioned_nodes(nodes)),
-               'cached': len(cached_nodes(nodes)),
+               'unpro': num_unprovisioned,
+               'cached': num_cached,
                'to_cache_percentage': percentage_to_cache})
     return should_cache
 
 
+class NodeIndex(object):
+    """Nodes by flavor and by cached image, with counts of each flavor's
+    unprovisioned and cached nodes, kept up to date as nodes are added,
+    changed and removed.
+
+    Everything is indexed by the state nodes had when they were added, so
+    marks made on nodes afterwards don't unbalance the counts.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # Nodes, and the (flavor, provisioned, cached, cached image uuid)
+        # they were indexed with, by node uuid.
+        self.nodes = {}
+        self.states = {}
+        # Nodes by node uuid, in the order added, by flavor name.
+        self.by_flavor = {}
+        # Unprovisioned nodes, and those of them cached, by flavor name.
+        self.unprovisioned = collections.defaultdict(int)
+        self.cached = collections.defaultdict(int)
+        # Cached unprovisioned nodes by node uuid, by cached image uuid.
+        self.by_image = {}
+        # Names of flavors with nodes added, changed or removed since this
+        # was last cleared.
+        self.changed_flavors = set()
+
+    def rebuild(self, nodes):
+        self.clear()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        """Index a node, replacing any node with the same uuid."""
+        uuid = node.node_uuid
+        self.remove(uuid)
+        self.nodes[uuid] = node
+        self.changed_flavors.add(node.flavor)
+        self.states[uuid] = (node.flavor, node.provisioned, node.cached,
+                             node.cached_image_uuid)
+        self.by_flavor.setdefault(
+            node.flavor, collections.OrderedDict())[uuid] = node
+        if not node.provisioned:
+            self.unprovisioned[node.flavor] += 1
+            if node.cached:
+                self.cached[node.flavor] += 1
+                self.by_image.setdefault(node.cached_image_uuid,
+                                         collections.OrderedDict())[uuid] = (
+                    node)
+
+    def remove(self, uuid):
+        if uuid not in self.nodes:
+            return
+        del self.nodes[uuid]
+        flavor, provisioned, cached, image_uuid = self.states.pop(uuid)
+        self.changed_flavors.add(flavor)
+        del self.by_flavor[flavor][uuid]
+        if not self.by_flavor[flavor]:
+            del self.by_flavor[flavor]
+        if not provisioned:
+            self.unprovisioned[flavor] -= 1
+            if cached:
+                self.cached[flavor] -= 1
+                del self.by_image[image_uuid][uuid]
+                if not self.by_image[image_uuid]:
+                    del self.by_image[image_uuid]
+
+    def all_nodes(self):
+        return list(six.itervalues(self.nodes))
+
+    def flavor_nodes(self, flavor_name):
+        return list(six.itervalues(self.by_flavor.get(flavor_name, {})))
+
+    def cached_image_uuids(self):
+        """The image uuids cached on unprovisioned nodes."""
+        return set(self.by_image)
+
+    def cached_without(self, image_uuids):
+        """Unprovisioned nodes cached with an image not in image_uuids."""
+        nodes = []
+        for image_uuid, image_nodes in six.iteritems(self.by_image):
+            if image_uuid not in image_uuids:
+                nodes.extend(six.itervalues(image_nodes))
+        return nodes
+
+    def restore(self, uuids):
+        """Undo marks made on nodes since they were indexed."""
+        for uuid in uuids:
+            if uuid in self.nodes:
+                node = self.nodes[uuid]
+                (_flavor, node.provisioned, node.cached,
+                 node.cached_image_uuid) = self.states[uuid]
+
+
 class InvalidPercentageError(exception.ArsenalException):
     msg_fmt = ("An invalid percentage was specified. Percentages should be "
                "less than or equal to 1, and greater than or equal to 0. "
                "Got '%(percentage)f'.")
 
 
+class InvalidPercentageBoundsError(exception.ArsenalException):
+    msg_fmt = ("min_percentage_to_cache (%(min)f) must not be greater than "
+               "max_percentage_to_cache (%(max)f).")
+
+
+def observe_consumption(nodes, previous_cache, ejected):
+    """Count provisions and cache hits since the previous cycle, by flavor.
+
+    :param nodes: The current NodeInput objects.
+    :param previous_cache: Cached image uuid by node uuid for nodes which
+        were unprovisioned the previous cycle, '' for uncached nodes.
+    :param ejected: Uuids of nodes ejected the previous cycle. They look
+        provisioned while they're cleaned, so they are not counted.
+    :returns: A dict of flavor name to (provisions, hits) tuples. A
+        provision is a hit if the node was cached with the image it was
+        deployed with, or with any image if the scout doesn't report
+        deployed images.
+    """
+    consumption = {}
+    for node in nodes:
+        cached_image = previous_cache.get(node.node_uuid)
+        if (cached_image is None or not node.provisioned or
+                node.node_uuid in ejected):
+            continue
+        provisions, hits = consumption.get(node.flavor, (0, 0))
+        deployed = node.deployed_image_uuid
+        hit = bool(cached_image) and (not deployed or
+                                      deployed == cached_image)
+        consumption[node.flavor] = (provisions + 1, hits + int(hit))
+    return consumption
+
+
 class SimpleProportionalStrategy(object):
     def __init__(self):
-        percentage_to_cache = (
-            CONF.simple_proportional_strategy.percentage_to_cache)
+        group = CONF.simple_proportional_strategy
+        percentage_to_cache = group.percentage_to_cache
         # Clamp the percentage to reasonable values.
         if percentage_to_cache < 0 or percentage_to_cache > 1:
             raise InvalidPercentageError(percentage=percentage_to_cache)
+        if group.min_percentage_to_cache > group.max_percentage_to_cache:
+            raise InvalidPercentageBoundsError(
+                min=group.min_percentage_to_cache,
+                max=group.max_percentage_to_cache)
 
         LOG.info("Initializing with proportional goal of %(goal)f",
                  {'goal': percentage_to_cache})
 
         self.percentage_to_cache = percentage_to_cache
+        self.schedule = cache_schedule.get_configured_schedule()
+        self.target_hit_rate = group.target_hit_rate
+        if self.target_hit_rate is not None:
+            LOG.info("The percentage to cache will be adjusted to hold a "
+                     "hit rate of %(rate)f.", {'rate': self.target_hit_rate})
+        # Hit rate controllers and their current percentages, by flavor.
+        self.controllers = {}
+        self.flavor_percentages = {}
+        # Cached image uuid by node uuid of last cycle's unprovisioned
+        # nodes, and the nodes ejected since.
+        self.previous_cache = None
+        self.ejected = set()
+        self.debouncer = churn.RetirementDebouncer(
+            group.retirement_debounce_cycles)
+        self.node_selector = node_selection.get_configured_node_selector()
+        self.rebalance_ejections_per_cycle = (
+            group.rebalance_ejections_per_cycle)
+        self.rebalance_hysteresis = group.rebalance_hysteresis
+        self.rebalance_churn_cost = group.rebalance_churn_cost
+        self.rollout = None
+        if group.staged_rollout:
+            self.rollout = churn.StagedRollout(group.rollout_batch_size)
         self.current_flavors = []
         self.current_images = []
-        self.current_nodes = []
+        self.nodes = NodeIndex()
+        # Whether nodes were last given through apply_node_changes, in which
+        # case unchanged nodes are kept from cycle to cycle.
+        self.incremental = False
+        # uuids of nodes left marked by the last directives() of a full
+        # update.
+        self.marked = []
+        # The image uuids and weights the cache was last rebalanced for, and
+        # the flavors whose last rebalance ejected nodes.
+        self.rebalance_inputs = None
+        self.rebalancing = set()
+
+    def _new_controller(self):
+        group = CONF.simple_proportional_strategy
+        return controller.PIController(
+            self.target_hit_rate,
+            group.controller_proportional_gain,
+            group.controller_integral_gain,
+            self.percentage_to_cache,
+            group.min_percentage_to_cache,
+            group.max_percentage_to_cache,
+            smoothing=group.controller_smoothing,
+            max_step=group.controller_max_step)
+
+    def _adjust_percentages(self, nodes, previous_cache):
+        consumption = observe_consumption(nodes, previous_cache,
+                                          self.ejected)
+        for flavor_name, (provisions, hits) in six.iteritems(consumption):
+            if flavor_name not in self.controllers:
+                self.controllers[flavor_name] = self._new_controller()
+            percentage = self.controllers[flavor_name].update(
+                hits / provisions)
+            self.flavor_percentages[flavor_name] = percentage
+            LOG.info("Flavor '%(flavor)s' had %(hits)d cache hit(s) in "
+                     "%(provisions)d provision(s), now caching %(pct)f of "
+                     "unprovisioned nodes.",
+                     {'flavor': flavor_name, 'hits': hits,
+                      'provisions': provisions, 'pct': percentage})
+
+    def percentage_for(self, flavor_name):
+        """The percentage of a flavor's unprovisioned nodes to cache.
+
+        The hit rate controller's percentage if it has adjusted the flavor,
+        otherwise the scheduled percentage if the flavor is scheduled,
+        otherwise percentage_to_cache.
+        """
+        if flavor_name in self.flavor_percentages:
+            return self.flavor_percentages[flavor_name]
+        if self.schedule is not None:
+            scheduled = self.schedule.target(flavor_name)
+            if scheduled is not None:
+                return scheduled
+        return self.percentage_to_cache
+
+    def has_pending_work(self):
+        """Pending while missing images are being debounced, an image is
+        rolling out, or a flavor's scheduled target rises within the hour.
+        """
+        if self.debouncer.pending():
+            return True
+        if self.rollout is not None and self.rollout.rollouts:
+            return True
+        if self.schedule is not None:
+            now = util.now()
+            later = now + datetime.timedelta(hours=1)
+            for flavor in self.current_flavors:
+                target = self.schedule.target(flavor.name, now)
+                if (target is not None and
+                        self.schedule.target(flavor.name, later) > target):
+                    return True
+        return False
 
     def update_current_state(self, nodes, images, flavors):
+        """Update the strategy's view of the system. nodes is None when
+        apply_node_changes was given the nodes which changed instead.
+        """
+        if nodes is not None:
+            self.incremental = False
+            self.nodes.rebuild(nodes)
+
         # For now, flavors should remain static.
         # In the future we'll handle changing flavor profiles if needed,
         # but it seems unlikely that flavors will change often enough.
@@ -170,14 +552,88 @@ class SimpleProportionalStrategy(object):
         self.image_diff = sb.find_image_differences(self.current_images,
                                                     images)
         sb.log_image_differences(self.image_diff)
+        if self.rollout is not None and self.image_diff['changed']:
+            self.rollout.start(self.current_images, images,
+                               self.nodes.all_nodes())
         self.current_images = images
         self.current_image_uuids = sb.build_attribute_set(images, 'uuid')
 
-        # We don't compare old node state versus new, because that would be
-        # a relatively large and complicated task. Instead, we only rely on
-        # the current state of nodes to inform ourselves whether we're meeting
-        # our stated goals or not.
-        self.current_nodes = nodes
+        if self.target_hit_rate is not None:
+            for name in self.flavor_diff['retired']:
+                self.controllers.pop(name, None)
+                self.flavor_percentages.pop(name, None)
+
+        if self.target_hit_rate is not None and nodes is not None:
+            if self.previous_cache is not None:
+                self._adjust_percentages(nodes, self.previous_cache)
+            # Snapshot now, since directives() marks ejected nodes as
+            # provisioned.
+            self.previous_cache = dict(
+                (node.node_uuid,
+                 node.cached_image_uuid if node.cached else '')
+                for node in nodes if not node.provisioned)
+
+    def apply_node_changes(self, added, changed, removed):
+        """Update the strategy's view of nodes from those added, changed or
+        removed since it was last updated, at a cost proportional to the
+        changes rather than to the fleet.
+
+        :param added: NodeInput objects for new nodes.
+        :param changed: NodeInput objects for nodes whose state changed.
+        :param removed: The uuids of nodes which are gone.
+        """
+        # Nodes marked after the last full update are now kept.
+        self.nodes.restore(self.marked)
+        self.marked = []
+        if self.target_hit_rate is not None:
+            # Nodes newly provisioned are all among those changed, so they
+            # are compared with the state they were indexed with.
+            previous_cache = {}
+            for node in changed:
+                state = self.nodes.states.get(node.node_uuid)
+                if state is not None and not state[1]:
+                    previous_cache[node.node_uuid] = (state[3] if state[2]
+                                                      else '')
+            self._adjust_percentages(changed, previous_cache)
+            # A later full update must not compare against a stale snapshot.
+            self.previous_cache = None
+        for uuid in removed:
+            self.nodes.remove(uuid)
+        for node in itertools.chain(added, changed):
+            self.nodes.add(node)
+        self.incremental = True
+
+    def _flavors_to_rebalance(self, flavor_names):
+        """The flavors whose cache may need rebalancing: every flavor when
+        the images or their weights changed, otherwise only flavors whose
+        nodes changed, or which were still rebalancing last cycle.
+        """
+        if not self.rebalance_ejections_per_cycle:
+            return set()
+        inputs = (self.current_image_uuids, sb.get_image_weights(
+            [image.name for image in self.current_images]))
+        if inputs != self.rebalance_inputs:
+            self.rebalance_inputs = inputs
+            return set(flavor_names)
+        return self.nodes.changed_flavors | self.rebalancing
+
+    def _counts_after(self, flavor_name, todo):
+        """A flavor's unprovisioned and cached node counts, once the nodes
+        marked by directives so far are accounted for. Ejected nodes are
+        marked provisioned, and nodes cached by a rollout are marked cached.
+        """
+        num_unprovisioned = self.nodes.unprovisioned[flavor_name]
+        num_cached = self.nodes.cached[flavor_name]
+        for directive in todo:
+            state = self.nodes.states.get(directive.node_uuid)
+            if state is None or state[0] != flavor_name:
+                continue
+            if isinstance(directive, sb.EjectNode):
+                num_unprovisioned -= 1
+                num_cached -= 1
+            else:
+                num_cached += 1
+        return num_unprovisioned, num_cached
 
     def directives(self):
         """Return a list actions that should be taken by Arsenal in order to
@@ -186,26 +642,79 @@ class SimpleProportionalStrategy(object):
         update_current_state.
         """
         todo = []
-
-        # Eject nodes.
-        todo.extend(
-            eject_nodes(
-                self.current_nodes,
-                list(map(lambda image: image.uuid, self.current_images))))
+        # The hit rate controller has seen the last cycle's ejections.
+        self.ejected = set()
+        flavor_names = [flavor.name for flavor in self.current_flavors]
+        for name in set(self.nodes.by_flavor) - set(flavor_names):
+            LOG.error("%(num)d node(s) with unrecognized flavor '%(flavor)s' "
+                      "detected.", {'num': len(self.nodes.by_flavor[name]),
+                                    'flavor': name})
+
+        # Eject nodes cached with retired images. Images missing for fewer
+        # than retirement_debounce_cycles are left alone, as are the old
+        # uuids of images being rolled out.
+        image_uuids = set(image.uuid for image in self.current_images)
+        self.debouncer.observe(image_uuids, self.nodes.cached_image_uuids())
+        keep = image_uuids | self.debouncer.pending()
+        if self.rollout is not None and self.rollout.rollouts:
+            nodes_by_flavor = dict((name, self.nodes.flavor_nodes(name))
+                                   for name in self.rollout.flavor_names())
+            rollout = self.rollout.directives(nodes_by_flavor,
+                                              self.current_images,
+                                              self.node_selector)
+            self.ejected.update(directive.node_uuid for directive in rollout
+                                if isinstance(directive, sb.EjectNode))
+            todo.extend(rollout)
+            keep |= self.rollout.retiring()
+        ejections = eject_nodes(self.nodes.cached_without(keep), keep)
+        self.ejected.update(ejection.node_uuid for ejection in ejections)
+        todo.extend(ejections)
 
         # Once bad cached nodes have been ejected, determine the proportion
-        # of truly 'good' cached nodes.
-        nodes_by_flavor = segregate_nodes(self.current_nodes,
-                                          self.current_flavors)
-        for flavor_name, flavor_nodes in six.iteritems(nodes_by_flavor):
-            num_nodes_needed = how_many_nodes_should_cache(
-                flavor_nodes, self.percentage_to_cache)
+        # of truly 'good' cached nodes. Flavor nodes are only listed when
+        # there is something to do with them.
+        rebalance = self._flavors_to_rebalance(flavor_names)
+        for flavor_name in flavor_names:
+            if flavor_name in rebalance:
+                # Ejected nodes are freed for caching once cleaned, which
+                # the weighted image choice below fills with whatever is
+                # most under-cached.
+                rebalanced = rebalance_nodes(
+                    self.nodes.flavor_nodes(flavor_name),
+                    self.current_images,
+                    self.rebalance_ejections_per_cycle,
+                    self.rebalance_hysteresis,
+                    self.rebalance_churn_cost)
+                self.ejected.update(ejection.node_uuid
+                                    for ejection in rebalanced)
+                todo.extend(rebalanced)
+                if rebalanced:
+                    # More may be needed, even if these are held back.
+                    self.rebalancing.add(flavor_name)
+                else:
+                    self.rebalancing.discard(flavor_name)
+            num_unprovisioned, num_cached = self._counts_after(flavor_name,
+                                                               todo)
+            num_nodes_needed = nodes_to_cache_for(
+                num_unprovisioned, num_cached,
+                self.percentage_for(flavor_name))
             LOG.debug("Need to cache %(needed)d node(s) for flavor "
                       "'%(flavor)s'.",
                       {'needed': num_nodes_needed, 'flavor': flavor_name})
-            nodes_to_cache = cache_nodes(flavor_nodes, num_nodes_needed,
-                                         self.current_images)
-            todo.extend(nodes_to_cache)
+            if num_nodes_needed:
+                todo.extend(cache_nodes(self.nodes.flavor_nodes(flavor_name),
+                                        num_nodes_needed,
+                                        self.current_images,
+                                        self.node_selector))
+
+        self.nodes.changed_flavors.clear()
+        marked = [directive.node_uuid for directive in todo]
+        if self.incremental:
+            # Unchanged nodes are kept for the next cycle, so they must not
+            # stay marked.
+            self.nodes.restore(marked)
+        else:
+            self.marked = marked
 
         LOG.debug("Issuing %(num)d directives(s).", {'num': len(todo)})
 
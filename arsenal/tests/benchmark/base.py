@@ -0,0 +1,280 @@
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Base class and helpers for Arsenal's benchmarks.
+
+Benchmarks are skipped unless ARSENAL_BENCHMARK is set in the environment.
+The following environment variables control a run:
+
+    ARSENAL_BENCHMARK_SIZES - Comma separated node counts to benchmark.
+    ARSENAL_BENCHMARK_IMAGES - Comma separated image counts to benchmark.
+    ARSENAL_BENCHMARK_FLAVORS - Comma separated flavor counts to benchmark.
+    ARSENAL_BENCHMARK_REPEAT - How many timed runs to take the best of.
+    ARSENAL_BENCHMARK_THRESHOLD - The fraction a measurement may exceed its
+        baseline by before it is considered a regression.
+    ARSENAL_BENCHMARK_BASELINES - The JSON file holding baselines.
+    ARSENAL_BENCHMARK_UPDATE - When set, measurements are written to the
+        baselines file instead of compared against it.
+"""
+
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+from oslotest import base
+
+from arsenal.director import synthetic_scout
+from arsenal.strategy import base as sb
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 has no tracemalloc. Timings are still measured.
+    tracemalloc = None
+
+# CPU time is far less sensitive to other load on the machine than wall clock
+# time. Python 2 has no process_time, fall back on the wall clock there.
+timer = getattr(time, 'process_time', time.time)
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+DEFAULT_IMAGES = '20,200'
+DEFAULT_FLAVORS = '4'
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_BASELINES = os.path.join(os.path.dirname(__file__),
+                                 'baselines.json')
+
+# Timings within this many seconds of their baseline are never regressions,
+# since very short runs are dominated by noise.
+MIN_SECONDS_DELTA = 0.002
+
+# The fraction of available nodes cached when a fleet is built, and the
+# fraction of those caching an image which has since been retired.
+CACHED_FRACTION = 0.2
+RETIRED_FRACTION = 0.1
+
+# The fraction of a fleet whose state changes between director cycles, and
+# the fraction of the fleet added and removed.
+CHANGED_FRACTION = 0.01
+REPLACED_FRACTION = 0.001
+
+
+def _int_list(name, default):
+    return [int(value) for value in os.environ.get(name, default).split(',')
+            if value.strip()]
+
+
+def build_fleet(node_count, image_count, flavor_count, seed=0):
+    """Build strategy inputs for a synthetic fleet.
+
+    Half the fleet is provisioned. A share of the available nodes is cached,
+    some of them with an image that is no longer listed, so ejection has
+    work to do.
+
+    :returns: A (nodes, images, flavors) tuple.
+    """
+    scout = synthetic_scout.SyntheticScout(
+        node_count=node_count, flavor_count=flavor_count,
+        image_count=image_count + 1, initial_utilization=0.5,
+        provision_rate=0, release_rate=0, seed=seed)
+    rand = random.Random(seed)
+    retired_image = scout.image_uuids[-1]
+    for index in range(node_count):
+        if (scout.node_state[index] == synthetic_scout.AVAILABLE and
+                rand.random() < CACHED_FRACTION):
+            if rand.random() < RETIRED_FRACTION:
+                image_uuid = retired_image
+            else:
+                image_uuid = rand.choice(scout.image_uuids[:-1])
+            scout.issue_action(sb.CacheNode(
+                synthetic_scout.NODE_UUID_PREFIX + str(index), image_uuid,
+                ''))
+    nodes = scout.retrieve_node_data()
+    images = [image for image in scout.retrieve_image_data()
+              if image.uuid != retired_image]
+    return nodes, images, scout.retrieve_flavor_data()
+
+
+def node_changes(nodes, images, seed=0):
+    """Build the node changes seen between two cycles of a fleet.
+
+    Some provisioned nodes are released, some unprovisioned nodes are
+    deployed or finish caching an image, and a few nodes are replaced by new
+    ones.
+
+    :returns: An (added, changed, removed) tuple, as passed to
+        CachingStrategy.apply_node_changes.
+    """
+    rand = random.Random(seed)
+    changed = []
+    for node in rand.sample(nodes, int(len(nodes) * CHANGED_FRACTION)):
+        node = copy.copy(node)
+        if node.provisioned:
+            node.provisioned = False
+            node.cached = False
+            node.cached_image_uuid = ''
+        elif node.cached or rand.random() < 0.5:
+            node.provisioned = True
+        else:
+            node.cached = True
+            node.cached_image_uuid = rand.choice(images).uuid
+        changed.append(node)
+    changed_uuids = set(node.node_uuid for node in changed)
+    replaced = [node for node in nodes if node.node_uuid not in changed_uuids]
+    replaced = rand.sample(replaced, int(len(nodes) * REPLACED_FRACTION))
+    added = []
+    for node in replaced:
+        node = copy.copy(node)
+        node.node_uuid += '-new'
+        added.append(node)
+    return added, changed, [node.node_uuid for node in replaced]
+
+
+def copy_nodes(nodes):
+    """Shallow copy nodes, since strategies mark nodes they've acted on."""
+    return [copy.copy(node) for node in nodes]
+
+
+class BenchmarkTestCase(base.BaseTestCase):
+    """Base test class for all benchmarks."""
+
+    def setUp(self):
+        super(BenchmarkTestCase, self).setUp()
+        if not os.environ.get('ARSENAL_BENCHMARK'):
+            self.skipTest('Set ARSENAL_BENCHMARK to run benchmarks.')
+        self.sizes = _int_list('ARSENAL_BENCHMARK_SIZES', DEFAULT_SIZES)
+        self.image_counts = _int_list('ARSENAL_BENCHMARK_IMAGES',
+                                      DEFAULT_IMAGES)
+        self.flavor_counts = _int_list('ARSENAL_BENCHMARK_FLAVORS',
+                                       DEFAULT_FLAVORS)
+        self.repeat = int(os.environ.get('ARSENAL_BENCHMARK_REPEAT',
+                                         DEFAULT_REPEAT))
+        self.threshold = float(os.environ.get('ARSENAL_BENCHMARK_THRESHOLD',
+                                              DEFAULT_THRESHOLD))
+        self.baselines_file = os.environ.get('ARSENAL_BENCHMARK_BASELINES',
+                                             DEFAULT_BASELINES)
+        self.update_baselines = bool(os.environ.get(
+            'ARSENAL_BENCHMARK_UPDATE'))
+
+    def fleets(self):
+        """Yield (case_name, nodes, images, flavors) for every fleet shape."""
+        for node_count in self.sizes:
+            for image_count in self.image_counts:
+                for flavor_count in self.flavor_counts:
+                    nodes, images, flavors = build_fleet(
+                        node_count, image_count, flavor_count)
+                    name = 'nodes=%d,images=%d,flavors=%d' % (
+                        node_count, image_count, flavor_count)
+                    yield name, nodes, images, flavors
+
+    def measure(self, setup, func):
+        """Measure func's best CPU time and peak memory.
+
+        :param setup: Called before every run, untimed. Returns the
+            positional arguments to call func with.
+        :param func: The function to benchmark.
+        :returns: A dict holding 'seconds' and, where tracemalloc is
+            available, 'peak_bytes'.
+        """
+        result = {}
+        if tracemalloc is not None:
+            args = setup()
+            gc.collect()
+            # Strategies draw from the random module, seed it so every run
+            # does the same work.
+            random.seed(0)
+            tracemalloc.start()
+            try:
+                func(*args)
+                result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        best = None
+        for _ in range(self.repeat):
+            args = setup()
+            gc.collect()
+            random.seed(0)
+            start = timer()
+            func(*args)
+            elapsed = timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        result['seconds'] = best
+        return result
+
+    def _load_baselines(self):
+        if not os.path.exists(self.baselines_file):
+            return {}
+        with open(self.baselines_file) as baselines:
+            return json.load(baselines)
+
+    def _save_baselines(self, baselines):
+        with open(self.baselines_file, 'w') as output:
+            json.dump(baselines, output, indent=2, sort_keys=True)
+            output.write('\n')
+
+    def check_results(self, benchmark, results):
+        """Compare results against the stored baselines.
+
+        Fails listing every measurement that regressed past the threshold,
+        and every case with no baseline. When ARSENAL_BENCHMARK_UPDATE is
+        set the results become the new baselines instead.
+
+        :param benchmark: The name of the benchmark.
+        :param results: A dict mapping case names to measure() results.
+        """
+        for case, result in sorted(results.items()):
+            sys.stdout.write('%s[%s]: %s\n' % (
+                benchmark, case, ', '.join(
+                    '%s=%s' % item for item in sorted(result.items()))))
+
+        baselines = self._load_baselines()
+        if self.update_baselines:
+            baselines.setdefault(benchmark, {}).update(results)
+            self._save_baselines(baselines)
+            return
+
+        regressions = []
+        missing = []
+        for case, result in sorted(results.items()):
+            baseline = baselines.get(benchmark, {}).get(case)
+            if baseline is None:
+                missing.append('%s[%s]' % (benchmark, case))
+                continue
+            for metric, value in sorted(result.items()):
+                expected = baseline.get(metric)
+                if not expected or value <= expected * (1 + self.threshold):
+                    continue
+                if (metric == 'seconds' and
+                        value - expected < MIN_SECONDS_DELTA):
+                    continue
+                regressions.append(
+                    '%s[%s] %s: %s exceeds baseline %s by more than %d%%' % (
+                        benchmark, case, metric, value, expected,
+                        self.threshold * 100))
+        if missing:
+            # A measurement with nothing to compare against would pass
+            # however slow it is.
+            regressions.append(
+                'No baseline in %s for %s. Record baselines with '
+                'ARSENAL_BENCHMARK_UPDATE set.' % (self.baselines_file,
+                                                   ', '.join(missing)))
+        if regressions:
+            self.fail('\n'.join(regressions))
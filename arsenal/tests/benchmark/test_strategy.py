@@ -0,0 +1,113 @@
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmarks for the strategy functions run every director cycle."""
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import simple_proportional_strategy as sps
+from arsenal.tests.benchmark import base
+
+
+def ejected(nodes, images):
+    """Copy nodes, marking those caching retired images as ejected.
+
+    The image choosing functions expect retired images to have been ejected
+    already, as the strategies do before calling them.
+    """
+    nodes = base.copy_nodes(nodes)
+    sps.eject_nodes(nodes, sb.build_attribute_set(images, 'uuid'))
+    return nodes
+
+
+class TestStrategyBenchmarks(base.BenchmarkTestCase):
+
+    def run_benchmark(self, name, setup_for_fleet, func):
+        """Measure func over every configured fleet shape.
+
+        :param setup_for_fleet: Called with (nodes, images, flavors), returns
+            a setup function for BenchmarkTestCase.measure.
+        """
+        results = {}
+        for case, nodes, images, flavors in self.fleets():
+            results[case] = self.measure(
+                setup_for_fleet(nodes, images, flavors), func)
+        self.check_results(name, results)
+
+    def test_simple_proportional_strategy_full_update(self):
+        def setup_for_fleet(nodes, images, flavors):
+            def setup():
+                strat = sps.SimpleProportionalStrategy()
+                strat.update_current_state(base.copy_nodes(nodes), images,
+                                           flavors)
+                strat.directives()
+                return (strat, base.copy_nodes(nodes), images, flavors)
+            return setup
+
+        def full_update(strat, nodes, images, flavors):
+            strat.update_current_state(nodes, images, flavors)
+            strat.directives()
+
+        self.run_benchmark('simple_proportional_strategy.full_update',
+                           setup_for_fleet, full_update)
+
+    def test_simple_proportional_strategy_node_changes(self):
+        # The same cycle as the full update, given only the nodes which
+        # changed since the last one.
+        def setup_for_fleet(nodes, images, flavors):
+            changes = base.node_changes(nodes, images)
+
+            def setup():
+                strat = sps.SimpleProportionalStrategy()
+                strat.update_current_state(base.copy_nodes(nodes), images,
+                                           flavors)
+                strat.directives()
+                added, changed, removed = changes
+                return (strat, base.copy_nodes(added),
+                        base.copy_nodes(changed), removed, images, flavors)
+            return setup
+
+        def node_changes(strat, added, changed, removed, images, flavors):
+            strat.apply_node_changes(added, changed, removed)
+            strat.update_current_state(None, images, flavors)
+            strat.directives()
+
+        self.run_benchmark('simple_proportional_strategy.node_changes',
+                           setup_for_fleet, node_changes)
+
+    def test_choose_weighted_images_forced_distribution(self):
+        def setup_for_fleet(nodes, images, flavors):
+            nodes = ejected(nodes, images)
+            num_images = len(sps.nodes_available_for_caching(nodes)) // 2
+            return lambda: (num_images, images, nodes)
+
+        self.run_benchmark('choose_weighted_images_forced_distribution',
+                           setup_for_fleet,
+                           sb.choose_weighted_images_forced_distribution)
+
+    def test_image_weight_guided_ejection(self):
+        def setup_for_fleet(nodes, images, flavors):
+            return lambda: (images, ejected(nodes, images))
+
+        self.run_benchmark('image_weight_guided_ejection',
+                           setup_for_fleet,
+                           sb.image_weight_guided_ejection)
+
+    def test_build_node_statistics(self):
+        def setup_for_fleet(nodes, images, flavors):
+            return lambda: (nodes, images)
+
+        self.run_benchmark('build_node_statistics',
+                           setup_for_fleet,
+                           sb.build_node_statistics)
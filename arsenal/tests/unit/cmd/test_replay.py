@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_replay
+----------------------------------
+
+Tests for the `replay` command.
+"""
+
+import datetime
+
+import mock
+import six
+
+from arsenal.cmd import replay
+from arsenal.common import util
+from arsenal.director import recorder
+from arsenal.strategy import base as sb
+from arsenal.tests.unit import base
+
+NODES = [sb.NodeInput('node-a', 'io-flavor', False, True, 'image-a')]
+IMAGES = [sb.ImageInput('Ubuntu', 'image-a', 'checksum-a')]
+FLAVORS = [sb.FlavorInput('io-flavor', lambda n: True)]
+
+
+def make_cycle(directives):
+    return recorder.Cycle('2016-01-01T00:00:00', NODES, IMAGES, FLAVORS,
+                          directives)
+
+
+class TestReplay(base.TestCase):
+
+    def setUp(self):
+        super(TestReplay, self).setUp()
+        self.strat = mock.Mock()
+        self.strat.directives.return_value = [
+            sb.EjectNode('node-a'),
+            sb.CacheNode('node-b', 'image-a', 'checksum-a')]
+
+    def test_replay_cycle_feeds_strategy(self):
+        cycle = make_cycle([])
+        replay.replay_cycle(self.strat, cycle)
+        self.strat.update_current_state.assert_called_once_with(
+            NODES, IMAGES, FLAVORS)
+        self.strat.directives.assert_called_once_with()
+
+    def test_replay_cycle_at_recorded_time(self):
+        # Only eject during the recorded hour, as a cache schedule might.
+        def directives():
+            if util.now() == datetime.datetime(2016, 1, 1, 3, 30, 0, 500):
+                return [sb.EjectNode('node-a')]
+            return []
+        self.strat.directives.side_effect = directives
+        cycle = recorder.Cycle('2016-01-01T03:30:00.000500', NODES, IMAGES,
+                               FLAVORS, [sb.EjectNode('node-a')])
+        result = replay.replay_cycle(self.strat, cycle)
+        self.assertEqual(1, result['matching'])
+        # The wall clock is back once the cycle is replayed.
+        self.assertIsNone(util.now.clock)
+
+    def test_replay_cycle_without_time(self):
+        seen = []
+        self.strat.directives.side_effect = (
+            lambda: seen.append(util.now()) or [])
+        before = datetime.datetime.now()
+        replay.replay_cycle(self.strat,
+                            recorder.Cycle(None, NODES, IMAGES, FLAVORS, []))
+        self.assertTrue(seen[0] >= before)
+
+    def test_replay_compares_directives(self):
+        cycles = [
+            make_cycle([sb.EjectNode('node-a'),
+                        sb.CacheNode('node-b', 'image-b', 'checksum-b')]),
+            make_cycle([sb.CacheNode('node-b', 'image-a', 'checksum-a')]),
+        ]
+        output = six.StringIO()
+        totals = replay.replay(self.strat, cycles, output=output,
+                               verbose=True)
+        self.assertEqual(2, totals['cycles'])
+        self.assertEqual(3, totals['recorded'])
+        self.assertEqual(4, totals['replayed'])
+        self.assertEqual(2, totals['cache'])
+        self.assertEqual(2, totals['eject'])
+        # A cache directive only matches if the same image was chosen.
+        self.assertEqual(2, totals['matching'])
+        self.assertIn('Replayed 2 cycle(s)', output.getvalue())
+        self.assertEqual(6, len(output.getvalue().splitlines()))
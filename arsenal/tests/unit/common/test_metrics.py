@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_metrics
+----------------------------------
+
+Tests for `metrics` module.
+"""
+
+import json
+import tempfile
+
+from arsenal.common import metrics
+from arsenal.tests.unit import base
+
+
+class TestCounter(base.TestCase):
+
+    def test_counts_by_labels(self):
+        counter = metrics.Counter('failures')
+        counter.inc({'image': 'Ubuntu', 'flavor': 'IO'})
+        counter.inc({'flavor': 'IO', 'image': 'Ubuntu'}, 2)
+        counter.inc({'image': 'CoreOS', 'flavor': 'IO'})
+        self.assertEqual(3, counter.value({'image': 'Ubuntu',
+                                           'flavor': 'IO'}))
+        self.assertEqual(0, counter.value({'image': 'Arch'}))
+        self.assertEqual({'flavor=IO,image=Ubuntu': 3,
+                          'flavor=IO,image=CoreOS': 1}, counter.as_dict())
+
+
+class TestHistogram(base.TestCase):
+
+    def setUp(self):
+        super(TestHistogram, self).setUp()
+        self.histogram = metrics.Histogram('seconds', [60, 10, 30])
+        for value in (5, 10, 20, 40, 90):
+            self.histogram.observe(value, {'image': 'Ubuntu'})
+
+    def test_buckets(self):
+        series = self.histogram.get({'image': 'Ubuntu'})
+        self.assertEqual([2, 1, 1, 1], series.counts)
+        self.assertEqual(5, series.count)
+        self.assertEqual(33, series.mean())
+        self.assertIsNone(self.histogram.get({'image': 'CoreOS'}))
+
+    def test_quantile(self):
+        series = self.histogram.get({'image': 'Ubuntu'})
+        self.assertEqual(10, series.quantile(0.4))
+        self.assertEqual(30, series.quantile(0.5))
+        # Beyond the last bucket, the last bound is the best estimate.
+        self.assertEqual(60, series.quantile(1.0))
+        self.assertEqual(0, metrics.HistogramSeries((10,)).quantile(0.5))
+
+    def test_as_dict(self):
+        self.assertEqual(
+            {'image=Ubuntu': {
+                'buckets': {'10': 2, '30': 1, '60': 1, '+Inf': 1},
+                'count': 5, 'sum': 165.0}},
+            self.histogram.as_dict())
+
+
+class TestRegistry(base.TestCase):
+
+    def test_metrics_created_once(self):
+        registry = metrics.Registry()
+        counter = registry.counter('failures')
+        self.assertIs(counter, registry.counter('failures'))
+        histogram = registry.histogram('seconds', (10,))
+        self.assertIs(histogram, registry.histogram('seconds', (10,)))
+
+    def test_write(self):
+        registry = metrics.Registry()
+        registry.counter('failures').inc({'image': 'Ubuntu'})
+        registry.histogram('seconds', (10,)).observe(5)
+        outfile = tempfile.NamedTemporaryFile(suffix='.json')
+        self.addCleanup(outfile.close)
+        registry.write(outfile.name)
+        with open(outfile.name) as infile:
+            written = json.load(infile)
+        self.assertEqual({'image=Ubuntu': 1}, written['failures'])
+        self.assertEqual(1, written['seconds']['']['count'])
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_util
+----------------------------------
+
+Tests for `util` module.
+"""
+
+import datetime
+
+from arsenal.common import util
+from arsenal.tests.unit import base
+
+
+class TestClock(base.TestCase):
+
+    def test_use_clock(self):
+        clock = util.VirtualClock(datetime.datetime(2016, 5, 1))
+        with util.use_clock(clock):
+            self.assertEqual(datetime.datetime(2016, 5, 1), util.now())
+            clock.advance(90)
+            self.assertEqual(datetime.datetime(2016, 5, 1, 0, 1, 30),
+                             util.now())
+        self.assertNotEqual(datetime.datetime(2016, 5, 1, 0, 1, 30),
+                            util.now())
+
+    def test_advance_to_never_goes_back(self):
+        clock = util.VirtualClock(datetime.datetime(2016, 5, 1))
+        clock.advance_to(datetime.datetime(2016, 4, 1))
+        self.assertEqual(datetime.datetime(2016, 5, 1), clock())
+        clock.advance_to(datetime.datetime(2016, 6, 1))
+        self.assertEqual(datetime.datetime(2016, 6, 1), clock())
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_cache_analytics
+----------------------------------
+
+Tests for `cache_analytics` module.
+"""
+
+import mock
+
+from arsenal.common import metrics
+from arsenal.director import cache_analytics
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.tests.unit import base
+
+
+def idle(uuid, flavor='io-flavor', cached_image=''):
+    return sb.NodeInput(uuid, flavor, False, bool(cached_image),
+                        cached_image)
+
+
+def deployed(uuid, image, flavor='io-flavor'):
+    return sb.NodeInput(uuid, flavor, True, False, '', image)
+
+
+class TestCacheHitTracker(base.TestCase):
+
+    def setUp(self):
+        super(TestCacheHitTracker, self).setUp()
+        self.tracker = cache_analytics.CacheHitTracker()
+        self.tracker.update([
+            idle('node-hit', cached_image='ubuntu'),
+            idle('node-miss', cached_image='ubuntu'),
+            idle('node-cold'),
+            idle('node-ejected', 'compute-flavor', cached_image='centos'),
+            idle('node-recached', 'compute-flavor', cached_image='centos'),
+            idle('node-idle', cached_image='centos'),
+            deployed('node-busy', 'ubuntu'),
+        ])
+
+    def test_first_update_only_observes(self):
+        self.assertEqual({}, self.tracker.flavor_report())
+        self.assertEqual({}, self.tracker.image_report())
+
+    def test_transitions(self):
+        deployments = self.tracker.update([
+            deployed('node-hit', 'ubuntu'),
+            deployed('node-miss', 'centos'),
+            deployed('node-cold', 'ubuntu'),
+            # Ejected nodes are unavailable while cleaned.
+            sb.NodeInput('node-ejected', 'compute-flavor', True),
+            idle('node-recached', 'compute-flavor', cached_image='ubuntu'),
+            idle('node-idle', cached_image='centos'),
+            # Already provisioned last cycle, so not a new deployment.
+            deployed('node-busy', 'ubuntu'),
+        ])
+        self.assertEqual(['node-hit', 'node-miss', 'node-cold'],
+                         [node.node_uuid for node in deployments])
+        images = [sb.ImageInput('Ubuntu', 'ubuntu', 'checksum-u')]
+        self.assertEqual(
+            {'Ubuntu': {'deployments': 2, 'hits': 1, 'wasted': 1,
+                        'hit_rate': 0.5},
+             'centos': {'deployments': 1, 'hits': 0, 'wasted': 2,
+                        'hit_rate': 0.0}},
+            self.tracker.image_report(images))
+        self.assertEqual(
+            {'io-flavor': {'deployments': 3, 'hits': 1, 'wasted': 1,
+                           'hit_rate': 1 / 3.0},
+             'compute-flavor': {'deployments': 0, 'hits': 0, 'wasted': 2,
+                                'hit_rate': 0.0}},
+            self.tracker.flavor_report())
+        totals = self.tracker.totals()
+        self.assertEqual((3, 1, 3),
+                         (totals.deployments, totals.hits, totals.wasted))
+
+    def test_maintenance_is_not_a_deployment(self):
+        self.tracker.update([sb.NodeInput('node-cold', 'io-flavor', True)])
+        self.assertEqual({}, self.tracker.flavor_report())
+
+    def test_unseen_nodes_are_ignored(self):
+        self.tracker.update([deployed('node-new', 'ubuntu')])
+        self.assertEqual({}, self.tracker.flavor_report())
+
+    def test_log_report(self):
+        self.tracker.update([deployed('node-hit', 'ubuntu')])
+        self.tracker.log_report()
+
+
+class TestCacheLatency(base.TestCase):
+
+    def setUp(self):
+        super(TestCacheLatency, self).setUp()
+        self.registry = metrics.Registry()
+        images = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd')]
+        outcomes = [
+            cache_tracking.CacheOutcome(idle('a', cached_image='aaaa'),
+                                        'aaaa', 100, True),
+            cache_tracking.CacheOutcome(idle('b', 'cpu-flavor', 'bbbb'),
+                                        'bbbb', 500, True),
+            cache_tracking.CacheOutcome(idle('c'), 'aaaa', None, False),
+        ]
+        cache_analytics.record_cache_outcomes(outcomes, images,
+                                              self.registry)
+
+    def test_records_by_image_and_flavor(self):
+        by_image = self.registry.metrics[
+            cache_analytics.CACHE_SECONDS_BY_IMAGE]
+        self.assertEqual(1, by_image.get({'image': 'Ubuntu'}).count)
+        # Unknown images are labelled by uuid.
+        self.assertEqual(500, by_image.get({'image': 'bbbb'}).sum)
+        by_flavor = self.registry.metrics[
+            cache_analytics.CACHE_SECONDS_BY_FLAVOR]
+        self.assertEqual(100, by_flavor.get({'flavor': 'io-flavor'}).mean())
+        failures = self.registry.metrics[cache_analytics.CACHE_FAILURES]
+        self.assertEqual(1, failures.value({'image': 'Ubuntu',
+                                            'flavor': 'io-flavor'}))
+
+    @mock.patch.object(cache_analytics, 'LOG')
+    def test_log_cache_latency(self, log_mock):
+        cache_analytics.log_cache_latency(self.registry)
+        logged = [call[0][1] for call in log_mock.info.call_args_list
+                  if isinstance(call[0][-1], dict)]
+        self.assertEqual(
+            sorted([('io-flavor', 1, 1), ('cpu-flavor', 1, 0),
+                    ('Ubuntu', 1, 1), ('bbbb', 1, 0)]),
+            sorted((entry['label'], entry['count'], entry['failed'])
+                   for entry in logged))
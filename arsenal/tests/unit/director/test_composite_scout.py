@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_composite_scout
+----------------------------------
+
+Tests for `composite_scout` module.
+"""
+
+import mock
+
+from arsenal.director import composite_scout
+from arsenal.director import openstack_scout
+from arsenal.strategy import base as sb
+from arsenal.tests.unit import base
+
+
+class FakeFlavor(object):
+    def __init__(self, flavor_id):
+        self.id = flavor_id
+        self.ram = 1024
+
+
+class FakeIronicNode(object):
+    def __init__(self, uuid, flavor):
+        self.uuid = uuid
+        self.extra = {'flavor': flavor}
+        self.provision_state = 'available'
+        self.maintenance = False
+        self.driver_info = {}
+
+
+NOVA_FLAVORS = [FakeFlavor('flavor-v1'), FakeFlavor('flavor-v2'),
+                FakeFlavor('virt-flavor')]
+
+GLANCE_IMAGES = [
+    {'id': 'image-v1', 'name': 'Ubuntu', 'checksum': 'a', 'fleet': 'v1'},
+    {'id': 'image-v2', 'name': 'Ubuntu', 'checksum': 'b', 'fleet': 'v2'},
+    {'id': 'image-both', 'name': 'CoreOS', 'checksum': 'c',
+     'fleet': 'both'},
+]
+
+IRONIC_NODES = [FakeIronicNode('node-1', 'flavor-v1'),
+                FakeIronicNode('node-2', 'flavor-v2'),
+                FakeIronicNode('node-3', 'flavor-v1'),
+                FakeIronicNode('node-4', 'virt-flavor')]
+
+
+class FakeMemberScout(openstack_scout.OpenstackScout):
+    """An OpenstackScout for one fleet, with mocked out clients."""
+    def __init__(self, fleet):
+        self.flavor_filter = lambda flavor: flavor.id == 'flavor-' + fleet
+        self.image_filter = lambda image: image['fleet'] in (fleet, 'both')
+        self.ironic_client = mock.Mock()
+        self.ironic_client.call_iter.return_value = iter(IRONIC_NODES)
+        self.nova_client = mock.Mock()
+        self.nova_client.call.return_value = NOVA_FLAVORS
+        self.glance_client = mock.Mock()
+        self.glance_client.call_iter.return_value = iter(GLANCE_IMAGES)
+        self.glance_data = []
+        self.known_flavors = {}
+        self.mirrors = None
+        self.curried_convert_ironic_node = (
+            openstack_scout.convert_ironic_node)
+        self.curried_convert_nova_flavor = lambda flavor: (
+            openstack_scout.convert_nova_flavor(flavor, self.known_flavors))
+
+
+MEMBERS = {
+    'fake.V1Scout': lambda: FakeMemberScout('v1'),
+    'fake.V2Scout': lambda: FakeMemberScout('v2'),
+    'fake.NotOpenstack': mock.Mock,
+}
+
+
+def load_fake_member_scout(name):
+    return MEMBERS[name]()
+
+
+class TestCompositeScout(base.TestCase):
+
+    @mock.patch.object(composite_scout, 'load_member_scout')
+    def setUp(self, load_mock):
+        super(TestCompositeScout, self).setUp()
+        load_mock.side_effect = load_fake_member_scout
+        self.scout = composite_scout.CompositeScout(
+            ['fake.V1Scout', 'fake.V2Scout'])
+        self.v1_scout, self.v2_scout = self.scout.members
+
+    def test_requires_members(self):
+        self.assertRaises(composite_scout.NoMemberScoutsError,
+                          composite_scout.CompositeScout, [])
+
+    @mock.patch.object(composite_scout, 'load_member_scout')
+    def test_requires_openstack_members(self, load_mock):
+        load_mock.side_effect = load_fake_member_scout
+        self.assertRaises(composite_scout.UnsupportedMemberScoutError,
+                          composite_scout.CompositeScout,
+                          ['fake.V1Scout', 'fake.NotOpenstack'])
+
+    def test_members_share_clients(self):
+        self.assertIs(self.v1_scout.ironic_client,
+                      self.v2_scout.ironic_client)
+        self.assertIs(self.v1_scout.nova_client, self.v2_scout.nova_client)
+        self.assertIs(self.v1_scout.glance_client,
+                      self.v2_scout.glance_client)
+
+    def test_listings_fetched_once(self):
+        self.scout.retrieve_flavor_data()
+        self.scout.retrieve_image_data()
+        self.scout.retrieve_node_data()
+        self.assertEqual(1, self.v1_scout.nova_client.call.call_count)
+        self.assertEqual(1, self.v1_scout.glance_client.call_iter.call_count)
+        self.assertEqual(1, self.v1_scout.ironic_client.call_iter.call_count)
+
+    def test_retrieve_data_unions_members(self):
+        flavors = self.scout.retrieve_flavor_data()
+        images = self.scout.retrieve_image_data()
+        nodes = self.scout.retrieve_node_data()
+        self.assertEqual(['flavor-v1', 'flavor-v2'],
+                         [flavor.name for flavor in flavors])
+        self.assertEqual(['image-v1', 'image-both', 'image-v2'],
+                         [image.uuid for image in images])
+        # Nodes of flavors no member owns are dropped.
+        self.assertEqual(['node-1', 'node-3', 'node-2'],
+                         [node.node_uuid for node in nodes])
+
+    def test_partition(self):
+        flavors = self.scout.retrieve_flavor_data()
+        images = self.scout.retrieve_image_data()
+        nodes = self.scout.retrieve_node_data()
+        partitions = self.scout.partition(nodes, images, flavors)
+        self.assertEqual(['fake.V1Scout', 'fake.V2Scout'],
+                         [partition[0] for partition in partitions])
+        v1_nodes, v1_images, v1_flavors = partitions[0][1:]
+        self.assertEqual(['node-1', 'node-3'],
+                         [node.node_uuid for node in v1_nodes])
+        self.assertEqual(['image-v1', 'image-both'],
+                         [image.uuid for image in v1_images])
+        self.assertEqual(['flavor-v1'],
+                         [flavor.name for flavor in v1_flavors])
+        v2_nodes, v2_images, v2_flavors = partitions[1][1:]
+        self.assertEqual(['node-2'], [node.node_uuid for node in v2_nodes])
+        self.assertEqual(['image-both', 'image-v2'],
+                         [image.uuid for image in v2_images])
+
+    def test_issue_action_routes_to_owner(self):
+        self.scout.retrieve_flavor_data()
+        self.scout.retrieve_node_data()
+        self.v1_scout.issue_action = mock.Mock()
+        self.v2_scout.issue_action = mock.Mock()
+
+        eject = sb.EjectNode('node-2')
+        self.scout.issue_action(eject)
+        self.v2_scout.issue_action.assert_called_once_with(eject)
+
+        cache = sb.CacheNode('node-3', 'image-v1', 'a')
+        self.scout.issue_action(cache)
+        self.v1_scout.issue_action.assert_called_once_with(cache)
+
+    def test_issue_action_unknown_node(self):
+        self.v1_scout.issue_action = mock.Mock()
+        self.v2_scout.issue_action = mock.Mock()
+        self.scout.issue_action(sb.EjectNode('node-4'))
+        self.assertFalse(self.v1_scout.issue_action.called)
+        self.assertFalse(self.v2_scout.issue_action.called)
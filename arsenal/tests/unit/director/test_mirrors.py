@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_mirrors
+----------------------------------
+
+Tests for `mirrors` module.
+"""
+
+import json
+import tempfile
+
+import mock
+
+from arsenal.common import util
+from arsenal.director import mirrors
+from arsenal.strategy import base as sb
+from arsenal.tests.unit import base
+
+MIRRORS = {'a': 'http://mirror-a', 'b': 'http://mirror-b',
+           'c': 'http://mirror-c'}
+LOCALITY = {'rack-1': ['b'], 'rack-2': ['c', 'a']}
+
+
+class TestMirrorSet(base.TestCase):
+
+    def setUp(self):
+        super(TestMirrorSet, self).setUp()
+        self.clock = util.VirtualClock()
+        clock = mock.patch.object(util.now, 'clock', self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.mirrors = mirrors.MirrorSet(MIRRORS, LOCALITY, timeout=600)
+
+    def test_urls_nearest_first_glance_last(self):
+        self.assertEqual(
+            ['http://mirror-b/v2/file', 'http://mirror-a/v2/file',
+             'http://mirror-c/v2/file', 'http://glance/v2/file'],
+            self.mirrors.urls('node-0', '/v2/file', 'http://glance',
+                              'rack-1'))
+        self.assertEqual({'a': 0, 'b': 1, 'c': 0},
+                         self.mirrors.outstanding())
+
+    def test_unknown_topology_uses_every_mirror(self):
+        self.assertEqual(['a', 'b', 'c'], self.mirrors.order('rack-9'))
+
+    def test_spreads_by_outstanding_downloads(self):
+        self.mirrors.urls('node-0', '/f', 'http://glance', 'rack-2')
+        self.assertEqual(['a', 'c', 'b'], self.mirrors.order('rack-2'))
+        self.mirrors.urls('node-1', '/f', 'http://glance', 'rack-2')
+        self.assertEqual(['c', 'a', 'b'], self.mirrors.order('rack-2'))
+        self.assertEqual(['b', 'a', 'c'], self.mirrors.order())
+
+    def test_finished_downloads_released(self):
+        for n in range(4):
+            self.mirrors.urls('node-%d' % n, '/f', 'http://glance')
+        self.mirrors.update([sb.NodeInput('node-%d' % n, 'IO',
+                                          cache_status='caching')
+                             for n in range(4)])
+        self.mirrors.update([
+            sb.NodeInput('node-0', 'IO', cache_status='caching'),
+            sb.NodeInput('node-1', 'IO', False, True, 'aaaa',
+                         cache_status='cached'),
+            sb.NodeInput('node-2', 'IO', cache_status='failed'),
+            sb.NodeInput('node-3', 'IO', True)])
+        self.assertEqual({'node-0': 'a'}, self.mirrors.downloads)
+
+    def test_unreported_downloads_counted(self):
+        # Two cycles of directives go out before Ironic reports either.
+        self.mirrors.urls('node-0', '/f', 'http://glance', 'rack-2')
+        self.mirrors.update([sb.NodeInput('node-0', 'IO'),
+                             sb.NodeInput('node-1', 'IO')])
+        self.mirrors.urls('node-1', '/f', 'http://glance', 'rack-2')
+        self.mirrors.update([sb.NodeInput('node-0', 'IO'),
+                             sb.NodeInput('node-1', 'IO')])
+        self.assertEqual({'a': 1, 'b': 0, 'c': 1},
+                         self.mirrors.outstanding())
+
+    def test_stale_status_not_a_finished_download(self):
+        self.mirrors.urls('node-0', '/f', 'http://glance')
+        self.mirrors.update([sb.NodeInput('node-0', 'IO',
+                                          cache_status='failed')])
+        self.assertEqual({'node-0': 'a'}, self.mirrors.downloads)
+
+    def test_unreported_downloads_time_out(self):
+        self.mirrors.urls('node-0', '/f', 'http://glance')
+        self.clock.advance(599)
+        self.mirrors.update([sb.NodeInput('node-0', 'IO')])
+        self.assertEqual({'node-0': 'a'}, self.mirrors.downloads)
+        self.clock.advance(1)
+        self.mirrors.update([sb.NodeInput('node-0', 'IO')])
+        self.assertEqual({}, self.mirrors.downloads)
+
+    def test_caching_downloads_never_time_out(self):
+        self.mirrors.urls('node-0', '/f', 'http://glance')
+        self.clock.advance(3600)
+        self.mirrors.update([sb.NodeInput('node-0', 'IO',
+                                          cache_status='caching')])
+        self.assertEqual({'node-0': 'a'}, self.mirrors.downloads)
+
+    def test_missing_nodes_released(self):
+        self.mirrors.urls('node-0', '/f', 'http://glance')
+        self.mirrors.update([])
+        self.assertEqual({}, self.mirrors.downloads)
+
+    def test_unknown_preferred_mirror(self):
+        self.assertRaises(mirrors.InvalidMirrorConfigError,
+                          mirrors.MirrorSet, MIRRORS, {'rack-1': ['z']})
+
+
+class TestLoadMirrors(base.TestCase):
+
+    def write(self, config):
+        mirrors_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json')
+        self.addCleanup(mirrors_file.close)
+        json.dump(config, mirrors_file)
+        mirrors_file.flush()
+        return mirrors_file.name
+
+    def test_load(self):
+        mirror_set = mirrors.load_mirrors(
+            self.write({'mirrors': MIRRORS, 'locality': LOCALITY}))
+        self.assertEqual(['c', 'a', 'b'], mirror_set.order('rack-2'))
+
+    def test_no_mirrors(self):
+        self.assertRaises(mirrors.InvalidMirrorConfigError,
+                          mirrors.load_mirrors, self.write({'mirrors': {}}))
@@ -28,6 +28,7 @@ import mock
 from oslo_config import cfg
 
 import arsenal.director.onmetal_scout as onmetal
+from arsenal.director import mirrors
 from arsenal.director import openstack_scout
 from arsenal.external import client_wrapper
 import arsenal.strategy.base as strat_base
@@ -200,11 +201,11 @@ TEST_NOVA_FLAVOR_DATA = [
 
 class TestOpenstackScout(base.TestCase):
 
-    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call_iter')
     def setUp(self, wrapper_call_mock):
         super(TestOpenstackScout, self).setUp()
         CONF.set_override('api_endpoint', 'http://glance_endpoint', 'glance')
-        wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA
+        wrapper_call_mock.return_value = iter(TEST_GLANCE_IMAGE_DATA)
         # NOTE (ClifHouck) The OnMetalV1Scout inherits from OpenstackScout
         # without adding any real functionality. It just adds some concrete
         # filters for flavors and images while leaving class behavior alone.
@@ -214,6 +215,24 @@ class TestOpenstackScout(base.TestCase):
         assert(isinstance(self.scout, openstack_scout.OpenstackScout))
         self.scout.retrieve_image_data()
 
+    def test_refresh_credentials(self):
+        for client in (self.scout.ironic_client, self.scout.nova_client,
+                       self.scout.glance_client):
+            client.refresh_if_expiring = mock.Mock()
+        self.scout.refresh_credentials()
+        # Ironic and Nova don't know when their tokens expire.
+        self.assertFalse(self.scout.ironic_client.refresh_if_expiring.called)
+        self.assertFalse(self.scout.nova_client.refresh_if_expiring.called)
+        self.scout.glance_client.refresh_if_expiring.assert_called_once_with()
+
+    @mock.patch.object(openstack_scout.keystone_session, 'refresh_session')
+    def test_refresh_credentials_shared_session(self, refresh_mock):
+        CONF.set_override('use_shared_session', True, 'client_wrapper')
+        self.addCleanup(CONF.clear_override, 'use_shared_session',
+                        'client_wrapper')
+        self.scout.refresh_credentials()
+        refresh_mock.assert_called_once_with()
+
     def test_is_node_provisioned(self):
         ironic_node = mock.NonCallableMock()
 
@@ -254,6 +273,21 @@ class TestOpenstackScout(base.TestCase):
                                                   http_method='POST',
                                                   args=expected_args)
 
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    def test_issue_cache_node_mirrors(self, wrapper_call_mock):
+        self.scout.mirrors = mirrors.MirrorSet(
+            {'a': 'http://mirror-a/', 'b': 'http://mirror-b/'},
+            {'rack-1': ['b']})
+        self.scout.node_topology = {'node_uuid': 'rack-1'}
+        self.scout.issue_cache_node(
+            strat_base.CacheNode('node_uuid', 'aaaa', 'ubuntu-checksum'))
+        args = wrapper_call_mock.call_args[1]['args']
+        self.assertEqual(['http://mirror-b/ubuntu_14_04_image.pxe',
+                          'http://mirror-a/ubuntu_14_04_image.pxe',
+                          CONF.glance.api_endpoint +
+                          'ubuntu_14_04_image.pxe'],
+                         args['image_info']['urls'])
+
     @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
     def test_issue_cache_node_bad_image(self, wrapper_call_mock):
         cache_node_action = strat_base.CacheNode('node_uuid',
@@ -283,10 +317,10 @@ class TestOpenstackScout(base.TestCase):
                               "retrieve_flavor_data did not properly filter "
                               "for onmetal flavors!")
 
-    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call_iter')
     def test_retrieve_image_data_only_returns_onmetal(self,
                                                       wrapper_call_mock):
-        wrapper_call_mock.return_value = TEST_GLANCE_IMAGE_DATA
+        wrapper_call_mock.return_value = iter(TEST_GLANCE_IMAGE_DATA)
         result = self.scout.retrieve_image_data()
         expected_images = ('ubuntu-14.04', 'ubuntu-14.10', 'coreos')
         expected_result = [
@@ -332,6 +366,61 @@ class TestOpenstackScout(base.TestCase):
                              "Expected '%(expected)s', got '%(got)s'." % (
                                 {'expected': expected, 'got': got}))
 
+    def test_get_node_deployed_image_uuid(self):
+        test_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
+        test_node.instance_info = {'image_source': 'aaaa'}
+        # Available nodes aren't deployed, whatever instance_info says.
+        self.assertEqual(
+            '', openstack_scout.get_node_deployed_image_uuid(test_node))
+
+        test_node.provision_state = 'active'
+        self.assertEqual(
+            'aaaa', openstack_scout.get_node_deployed_image_uuid(test_node))
+        self.assertEqual(
+            'aaaa',
+            openstack_scout.convert_ironic_node(test_node).deployed_image_uuid)
+
+        test_node.instance_info = {}
+        self.assertEqual(
+            '', openstack_scout.get_node_deployed_image_uuid(test_node))
+
+    def test_get_node_cache_status(self):
+        test_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
+        test_node.driver_info = {}
+        self.assertEqual('', openstack_scout.get_node_cache_status(test_node))
+        test_node.driver_info = {'cache_status': 'failed'}
+        self.assertEqual('failed',
+                         openstack_scout.get_node_cache_status(test_node))
+        self.assertEqual(
+            'failed',
+            openstack_scout.convert_ironic_node(test_node).cache_status)
+
+    def test_get_node_conductor(self):
+        test_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
+        self.assertEqual('', openstack_scout.get_node_conductor(test_node))
+        test_node.conductor = 'conductor-1'
+        self.assertEqual(
+            'conductor-1',
+            openstack_scout.convert_ironic_node(test_node).conductor)
+
+    def test_get_node_topology(self):
+        test_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
+        test_node.properties = {'rack': 'r1'}
+        test_node.extra.update({'rack': 'r2', 'switch': 's1'})
+        test_node.conductor_group = 'cg1'
+        # Nodes share one domain unless a key is configured.
+        self.assertEqual('', openstack_scout.get_node_topology(test_node))
+
+        self.addCleanup(CONF.clear_override, 'topology_key',
+                        'openstack_scout')
+        for key, expected in (('switch', 's1'), ('conductor_group', 'cg1'),
+                              ('missing', ''), ('rack', 'r1')):
+            CONF.set_override('topology_key', key, 'openstack_scout')
+            self.assertEqual(expected,
+                             openstack_scout.get_node_topology(test_node))
+        self.assertEqual(
+            'r1', openstack_scout.convert_ironic_node(test_node).topology)
+
     def test_resolve_flavor_extra_is_not_set(self):
         test_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
         test_node.extra = None
@@ -364,3 +453,17 @@ class TestOpenstackScout(base.TestCase):
                          "Flavor returned by resolve_flavor does not match "
                          "expectations. Got '%(got)s', "
                          "expected None." % ({'got': flavor}))
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, 'call_iter')
+    def test_retrieve_node_data_streams_nodes(self, wrapper_call_mock):
+        unknown_node = MockIronicNode(TEST_IRONIC_NODE_DATA)
+        unknown_node.extra = None
+        unknown_node.properties['memory_mb'] = 1337
+        wrapper_call_mock.return_value = iter(
+            [MockIronicNode(TEST_IRONIC_NODE_DATA), unknown_node])
+        result = self.scout.retrieve_node_data()
+        wrapper_call_mock.assert_called_once_with('node.list', limit=0,
+                                                  detail=True)
+        # Nodes whose flavor can't be identified are dropped.
+        self.assertEqual([TEST_IRONIC_NODE_DATA['uuid']],
+                         [node.node_uuid for node in result])
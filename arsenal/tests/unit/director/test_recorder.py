@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_recorder
+----------------------------------
+
+Tests for `recorder` module.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from arsenal.director import recorder
+from arsenal.strategy import base as sb
+from arsenal.tests.unit import base
+
+NODES = [sb.NodeInput('node-a', 'io-flavor', False, True, 'image-a'),
+         sb.NodeInput('node-b', 'io-flavor', True, False, ''),
+         sb.NodeInput('node-c', 'cpu-flavor', False, False, '')]
+IMAGES = [sb.ImageInput('Ubuntu', 'image-a', 'checksum-a'),
+          sb.ImageInput('CoreOS', 'image-b', 'checksum-b')]
+FLAVORS = [sb.FlavorInput('io-flavor', lambda n: True),
+           sb.FlavorInput('cpu-flavor', lambda n: True)]
+DIRECTIVES = [sb.CacheNode('node-c', 'image-b', 'checksum-b'),
+              sb.EjectNode('node-a')]
+
+
+class TestRecorder(base.TestCase):
+
+    def setUp(self):
+        super(TestRecorder, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.filename = os.path.join(self.tempdir, 'cycles.json.gz')
+        self.recorder = recorder.Recorder(self.filename)
+
+    def test_round_trip(self):
+        self.recorder.record(
+            recorder.snapshot_inputs(NODES, IMAGES, FLAVORS), DIRECTIVES)
+        cycles = list(recorder.read_cycles(self.filename))
+        self.assertEqual(1, len(cycles))
+        cycle = cycles[0]
+
+        self.assertEqual([str(node) for node in NODES],
+                         [str(node) for node in cycle.nodes])
+        self.assertEqual([str(image) for image in IMAGES],
+                         [str(image) for image in cycle.images])
+        self.assertEqual(['io-flavor', 'cpu-flavor'],
+                         [flavor.name for flavor in cycle.flavors])
+        self.assertTrue(cycle.flavors[0].is_flavor_node(NODES[0]))
+        self.assertFalse(cycle.flavors[0].is_flavor_node(NODES[2]))
+        self.assertEqual([str(directive) for directive in DIRECTIVES],
+                         [str(directive) for directive in cycle.directives])
+        self.assertEqual('checksum-b', cycle.directives[0].image_checksum)
+
+    def test_snapshot_is_unaffected_by_strategy(self):
+        nodes = [sb.NodeInput('node-a', 'io-flavor')]
+        snapshot = recorder.snapshot_inputs(nodes, IMAGES, FLAVORS)
+        nodes[0].provisioned = True
+        self.recorder.record(snapshot, [])
+        cycle = next(recorder.read_cycles(self.filename))
+        self.assertFalse(cycle.nodes[0].provisioned)
+
+    def test_appends_across_recorders(self):
+        self.recorder.record(
+            recorder.snapshot_inputs(NODES, IMAGES, FLAVORS), [])
+        recorder.Recorder(self.filename).record(
+            recorder.snapshot_inputs(NODES[:1], IMAGES, FLAVORS), DIRECTIVES)
+        cycles = list(recorder.read_cycles(self.filename))
+        self.assertEqual([3, 1], [len(cycle.nodes) for cycle in cycles])
+        self.assertEqual([0, 2], [len(cycle.directives) for cycle in cycles])
+
+    def test_reads_short_node_rows(self):
+        # Rows recorded before NodeInput gained arguments fall back on the
+        # argument defaults.
+        record = {'time': None, 'nodes': [['node-a', 'io-flavor']],
+                  'images': [], 'flavors': [], 'directives': []}
+        with gzip.open(self.filename, 'wb') as recording:
+            recording.write(json.dumps(record).encode('utf-8'))
+        node = next(recorder.read_cycles(self.filename)).nodes[0]
+        self.assertEqual('node-a', node.node_uuid)
+        self.assertFalse(node.provisioned)
+        self.assertEqual('', node.cached_image_uuid)
+
+    def test_record_failure_is_logged(self):
+        broken = recorder.Recorder(os.path.join(self.tempdir, 'missing',
+                                                'cycles.json.gz'))
+        # Must not raise.
+        broken.record(recorder.snapshot_inputs(NODES, IMAGES, FLAVORS), [])
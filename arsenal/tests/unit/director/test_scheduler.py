@@ -15,11 +15,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
 import mock
 from oslo_config import cfg
 
+from arsenal.common import metrics
 from arsenal.director import scheduler
 from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.strategy import simple_proportional_strategy as sps
 from arsenal.tests.unit import base
 
 CONF = cfg.CONF
@@ -82,6 +92,8 @@ class TestScheduler(base.TestCase):
         self.scheduler.strat.directives = strat_directive_mock
         self.issue_action_mock = mock.MagicMock()
         self.scheduler.scout.issue_action = self.issue_action_mock
+        self.addCleanup(cache_tracking.cache_times.clear)
+        self.addCleanup(metrics.registry.clear)
 
     def test_cache_rate_limit_on(self):
         CONF.set_override('cache_directive_rate_limit', 2, 'director')
@@ -178,3 +190,326 @@ class TestScheduler(base.TestCase):
             self.scheduler.issue_directives(None)
 
             self.assertFalse(self.scheduler.strat.directives.called)
+
+    def test_refresh_credentials(self):
+        self.scheduler.refresh_credentials()
+        self.onmetal_scout_mock.refresh_credentials.assert_called_once_with()
+
+    def test_refresh_credentials_swallows_errors(self):
+        self.onmetal_scout_mock.refresh_credentials.side_effect = (
+            Exception('Keystone is down'))
+        # Must not raise, or the refresh timer would stop.
+        self.scheduler.refresh_credentials()
+
+    @mock.patch('arsenal.strategy.base.get_configured_strategy')
+    def test_get_strategy_for_composite_scout(self, get_strategy_mock):
+        composite = mock.Mock(spec=scheduler.composite_scout.CompositeScout)
+        composite.member_names = ['v1', 'v2']
+        strat = scheduler.get_strategy_for_scout(composite)
+        self.assertIsInstance(strat,
+                              scheduler.composite_strategy.CompositeStrategy)
+        self.assertEqual(2, get_strategy_mock.call_count)
+
+    @mock.patch('arsenal.strategy.base.get_configured_strategy')
+    def test_get_strategy_for_scout(self, get_strategy_mock):
+        strat = scheduler.get_strategy_for_scout(self.onmetal_scout_mock)
+        self.assertEqual(get_strategy_mock.return_value, strat)
+
+    def test_times_issued_cache_directives(self):
+        self.scheduler.issue_directives(None)
+        self.assertEqual(
+            set(['node-a', 'node-b', 'node-c', 'node-d', 'node-e']),
+            set(cache_tracking.cache_times.started))
+
+    def test_dry_run_times_nothing(self):
+        CONF.set_override('dry_run', True, 'director')
+        self.scheduler.issue_directives(None)
+        self.assertEqual({}, cache_tracking.cache_times.started)
+
+    def test_writes_metrics(self):
+        metrics_file = tempfile.NamedTemporaryFile(suffix='.json')
+        self.addCleanup(metrics_file.close)
+        CONF.set_override('metrics_file', metrics_file.name, 'director')
+        self.addCleanup(CONF.clear_override, 'metrics_file', 'director')
+        cache_tracking.cache_times.issued(
+            [sb.CacheNode('abcd', 'aaaa', 'ubuntu-checksum')])
+        self.onmetal_scout_mock.retrieve_node_data.return_value = [
+            sb.NodeInput('abcd', 'io-flavor', False, True, 'aaaa',
+                         cache_status='cached')]
+        self.scheduler.issue_directives(None)
+        with open(metrics_file.name) as infile:
+            written = json.load(infile)
+        self.assertEqual(
+            1, written['cache_seconds_by_flavor']['flavor=io-flavor']['count'])
+
+    def test_exports_quarantined_nodes(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filename = os.path.join(tempdir, 'quarantine.json')
+        CONF.set_override('quarantine_file', filename, 'node_selection')
+        self.addCleanup(CONF.clear_override, 'quarantine_file',
+                        'node_selection')
+        CONF.set_override('quarantine_after_failures', 1, 'node_selection')
+        self.addCleanup(CONF.clear_override, 'quarantine_after_failures',
+                        'node_selection')
+        cache_tracking.cache_times.issued(
+            [sb.CacheNode('abcd', 'aaaa', 'ubuntu-checksum')])
+        self.onmetal_scout_mock.retrieve_node_data.return_value = [
+            sb.NodeInput('abcd', 'io-flavor', cache_status='failed')]
+        self.scheduler.issue_directives(None)
+        with open(filename) as infile:
+            self.assertEqual(['abcd'], list(json.load(infile)))
+
+    def test_caching_in_flight_limited(self):
+        CONF.set_override('max_caching_per_flavor', 1, 'director')
+        self.addCleanup(CONF.clear_override, 'max_caching_per_flavor',
+                        'director')
+        nodes = [sb.NodeInput('node-%s' % letter, 'io-flavor')
+                 for letter in 'abcde']
+        self.onmetal_scout_mock.retrieve_node_data.return_value = nodes
+        self.scheduler.issue_directives(None)
+        # 1 cache node directive, plus 5 eject node directives
+        self.assertEqual(6, self.issue_action_mock.call_count)
+
+    def test_skips_unchanged_cycles(self):
+        self.scheduler.strat.directives = mock.Mock(return_value=[])
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual(1, self.scheduler.strat.directives.call_count)
+        self.assertEqual(
+            1, metrics.registry.counter(scheduler.NO_OP_CYCLES).value())
+
+    def test_skipped_cycles_bounded(self):
+        CONF.set_override('max_skipped_cycles', 2, 'director')
+        self.addCleanup(CONF.clear_override, 'max_skipped_cycles',
+                        'director')
+        self.scheduler.strat.directives = mock.Mock(return_value=[])
+        for i in range(7):
+            self.scheduler.issue_directives(None)
+        self.assertEqual(3, self.scheduler.strat.directives.call_count)
+
+    def test_does_not_skip_pending_strategy(self):
+        # Such as while a missing image is debounced.
+        self.scheduler.strat.directives = mock.Mock(return_value=[])
+        self.scheduler.strat.has_pending_work = mock.Mock(return_value=True)
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual(2, self.scheduler.strat.directives.call_count)
+
+    def test_does_not_skip_while_backing_off(self):
+        cache_tracking.cache_times.retry_after['abcd'] = (
+            datetime.datetime.now() + datetime.timedelta(hours=1))
+        self.scheduler.strat.directives = mock.Mock(return_value=[])
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual(2, self.scheduler.strat.directives.call_count)
+
+    def test_does_not_skip_after_directives(self):
+        self.scheduler.strat.directives = mock.Mock(
+            return_value=strat_directive_mock())
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual(2, self.scheduler.strat.directives.call_count)
+
+    def test_does_not_skip_changed_nodes(self):
+        self.scheduler.strat.directives = mock.Mock(return_value=[])
+        self.onmetal_scout_mock.retrieve_node_data.side_effect = [
+            [sb.NodeInput('abcd', 'io-flavor')],
+            [sb.NodeInput('abcd', 'io-flavor', cache_status='caching')]]
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual(2, self.scheduler.strat.directives.call_count)
+
+    def test_fingerprint_ignores_order(self):
+        nodes = [sb.NodeInput('abcd', 'io-flavor'),
+                 sb.NodeInput('hjkl', 'memory-flavor', False, True, 'aaaa')]
+        before = scheduler.fingerprint_inputs(nodes, FAKE_IMAGE_DATA,
+                                              FAKE_FLAVOR_DATA)
+        self.assertEqual(
+            before,
+            scheduler.fingerprint_inputs(nodes[::-1], FAKE_IMAGE_DATA[::-1],
+                                         FAKE_FLAVOR_DATA[::-1]))
+        nodes[0].provisioned = True
+        self.assertNotEqual(
+            before,
+            scheduler.fingerprint_inputs(nodes, FAKE_IMAGE_DATA,
+                                         FAKE_FLAVOR_DATA))
+
+    def test_gives_strategy_node_changes(self):
+        self.scheduler.strat = mock.Mock()
+        self.scheduler.strat.directives.return_value = []
+        self.scheduler.strat_takes_node_changes = True
+        changed = sb.NodeInput('abcd', 'io-flavor', False, True, 'aaaa')
+        added = sb.NodeInput('qwer', 'io-flavor')
+        self.onmetal_scout_mock.retrieve_node_data.side_effect = [
+            FAKE_NODE_DATA, [changed, added, FAKE_NODE_DATA[2]]]
+        self.scheduler.issue_directives(None)
+        self.scheduler.strat.update_current_state.assert_called_with(
+            FAKE_NODE_DATA, FAKE_IMAGE_DATA, FAKE_FLAVOR_DATA)
+        self.scheduler.issue_directives(None)
+        self.scheduler.strat.apply_node_changes.assert_called_once_with(
+            [added], [changed], ['hjkl'])
+        self.scheduler.strat.update_current_state.assert_called_with(
+            None, FAKE_IMAGE_DATA, FAKE_FLAVOR_DATA)
+
+    def test_node_changes_unsupported(self):
+        self.scheduler.strat = mock.Mock()
+        self.scheduler.strat.directives.return_value = []
+        self.scheduler.strat.apply_node_changes.side_effect = (
+            NotImplementedError())
+        self.scheduler.strat_takes_node_changes = True
+        nodes = [sb.NodeInput('abcd', 'io-flavor', True)]
+        self.onmetal_scout_mock.retrieve_node_data.side_effect = [
+            FAKE_NODE_DATA, nodes, FAKE_NODE_DATA]
+        for i in range(3):
+            self.scheduler.issue_directives(None)
+        self.assertEqual(1,
+                         self.scheduler.strat.apply_node_changes.call_count)
+        self.scheduler.strat.update_current_state.assert_called_with(
+            FAKE_NODE_DATA, FAKE_IMAGE_DATA, FAKE_FLAVOR_DATA)
+
+    def run_cycles(self, snapshots, incremental):
+        """Issue directives for each snapshot of nodes in turn, returning
+        the directives issued each cycle.
+        """
+        cache_tracking.cache_times.clear()
+        self.scheduler.strat = sps.SimpleProportionalStrategy()
+        self.scheduler.strat_takes_node_changes = incremental
+        self.scheduler.node_states = None
+        self.onmetal_scout_mock.retrieve_node_data.side_effect = (
+            copy.deepcopy(snapshots))
+        cycles = []
+        for snapshot in snapshots:
+            self.issue_action_mock.reset_mock()
+            self.scheduler.issue_directives(None)
+            cycles.append(sorted(
+                (type(directive).__name__, directive.node_uuid,
+                 getattr(directive, 'image_uuid', None))
+                for ((directive,), _kwargs)
+                in self.issue_action_mock.call_args_list))
+        return cycles
+
+    def test_node_changes_match_full_updates(self):
+        CONF.set_override('percentage_to_cache', 1,
+                          'simple_proportional_strategy')
+        CONF.set_override('retirement_debounce_cycles', 1,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'retirement_debounce_cycles',
+                        'simple_proportional_strategy')
+        weights = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights', {'Ubuntu': 1})
+        weights.start()
+        self.addCleanup(weights.stop)
+        self.scheduler.image_data = [
+            sb.ImageInput('Ubuntu', 'aaaa', 'ubuntu-checksum')]
+        self.scheduler.flavor_data = [
+            sb.FlavorInput('io-flavor', lambda n: True)]
+
+        def node(uuid, provisioned=False, image_uuid=''):
+            return sb.NodeInput(uuid, 'io-flavor', provisioned,
+                                bool(image_uuid), image_uuid)
+
+        snapshots = [
+            [node('node-1', True), node('node-2'), node('node-3', False,
+                                                        'aaaa'),
+             node('node-4', False, 'zzzz')],
+            # node-5 added, node-2 removed, node-1 released and node-3's
+            # cached image changed.
+            [node('node-1'), node('node-3', False, 'zzzz'),
+             node('node-4', False, 'zzzz'), node('node-5')],
+            [node('node-1', False, 'aaaa'), node('node-3'),
+             node('node-4', False, 'aaaa'), node('node-5', True)],
+        ]
+        full = self.run_cycles(snapshots, incremental=False)
+        incremental = self.run_cycles(snapshots, incremental=True)
+        self.assertEqual(full, incremental)
+        # Every cycle had work to do, so the comparison means something.
+        self.assertTrue(all(full))
+
+    def test_diff_nodes(self):
+        previous = dict((node.node_uuid, scheduler.node_state(node))
+                        for node in FAKE_NODE_DATA)
+        nodes = [sb.NodeInput('abcd', 'io-flavor', False, False),
+                 sb.NodeInput('hjkl', 'memory-flavor', cache_status='caching'),
+                 sb.NodeInput('qwer', 'io-flavor')]
+        added, changed, removed, states = scheduler.diff_nodes(previous,
+                                                               nodes)
+        self.assertEqual([nodes[2]], added)
+        self.assertEqual([nodes[1]], changed)
+        self.assertEqual(['asdf'], removed)
+        self.assertEqual(set(['abcd', 'hjkl', 'qwer']), set(states))
+
+    def test_records_cycles(self):
+        self.scheduler.recorder = mock.Mock()
+        nodes = [sb.NodeInput('abcd', 'io-flavor', False, False)]
+        self.onmetal_scout_mock.retrieve_node_data.return_value = nodes
+
+        def directives():
+            # Strategies may mark nodes they act on.
+            nodes[0].provisioned = True
+            return strat_directive_mock()
+        self.scheduler.strat.directives = directives
+
+        self.scheduler.issue_directives(None)
+        snapshot, directives = self.scheduler.recorder.record.call_args[0]
+        self.assertEqual(
+            [['abcd', 'io-flavor', False, False, '', '', '', '', '']],
+            snapshot['nodes'])
+        self.assertEqual(10, len(directives))
+
+    def test_recording_off_by_default(self):
+        self.assertIsNone(self.scheduler.recorder)
+
+    def test_tracks_cache_hits(self):
+        cached = [sb.NodeInput('abcd', 'io-flavor', False, True, 'aaaa')]
+        deployed = [sb.NodeInput('abcd', 'io-flavor', True, False, '',
+                                 'aaaa')]
+        self.onmetal_scout_mock.retrieve_node_data.side_effect = [cached,
+                                                                  deployed]
+        self.scheduler.issue_directives(None)
+        self.scheduler.issue_directives(None)
+        self.assertEqual({'io-flavor': {'deployments': 1, 'hits': 1,
+                                        'wasted': 0, 'hit_rate': 1.0}},
+                         self.scheduler.cache_hits.flavor_report())
+
+
+class TestLimitCachingInFlight(base.TestCase):
+
+    def setUp(self):
+        super(TestLimitCachingInFlight, self).setUp()
+        self.nodes = [
+            sb.NodeInput('busy-0', 'io-flavor', False, True, 'aaaa',
+                         cache_status='caching', conductor='c1'),
+            sb.NodeInput('done-0', 'io-flavor', False, True, 'aaaa',
+                         cache_status='cached', conductor='c1'),
+            sb.NodeInput('io-0', 'io-flavor', conductor='c1'),
+            sb.NodeInput('io-1', 'io-flavor', conductor='c2'),
+            sb.NodeInput('io-2', 'io-flavor', conductor='c2'),
+            sb.NodeInput('cpu-0', 'cpu-flavor', conductor='c1'),
+        ]
+        self.directives = [
+            sb.CacheNode(uuid, 'aaaa', 'abcd')
+            for uuid in ('io-0', 'io-1', 'io-2', 'cpu-0')
+        ] + [sb.EjectNode('done-0')]
+
+    def admitted(self, max_per_flavor, max_per_conductor):
+        return [d.node_uuid for d in scheduler.limit_caching_in_flight(
+            self.directives, self.nodes, max_per_flavor, max_per_conductor)]
+
+    def test_no_limits(self):
+        self.assertEqual(['io-0', 'io-1', 'io-2', 'cpu-0', 'done-0'],
+                         self.admitted(0, 0))
+
+    def test_per_flavor(self):
+        # One io-flavor node is already caching.
+        self.assertEqual(['io-0', 'cpu-0', 'done-0'], self.admitted(2, 0))
+
+    def test_per_conductor(self):
+        # One c1 node is already caching.
+        self.assertEqual(['io-0', 'io-1', 'io-2', 'done-0'],
+                         self.admitted(0, 2))
+
+    def test_both(self):
+        self.assertEqual(['io-1', 'done-0'], self.admitted(2, 1))
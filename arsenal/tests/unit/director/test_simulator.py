@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_simulator
+----------------------------------
+
+Tests for `simulator` module.
+"""
+
+import datetime
+
+from oslo_config import cfg
+
+from arsenal.common import util
+from arsenal.director import simulator
+from arsenal.director import synthetic_scout
+from arsenal.tests.unit import base
+
+CONF = cfg.CONF
+
+
+def sample(elapsed, cached_nodes):
+    return simulator.Sample(elapsed, 0, 0, 0, 0, cached_nodes)
+
+
+class TestTimeToSteadyState(base.TestCase):
+
+    def test_no_samples(self):
+        self.assertIsNone(simulator.time_to_steady_state([], 0.1))
+
+    def test_settles(self):
+        samples = [sample(index * 60, count) for index, count in
+                   enumerate([0, 10, 50, 80, 100, 101, 99, 100])]
+        self.assertEqual(240, simulator.time_to_steady_state(samples, 0.1))
+
+    def test_late_excursion_resets(self):
+        samples = [sample(index * 60, count) for index, count in
+                   enumerate([100, 100, 50, 100, 100, 100, 100, 100])]
+        self.assertEqual(180, simulator.time_to_steady_state(samples, 0.1))
+
+
+class TestSimulator(base.TestCase):
+
+    def setUp(self):
+        super(TestSimulator, self).setUp()
+        for name, value in (('dry_run', False), ('directive_spacing', 60),
+                            ('poll_spacing', 120),
+                            ('log_statistics', False)):
+            CONF.set_override(name, value, 'director')
+            self.addCleanup(CONF.clear_override, name, 'director')
+        CONF.set_override('module_class',
+                          'simple_proportional_strategy.'
+                          'SimpleProportionalStrategy', 'strategy')
+        self.addCleanup(CONF.clear_override, 'module_class', 'strategy')
+        CONF.set_override('percentage_to_cache', 0.2,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+
+        self.fleet = synthetic_scout.SyntheticScout(
+            node_count=200, flavor_count=2, image_count=4,
+            initial_utilization=0.5, provision_rate=0.01, release_rate=0.01,
+            cache_latency=300, seed=3)
+        self.clock = util.VirtualClock()
+        self.sim = simulator.Simulator(self.fleet, clock=self.clock)
+
+    def test_run_advances_virtual_clock(self):
+        start = self.clock()
+        self.sim.run(3600)
+        self.assertEqual(start + datetime.timedelta(hours=1), self.clock())
+        # One sample per directive cycle.
+        self.assertEqual(60, len(self.sim.samples))
+        self.assertEqual(3600, self.sim.samples[-1].elapsed)
+        # The wall clock is back in charge afterwards.
+        self.assertIsNone(util.now.clock)
+
+    def test_report(self):
+        self.sim.run(6 * 3600)
+        report = self.sim.report(0.1)
+        self.assertEqual(6 * 3600, report['simulated_seconds'])
+        self.assertEqual(360, report['cycles'])
+        self.assertTrue(report['provisioned'] > 0)
+        self.assertTrue(report['cache_directives'] > 0)
+        self.assertTrue(report['final_cached_nodes'] > 0)
+        self.assertTrue(0 < report['hit_rate'] <= 1)
+        self.assertEqual(report['cache_directives'] * 4,
+                         report['cache_directives_per_day'])
+        self.assertIsNotNone(report['time_to_steady_state'])
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+test_synthetic_scout
+----------------------------------
+
+Tests for `synthetic_scout` module.
+"""
+
+import mock
+from oslo_config import cfg
+
+from arsenal.common import util
+from arsenal.director import recorder
+from arsenal.director import synthetic_scout
+from arsenal.strategy import base as sb
+from arsenal.tests.unit import base
+
+CONF = cfg.CONF
+
+
+class TestSyntheticScout(base.TestCase):
+
+    def setUp(self):
+        super(TestSyntheticScout, self).setUp()
+        self.scout = synthetic_scout.SyntheticScout(
+            node_count=100, flavor_count=4, image_count=5,
+            initial_utilization=0, provision_rate=0, release_rate=0, seed=1)
+
+    def test_defaults_from_config(self):
+        CONF.set_override('node_count', 12, 'synthetic_scout')
+        self.addCleanup(CONF.clear_override, 'node_count', 'synthetic_scout')
+        scout = synthetic_scout.SyntheticScout(seed=1)
+        self.assertEqual(12, len(scout.retrieve_node_data()))
+
+    def test_retrieve_data(self):
+        nodes = self.scout.retrieve_node_data()
+        flavors = self.scout.retrieve_flavor_data()
+        images = self.scout.retrieve_image_data()
+        self.assertEqual(100, len(nodes))
+        self.assertEqual(4, len(flavors))
+        self.assertEqual(5, len(images))
+        # Flavors are spread evenly, and identify their own nodes.
+        for flavor in flavors:
+            self.assertEqual(25, len(list(filter(flavor.is_flavor_node,
+                                                 nodes))))
+        self.assertTrue(all(node.can_cache() for node in nodes))
+
+    def test_retrieve_node_data_returns_copies(self):
+        nodes = self.scout.retrieve_node_data()
+        nodes[0].provisioned = True
+        self.assertFalse(self.scout.retrieve_node_data()[0].provisioned)
+
+    def test_cache_and_eject(self):
+        self.scout.issue_action(sb.CacheNode('synthetic-node-3',
+                                             'synthetic-image-2', 'x'))
+        node = self.scout.retrieve_node_data()[3]
+        self.assertTrue(node.cached)
+        self.assertEqual('synthetic-image-2', node.cached_image_uuid)
+
+        self.scout.issue_action(sb.EjectNode('synthetic-node-3'))
+        node = self.scout.retrieve_node_data()[3]
+        self.assertFalse(node.cached)
+        self.assertEqual('', node.cached_image_uuid)
+        self.assertEqual(1, self.scout.stats['cache_actions'])
+        self.assertEqual(1, self.scout.stats['eject_actions'])
+
+    def test_unknown_targets_ignored(self):
+        self.scout.issue_action(sb.EjectNode('some-other-node'))
+        self.scout.issue_action(sb.EjectNode('synthetic-node-100'))
+        self.scout.issue_action(sb.CacheNode('synthetic-node-1',
+                                             'synthetic-image-9', 'x'))
+        self.assertEqual(3, self.scout.stats['ignored_actions'])
+
+    def test_provisioning_prefers_cached_nodes(self):
+        scout = synthetic_scout.SyntheticScout(
+            node_count=10, flavor_count=1, image_count=1,
+            initial_utilization=0, provision_rate=0.5, release_rate=0,
+            seed=1)
+        for index in range(5):
+            scout.issue_action(sb.CacheNode('synthetic-node-%d' % index,
+                                            'synthetic-image-0', 'x'))
+        nodes = scout.retrieve_node_data()
+        provisioned = [node for node in nodes if node.provisioned]
+        self.assertEqual(5, len(provisioned))
+        self.assertEqual(['synthetic-node-%d' % index for index in range(5)],
+                         [node.node_uuid for node in provisioned])
+        self.assertTrue(all(node.deployed_image_uuid == 'synthetic-image-0'
+                            for node in provisioned))
+        self.assertEqual(1.0, scout.hit_rate())
+
+    def test_churn(self):
+        scout = synthetic_scout.SyntheticScout(
+            node_count=1000, flavor_count=2, image_count=10,
+            initial_utilization=0.5, provision_rate=0.1, release_rate=0.1,
+            seed=42)
+        for _ in range(10):
+            nodes = scout.retrieve_node_data()
+        self.assertTrue(scout.stats['provisioned'] > 0)
+        self.assertTrue(scout.stats['released'] > 0)
+        # Nothing was cached, so nothing could hit.
+        self.assertEqual(0.0, scout.hit_rate())
+        # Conservation of nodes across pools.
+        provisioned = len([node for node in nodes if node.provisioned])
+        self.assertEqual(provisioned,
+                         sum(len(pool) for pool in scout.provisioned))
+
+    def test_seed_is_reproducible(self):
+        def run():
+            scout = synthetic_scout.SyntheticScout(
+                node_count=200, flavor_count=2, image_count=4,
+                initial_utilization=0.3, provision_rate=0.2,
+                release_rate=0.2, seed=7)
+            for _ in range(3):
+                nodes = scout.retrieve_node_data()
+            return [node.provisioned for node in nodes]
+        self.assertEqual(run(), run())
+
+    def test_pending_cache_is_not_a_hit(self):
+        clock = util.VirtualClock()
+        with util.use_clock(clock):
+            scout = synthetic_scout.SyntheticScout(
+                node_count=1, flavor_count=1, image_count=1,
+                initial_utilization=0, provision_rate=1, release_rate=0,
+                cache_latency=60, seed=1)
+            scout.issue_action(sb.CacheNode('synthetic-node-0',
+                                            'synthetic-image-0', 'x'))
+            clock.advance(30)
+            scout.retrieve_node_data()
+        self.assertEqual(1, scout.stats['provisioned'])
+        self.assertEqual(0.0, scout.hit_rate())
+
+    def test_cache_completes_after_latency(self):
+        clock = util.VirtualClock()
+        with util.use_clock(clock):
+            scout = synthetic_scout.SyntheticScout(
+                node_count=1, flavor_count=1, image_count=1,
+                initial_utilization=0, provision_rate=1, release_rate=0,
+                cache_latency=60, seed=1)
+            scout.issue_action(sb.CacheNode('synthetic-node-0',
+                                            'synthetic-image-0', 'x'))
+            clock.advance(60)
+            scout.retrieve_node_data()
+        self.assertEqual(1.0, scout.hit_rate())
+
+    def test_reports_cache_status(self):
+        clock = util.VirtualClock()
+        with util.use_clock(clock):
+            scout = synthetic_scout.SyntheticScout(
+                node_count=1, flavor_count=1, image_count=1,
+                initial_utilization=0, provision_rate=0, release_rate=0,
+                cache_latency=60, seed=1)
+            self.assertEqual('', scout.retrieve_node_data()[0].cache_status)
+            scout.issue_action(sb.CacheNode('synthetic-node-0',
+                                            'synthetic-image-0', 'x'))
+            clock.advance(30)
+            self.assertEqual('caching',
+                             scout.retrieve_node_data()[0].cache_status)
+            clock.advance(30)
+            self.assertEqual('cached',
+                             scout.retrieve_node_data()[0].cache_status)
+
+    def test_ejecting_node_unavailable_until_done(self):
+        clock = util.VirtualClock()
+        with util.use_clock(clock):
+            scout = synthetic_scout.SyntheticScout(
+                node_count=1, flavor_count=1, image_count=1,
+                initial_utilization=0, provision_rate=0, release_rate=0,
+                eject_latency=60, seed=1)
+            scout.issue_action(sb.CacheNode('synthetic-node-0',
+                                            'synthetic-image-0', 'x'))
+            scout.issue_action(sb.EjectNode('synthetic-node-0'))
+            node = scout.retrieve_node_data()[0]
+            self.assertTrue(node.provisioned)
+            self.assertFalse(node.cached)
+            # Further actions are ignored while the node is cleaned.
+            scout.issue_action(sb.EjectNode('synthetic-node-0'))
+            self.assertEqual(1, scout.stats['ignored_actions'])
+
+            clock.advance(60)
+            node = scout.retrieve_node_data()[0]
+            self.assertFalse(node.provisioned)
+            self.assertFalse(node.cached)
+
+    def test_from_cycle(self):
+        weights = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights',
+                                    {'Ubuntu': 3, 'CentOS': 1})
+        weights.start()
+        self.addCleanup(weights.stop)
+        cycle = recorder.Cycle(
+            '2016-01-01T00:00:00',
+            [sb.NodeInput('node-a', 'io-flavor', False, True, 'image-u'),
+             sb.NodeInput('node-b', 'io-flavor', True, False, ''),
+             sb.NodeInput('node-c', 'compute-flavor', False, False, ''),
+             sb.NodeInput('node-d', 'unknown-flavor', False, False, '')],
+            [sb.ImageInput('Ubuntu', 'image-u', 'checksum-u'),
+             sb.ImageInput('CentOS', 'image-c', 'checksum-c')],
+            [sb.FlavorInput('io-flavor', lambda n: True),
+             sb.FlavorInput('compute-flavor', lambda n: True)],
+            [])
+        scout = synthetic_scout.SyntheticScout.from_cycle(
+            cycle, provision_rate=0, release_rate=0, seed=1)
+
+        nodes = scout.retrieve_node_data()
+        self.assertEqual([('node-a', 'io-flavor', False, True, 'image-u'),
+                          ('node-b', 'io-flavor', True, False, ''),
+                          ('node-c', 'compute-flavor', False, False, '')],
+                         [(node.node_uuid, node.flavor, node.provisioned,
+                           node.cached, node.cached_image_uuid)
+                          for node in nodes])
+        self.assertEqual(['Ubuntu', 'CentOS'],
+                         [image.name for image in
+                          scout.retrieve_image_data()])
+        self.assertEqual([3, 4], scout._cumulative_popularity)
+
+        scout.issue_action(sb.CacheNode('node-c', 'image-c', 'x'))
+        self.assertEqual('image-c',
+                         scout.retrieve_node_data()[2].cached_image_uuid)
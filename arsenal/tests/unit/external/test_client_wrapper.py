@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import mock
 from oslo_config import cfg
 
 from arsenal.common import exception
+from arsenal.common import util
 from arsenal.external import client_wrapper
 from arsenal.tests.unit import base as test_base
 
@@ -66,8 +69,26 @@ class FakeClientWrapper(client_wrapper.OpenstackClientWrapper):
         return get_new_fake_client()
 
 
+class FakeCachingClientWrapper(client_wrapper.OpenstackClientWrapper):
+
+    def __init__(self):
+        super(FakeCachingClientWrapper, self).__init__(
+            retry_exceptions=(FakeRetryOnThisException),
+            auth_exceptions=(FakeUnauthorizedException,
+                             FakeForbiddenException),
+            name="FakeCachingClient",
+            cacheable_methods=('flavor.list',))
+
+    def _get_new_client(self):
+        return get_new_fake_client()
+
+
 FAKE_CLIENT = FakeClient()
 
+NOW = datetime.datetime(2016, 1, 1, 12, 0, 0)
+
+ITEMS = ['item-a', 'item-b', 'item-c', 'item-d']
+
 
 class OpenstackClientWrapperTestCase(test_base.TestCase):
 
@@ -166,3 +187,182 @@ class OpenstackClientWrapperTestCase(test_base.TestCase):
         for n in range(0, 4):
             openstackclient.call("flavor.list")
         self.assertEqual(1, mock_get_new_client.call_count)
+
+    def test_token_expires_soon_unknown_expiry(self):
+        openstackclient = FakeClientWrapper()
+        openstackclient._get_client()
+        self.assertFalse(openstackclient.token_expires_soon())
+        self.assertFalse(openstackclient.refresh_if_expiring())
+
+    @mock.patch.object(util, 'now')
+    def test_refresh_if_expiring_swaps_client(self, now_mock):
+        now_mock.return_value = NOW
+        openstackclient = FakeClientWrapper()
+        first_client = openstackclient._get_client()
+        openstackclient._set_token_expiry(NOW + datetime.timedelta(
+            seconds=CONF.client_wrapper.token_refresh_margin - 1))
+        self.assertTrue(openstackclient.refresh_if_expiring())
+        self.assertIsNot(first_client, openstackclient._cached_client)
+        # The new client's expiry is unknown, so nothing more to refresh.
+        self.assertFalse(openstackclient.refresh_if_expiring())
+
+    @mock.patch.object(util, 'now')
+    def test_refresh_if_expiring_leaves_fresh_token(self, now_mock):
+        now_mock.return_value = NOW
+        openstackclient = FakeClientWrapper()
+        first_client = openstackclient._get_client()
+        openstackclient._set_token_expiry(NOW + datetime.timedelta(hours=1))
+        self.assertFalse(openstackclient.refresh_if_expiring())
+        self.assertIs(first_client, openstackclient._cached_client)
+
+    @mock.patch.object(FakeClientWrapper, '_get_new_client')
+    def test_refresh_if_expiring_keeps_client_on_error(self,
+                                                       mock_get_new_client):
+        openstackclient = FakeClientWrapper()
+        mock_get_new_client.return_value = FAKE_CLIENT
+        openstackclient._get_client()
+        openstackclient._set_token_expiry(util.now())
+        mock_get_new_client.side_effect = FakeRetryOnThisException('Down')
+        self.assertFalse(openstackclient.refresh_if_expiring())
+        self.assertIs(FAKE_CLIENT, openstackclient._cached_client)
+
+    @mock.patch('time.sleep')
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    @mock.patch.object(FakeClientWrapper, '_get_new_client')
+    def test_call_reauthorizes_without_sleeping(self, mock_get_new_client,
+                                                mock_multi_getattr,
+                                                mock_sleep):
+        test_obj = mock.Mock()
+        test_obj.side_effect = [FakeUnauthorizedException('Expired'), []]
+        mock_multi_getattr.return_value = test_obj
+        mock_get_new_client.return_value = FAKE_CLIENT
+        self.openstackclient.call("flavor.list")
+        self.assertEqual(2, mock_get_new_client.call_count)
+        self.assertFalse(mock_sleep.called)
+
+    def _generator_method(self, *failures):
+        """Build a fake paginated listing which fails as instructed.
+
+        Each call of the returned mock produces a generator over ITEMS which
+        raises the next exception in failures, if any, once it reaches the
+        matching index.
+        """
+        failures = list(failures)
+
+        def listing(*args, **kwargs):
+            failure = failures.pop(0) if failures else None
+            for index, item in enumerate(ITEMS):
+                if failure is not None and index == failure[0]:
+                    raise failure[1]
+                yield item
+        return mock.Mock(side_effect=listing)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    def test_call_iter_streams_generator(self, mock_multi_getattr):
+        mock_multi_getattr.return_value = self._generator_method()
+        result = self.openstackclient.call_iter("flavor.list")
+        self.assertFalse(isinstance(result, list))
+        self.assertEqual(ITEMS, list(result))
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    def test_call_iter_resumes_after_failure(self, mock_multi_getattr):
+        method = self._generator_method(
+            (2, FakeRetryOnThisException('Page failed')))
+        mock_multi_getattr.return_value = method
+        self.assertEqual(ITEMS,
+                         list(self.openstackclient.call_iter("flavor.list")))
+        self.assertEqual(2, method.call_count)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    @mock.patch.object(FakeClientWrapper, '_get_new_client')
+    def test_call_iter_reauthorizes_mid_listing(self, mock_get_new_client,
+                                                mock_multi_getattr):
+        mock_get_new_client.return_value = FAKE_CLIENT
+        method = self._generator_method(
+            (1, FakeUnauthorizedException('Expired')))
+        mock_multi_getattr.return_value = method
+        self.assertEqual(ITEMS,
+                         list(self.openstackclient.call_iter("flavor.list")))
+        self.assertEqual(2, mock_get_new_client.call_count)
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    def test_call_iter_gives_up(self, mock_multi_getattr):
+        cfg.CONF.set_override('call_max_retries', 2, 'client_wrapper')
+        mock_multi_getattr.return_value = self._generator_method(
+            (0, FakeRetryOnThisException('Down')),
+            (0, FakeRetryOnThisException('Down')))
+        self.assertRaises(exception.ArsenalException, list,
+                          self.openstackclient.call_iter("flavor.list"))
+
+    @mock.patch.object(client_wrapper.OpenstackClientWrapper, '_multi_getattr')
+    def test_call_unwinds_generator_with_retries(self, mock_multi_getattr):
+        mock_multi_getattr.return_value = self._generator_method(
+            (3, FakeRetryOnThisException('Page failed')))
+        self.assertEqual(ITEMS, self.openstackclient.call("flavor.list"))
+
+    def test_call_iter_wraps_lists(self):
+        fake_client = mock.Mock()
+        fake_client.flavor.list.return_value = ITEMS
+        self.openstackclient._cached_client = fake_client
+        self.assertEqual(ITEMS,
+                         list(self.openstackclient.call_iter("flavor.list")))
+
+
+class ResponseCacheTestCase(test_base.TestCase):
+
+    def setUp(self):
+        super(ResponseCacheTestCase, self).setUp()
+        CONF.set_override('response_cache_ttl', 60, 'client_wrapper')
+        self.addCleanup(CONF.clear_override, 'response_cache_ttl',
+                        'client_wrapper')
+        self.openstackclient = FakeCachingClientWrapper()
+        self.list_mock = mock.Mock(return_value=['flavor-a', 'flavor-b'])
+        fake_client = mock.Mock()
+        fake_client.flavor.list = self.list_mock
+        self.openstackclient._cached_client = fake_client
+
+    @mock.patch.object(util, 'now')
+    def test_cached_response_is_reused_within_ttl(self, now_mock):
+        now_mock.return_value = NOW
+        first = self.openstackclient.call('flavor.list')
+        now_mock.return_value = NOW + datetime.timedelta(seconds=59)
+        second = self.openstackclient.call('flavor.list')
+        self.assertEqual(['flavor-a', 'flavor-b'], first)
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.list_mock.call_count)
+
+    @mock.patch.object(util, 'now')
+    def test_cached_response_expires(self, now_mock):
+        now_mock.return_value = NOW
+        self.openstackclient.call('flavor.list')
+        now_mock.return_value = NOW + datetime.timedelta(seconds=60)
+        self.openstackclient.call('flavor.list')
+        self.assertEqual(2, self.list_mock.call_count)
+
+    def test_cached_response_keyed_by_arguments(self):
+        self.openstackclient.call('flavor.list')
+        self.openstackclient.call('flavor.list', detail=True)
+        self.assertEqual(2, self.list_mock.call_count)
+
+    def test_cached_response_is_copied(self):
+        self.openstackclient.call('flavor.list').append('flavor-c')
+        self.assertEqual(['flavor-a', 'flavor-b'],
+                         self.openstackclient.call('flavor.list'))
+
+    def test_invalidate_response_cache(self):
+        self.openstackclient.call('flavor.list')
+        self.openstackclient.invalidate_response_cache('other.list')
+        self.openstackclient.call('flavor.list')
+        self.assertEqual(1, self.list_mock.call_count)
+        self.openstackclient.invalidate_response_cache('flavor.list')
+        self.openstackclient.call('flavor.list')
+        self.assertEqual(2, self.list_mock.call_count)
+        self.openstackclient.invalidate_response_cache()
+        self.openstackclient.call('flavor.list')
+        self.assertEqual(3, self.list_mock.call_count)
+
+    def test_ttl_zero_disables_cache(self):
+        CONF.set_override('response_cache_ttl', 0, 'client_wrapper')
+        self.openstackclient.call('flavor.list')
+        self.openstackclient.call('flavor.list')
+        self.assertEqual(2, self.list_mock.call_count)
@@ -14,12 +14,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 from glanceclient.v2 import client as glance_client
 from keystoneclient.v2_0 import client as keystone_client
 import mock
 from oslo_config import cfg
 
 from arsenal.external import glance_client_wrapper as client_wrapper
+from arsenal.external import keystone_session
 from arsenal.tests.unit import base as test_base
 
 CONF = cfg.CONF
@@ -62,3 +65,37 @@ class GlanceClientWrapperTestCase(test_base.TestCase):
         expected = {'token': 'fake-token'}
         mock_glance_cli.assert_called_once_with(CONF.glance.api_endpoint,
                                                 **expected)
+
+    @mock.patch.object(keystone_session, 'get_session')
+    @mock.patch.object(glance_client, 'Client')
+    @mock.patch.object(keystone_client, 'Client')
+    def test__get_client_shared_session(self, mock_ks_cli, mock_glance_cli,
+                                        mock_session):
+        self.flags(api_endpoint='glance-endpoint', group='glance')
+        self.flags(admin_auth_token=None, group='glance')
+        self.flags(use_shared_session=True, group='client_wrapper')
+        self.addCleanup(CONF.clear_override, 'use_shared_session',
+                        'client_wrapper')
+        glanceclient = client_wrapper.GlanceClientWrapper()
+        # dummy call to have _get_client() called
+        glanceclient.call("image.list")
+        # No keystone client should be built just to mint a token.
+        self.assertFalse(mock_ks_cli.called)
+        mock_glance_cli.assert_called_once_with(
+            CONF.glance.api_endpoint, session=mock_session.return_value)
+
+    @mock.patch.object(glance_client, 'Client')
+    def test__get_client_records_token_expiry(self, mock_glance_cli):
+        self.flags(api_endpoint='glance-endpoint', group='glance')
+        self.flags(admin_auth_token=None, group='glance')
+        expires = datetime.datetime(2016, 1, 1, 12, 0, 0)
+
+        def get_token(**kwargs):
+            return 'fake-token'
+        get_token.expires = expires
+
+        glanceclient = client_wrapper.GlanceClientWrapper(get_token)
+        glanceclient.call("image.list")
+        mock_glance_cli.assert_called_once_with(CONF.glance.api_endpoint,
+                                                token='fake-token')
+        self.assertEqual(expires, glanceclient._token_expires)
@@ -18,6 +18,7 @@ import mock
 from oslo_config import cfg
 
 from arsenal.external import ironic_client_wrapper as client_wrapper
+from arsenal.external import keystone_session
 from arsenal.tests.unit import base as test_base
 from arsenal.tests.unit.external import ironic_utils
 
@@ -54,6 +55,41 @@ class IronicClientWrapperTestCase(test_base.TestCase):
         mock_ir_cli.assert_called_once_with(CONF.ironic.api_version,
                                             **expected)
 
+    @mock.patch.object(keystone_session, 'get_session')
+    @mock.patch.object(ironic_client, 'get_client')
+    def test__get_client_shared_session(self, mock_ir_cli, mock_session):
+        self.flags(admin_auth_token=None, admin_username='ironic-admin',
+                   group='ironic')
+        self.addCleanup(CONF.clear_override, 'admin_username', 'ironic')
+        self.flags(use_shared_session=True, group='client_wrapper')
+        self.addCleanup(CONF.clear_override, 'use_shared_session',
+                        'client_wrapper')
+        ironicclient = client_wrapper.IronicClientWrapper()
+        # dummy call to have _get_client() called
+        ironicclient.call("node.list")
+        # Ironic's own credentials pick its session.
+        mock_session.assert_called_once_with(
+            auth_url=CONF.ironic.admin_url, username='ironic-admin',
+            password=CONF.ironic.admin_password,
+            tenant_name=CONF.ironic.admin_tenant_name)
+        expected = {'session': mock_session.return_value,
+                    'os_service_type': 'baremetal',
+                    'os_endpoint_type': 'public',
+                    'ironic_url': CONF.ironic.api_endpoint}
+        mock_ir_cli.assert_called_once_with(CONF.ironic.api_version,
+                                            **expected)
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_token_expiry_unknown(self, mock_ir_cli):
+        self.flags(admin_auth_token=None, group='ironic')
+        ironicclient = client_wrapper.IronicClientWrapper()
+        ironicclient.call("node.list")
+        # Only the shared session can refresh Ironic's token ahead of time.
+        self.assertFalse(ironicclient.reports_token_expiry)
+        self.assertFalse(ironicclient.token_expires_soon())
+        self.assertFalse(ironicclient.refresh_if_expiring())
+        self.assertEqual(1, mock_ir_cli.call_count)
+
     @mock.patch.object(ironic_client, 'get_client')
     def test__get_client_with_auth_token(self, mock_ir_cli):
         self.flags(admin_auth_token='fake-token', group='ironic')
@@ -0,0 +1,106 @@
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+
+from arsenal.common import exception
+from arsenal.external import keystone_session
+from arsenal.tests.unit import base as test_base
+
+CONF = cfg.CONF
+
+
+class KeystoneSessionTestCase(test_base.TestCase):
+
+    def setUp(self):
+        super(KeystoneSessionTestCase, self).setUp()
+        keystone_session.reset_session()
+        self.addCleanup(keystone_session.reset_session)
+        self.flags(os_api_url='http://keystone:5000/v2.0/',
+                   os_username='arsenal',
+                   os_password='secret',
+                   os_tenant_name='arsenal-tenant',
+                   group='client_wrapper')
+        for opt in ('os_api_url', 'os_username', 'os_password',
+                    'os_tenant_name', 'connection_pool_size'):
+            self.addCleanup(CONF.clear_override, opt, 'client_wrapper')
+
+    def test_get_session_is_shared(self):
+        first_session = keystone_session.get_session()
+        second_session = keystone_session.get_session()
+        self.assertIs(first_session, second_session)
+
+    def test_reset_session_creates_new_session(self):
+        first_session = keystone_session.get_session()
+        keystone_session.reset_session()
+        second_session = keystone_session.get_session()
+        self.assertIsNot(first_session, second_session)
+
+    def test_sessions_per_credentials(self):
+        shared = keystone_session.get_session()
+        self.assertIs(shared, keystone_session.get_session(
+            username='arsenal', auth_url='http://keystone:5000/v2.0/'))
+        ironic = keystone_session.get_session(username='ironic',
+                                              password='ironic-secret')
+        self.assertIsNot(shared, ironic)
+        self.assertEqual('ironic', ironic.auth.username)
+        self.assertEqual('arsenal-tenant', ironic.auth.tenant_name)
+
+    def test_refresh_session_refreshes_every_session(self):
+        sessions = [keystone_session.get_session(),
+                    keystone_session.get_session(username='ironic')]
+        for session in sessions:
+            session.auth.auth_ref = None
+            session.auth.get_auth_ref = mock.Mock()
+        self.assertTrue(keystone_session.refresh_session())
+        for session in sessions:
+            session.auth.get_auth_ref.assert_called_once_with(session)
+
+    def test_session_pools_connections(self):
+        self.flags(connection_pool_size=25, group='client_wrapper')
+        session = keystone_session.get_session()
+        for scheme in ('http://', 'https://'):
+            adapter = session.session.get_adapter(scheme + 'example.com')
+            self.assertEqual(25, adapter._pool_maxsize)
+
+    def test_session_requires_auth_url(self):
+        self.flags(os_api_url=None, group='client_wrapper')
+        self.assertRaises(exception.ArsenalException,
+                          keystone_session.get_session)
+
+    def test_refresh_session_without_session(self):
+        self.assertFalse(keystone_session.refresh_session())
+
+    def test_refresh_session_replaces_expiring_token(self):
+        session = keystone_session.get_session()
+        expiring_ref = mock.Mock()
+        expiring_ref.will_expire_soon.return_value = True
+        session.auth.auth_ref = expiring_ref
+        with mock.patch.object(session.auth, 'get_auth_ref') as get_ref_mock:
+            self.assertTrue(keystone_session.refresh_session())
+            get_ref_mock.assert_called_once_with(session)
+            self.assertEqual(get_ref_mock.return_value,
+                             session.auth.auth_ref)
+
+    def test_refresh_session_keeps_valid_token(self):
+        session = keystone_session.get_session()
+        valid_ref = mock.Mock()
+        valid_ref.will_expire_soon.return_value = False
+        session.auth.auth_ref = valid_ref
+        with mock.patch.object(session.auth, 'get_auth_ref') as get_ref_mock:
+            self.assertFalse(keystone_session.refresh_session())
+            self.assertFalse(get_ref_mock.called)
+        self.assertEqual(valid_ref, session.auth.auth_ref)
@@ -17,6 +17,7 @@ import mock
 from novaclient import client as nova_client
 from oslo_config import cfg
 
+from arsenal.external import keystone_session
 from arsenal.external import nova_client_wrapper as client_wrapper
 from arsenal.tests.unit import base as test_base
 
@@ -77,3 +78,31 @@ class NovaClientWrapperTestCase(test_base.TestCase):
         }
         mock_nova_cli.assert_called_once_with(*expected_args,
                                               **expected_kw_args)
+
+    @mock.patch.object(keystone_session, 'get_session')
+    @mock.patch.object(nova_client, 'Client')
+    def test__get_client_shared_session(self, mock_nova_cli,
+                                        mock_get_session):
+        self.flags(use_shared_session=True, group='client_wrapper')
+        novaclient = client_wrapper.NovaClientWrapper()
+        novaclient.call("flavor.list")
+        mock_get_session.assert_called_once_with(
+            auth_url='some_host', username='myusername', password='somepass',
+            tenant_name='garfield')
+        mock_nova_cli.assert_called_once_with(
+            '2', insecure=True, service_name='clouds', region_name='ord',
+            session=mock_get_session.return_value)
+
+    @mock.patch.object(keystone_session, 'get_session')
+    @mock.patch.object(nova_client, 'Client')
+    def test__get_client_shared_session_other_auth_system(
+            self, mock_nova_cli, mock_get_session):
+        self.flags(use_shared_session=True, group='client_wrapper')
+        self.flags(auth_system='rackspace', group='nova')
+        novaclient = client_wrapper.NovaClientWrapper()
+        novaclient.call("flavor.list")
+        self.assertFalse(mock_get_session.called)
+        self.assertEqual('rackspace',
+                         mock_nova_cli.call_args[1]['auth_system'])
+        self.assertEqual(('2', 'myusername', 'somepass', 'garfield',
+                          'some_host'), mock_nova_cli.call_args[0])
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_cache_schedule
+----------------------------------
+
+Tests for time of day cache schedules.
+"""
+
+from __future__ import division
+
+import collections
+import datetime
+import json
+import tempfile
+
+from oslo_config import cfg
+import six
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_schedule
+from arsenal.tests.unit import base as test_base
+
+CONF = cfg.CONF
+
+# A Monday.
+MONDAY = datetime.datetime(2016, 5, 2)
+
+# Quiet nights, busy from 9 until 17.
+DAILY = [0.05] * 9 + [0.3] * 8 + [0.05] * 7
+
+Cycle = collections.namedtuple('Cycle', ['time', 'nodes', 'directives'])
+
+
+class TestCacheSchedule(test_base.TestCase):
+
+    def test_daily_profile_repeats(self):
+        schedule = cache_schedule.CacheSchedule({'io': DAILY})
+        sunday_noon = MONDAY + datetime.timedelta(days=6, hours=12)
+        self.assertEqual(0.3, schedule.target('io', sunday_noon))
+        self.assertEqual(0.05, schedule.target('io', MONDAY))
+
+    def test_weekly_profile(self):
+        weekly = [0.1] * (5 * 24) + [0.0] * (2 * 24)
+        schedule = cache_schedule.CacheSchedule({'io': weekly})
+        self.assertEqual(0.1, schedule.target(
+            'io', MONDAY + datetime.timedelta(days=4, hours=23)))
+        self.assertEqual(0.0, schedule.target(
+            'io', MONDAY + datetime.timedelta(days=5)))
+
+    def test_any_flavor(self):
+        schedule = cache_schedule.CacheSchedule({'io': DAILY,
+                                                 '*': [0.2] * 24})
+        self.assertEqual(0.2, schedule.target('memory', MONDAY))
+        schedule = cache_schedule.CacheSchedule({'io': DAILY})
+        self.assertIsNone(schedule.target('memory', MONDAY))
+
+    def test_prewarm_lookahead(self):
+        schedule = cache_schedule.CacheSchedule({'io': DAILY},
+                                                prewarm_lookahead=3600)
+        self.assertEqual(0.05, schedule.target(
+            'io', MONDAY.replace(hour=7, minute=59)))
+        # The 9 o'clock peak is within the hour.
+        self.assertEqual(0.3, schedule.target(
+            'io', MONDAY.replace(hour=8, minute=0)))
+        self.assertEqual(0.3, schedule.target(
+            'io', MONDAY.replace(hour=16, minute=59)))
+        self.assertEqual(0.05, schedule.target(
+            'io', MONDAY.replace(hour=17, minute=1)))
+
+    def test_invalid_profiles(self):
+        self.assertRaises(cache_schedule.InvalidCacheScheduleError,
+                          cache_schedule.CacheSchedule, {'io': [0.1] * 23})
+        self.assertRaises(cache_schedule.InvalidCacheScheduleError,
+                          cache_schedule.CacheSchedule,
+                          {'io': [1.5] * 24})
+
+    def test_get_configured_schedule(self):
+        self.assertIsNone(cache_schedule.get_configured_schedule())
+
+        schedule_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(schedule_file.close)
+        schedule_file.write(six.b(json.dumps({'io': DAILY})))
+        schedule_file.flush()
+        CONF.set_override('schedule_filename', schedule_file.name,
+                          'cache_schedule')
+        self.addCleanup(CONF.clear_override, 'schedule_filename',
+                        'cache_schedule')
+        schedule = cache_schedule.get_configured_schedule()
+        self.assertEqual(0.3, schedule.target(
+            'io', MONDAY.replace(hour=9)))
+
+    def test_get_configured_schedule_invalid(self):
+        schedule_file = tempfile.NamedTemporaryFile()
+        self.addCleanup(schedule_file.close)
+        schedule_file.write(six.b(json.dumps({'io': [2] * 24})))
+        schedule_file.flush()
+        CONF.set_override('schedule_filename', schedule_file.name,
+                          'cache_schedule')
+        self.addCleanup(CONF.clear_override, 'schedule_filename',
+                        'cache_schedule')
+        self.assertIsNone(cache_schedule.get_configured_schedule())
+
+
+class TestLearnSchedule(test_base.TestCase):
+
+    def make_cycles(self):
+        """Two days of hourly cycles over 10 io nodes.
+
+        At 9 o'clock on both days two nodes are provisioned, and released
+        an hour later. At 14 o'clock on the first day one node is ejected.
+        """
+        cycles = []
+        for hour in range(48):
+            when = MONDAY + datetime.timedelta(hours=hour)
+            provisioned = 2 if when.hour == 9 else 0
+            nodes = [sb.NodeInput('io-%d' % n, 'io', n < provisioned)
+                     for n in range(10)]
+            directives = []
+            if hour == 14:
+                directives = [sb.EjectNode('io-9')]
+            if hour == 15:
+                nodes[9].provisioned = True
+            cycles.append(Cycle(when.isoformat(), nodes, directives))
+        return cycles
+
+    def test_learn_schedule(self):
+        schedule = cache_schedule.learn_schedule(self.make_cycles(),
+                                                 coverage_hours=2)
+        profile = schedule['io']
+        self.assertEqual(168, len(profile))
+        # 2 provisions an hour against 8 unprovisioned nodes, covering two
+        # hours of demand.
+        self.assertEqual(0.5, profile[9])
+        self.assertEqual(0.5, profile[24 + 9])
+        # The ejection isn't demand.
+        self.assertEqual(0.0, profile[15])
+        self.assertEqual(0.0, profile[10])
+        # Wednesday was never recorded, so it follows Monday and Tuesday.
+        self.assertEqual(0.5, profile[48 + 9])
+        self.assertEqual(0.0, profile[48 + 12])
+
+    def test_learn_schedule_max_percentage(self):
+        schedule = cache_schedule.learn_schedule(self.make_cycles(),
+                                                 coverage_hours=2,
+                                                 max_percentage=0.3)
+        self.assertEqual(0.3, schedule['io'][9])
+
+    def test_learned_schedule_loads(self):
+        schedule = cache_schedule.learn_schedule(self.make_cycles())
+        cache_schedule.CacheSchedule(schedule)
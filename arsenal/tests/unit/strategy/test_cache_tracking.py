@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_cache_tracking
+----------------------------------
+
+Tests for tracking how long nodes take to cache.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+from oslo_config import cfg
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.tests.unit import base as test_base
+
+CONF = cfg.CONF
+
+START = datetime.datetime(2016, 1, 1)
+
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+
+def node(uuid, cache_status, provisioned=False):
+    return sb.NodeInput(uuid, 'IO', provisioned,
+                        cache_status not in ('', 'failed'), 'aaaa',
+                        cache_status=cache_status)
+
+
+class TestCacheTimeTracker(test_base.TestCase):
+
+    def setUp(self):
+        super(TestCacheTimeTracker, self).setUp()
+        self.tracker = cache_tracking.CacheTimeTracker(smoothing=0.5)
+
+    def cache(self, uuid, seconds, start=0):
+        self.tracker.issued([sb.CacheNode(uuid, 'aaaa', 'abcd')], at(start))
+        self.tracker.update([node(uuid, 'caching')], at(start))
+        return self.tracker.update([node(uuid, 'cached')],
+                                   at(start + seconds))
+
+    def test_times_issued_directives(self):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd'),
+                             sb.EjectNode('io-1')], at(0))
+        self.assertEqual([], self.tracker.update([node('io-0', 'caching')],
+                                                 at(60)))
+        outcomes = self.tracker.update([node('io-0', 'cached')], at(90))
+        self.assertEqual([('io-0', 'aaaa', 90, True)],
+                         [(o.node.node_uuid, o.image_uuid, o.seconds,
+                           o.succeeded) for o in outcomes])
+        self.assertEqual(90, self.tracker.expected_cache_time('io-0'))
+
+    def test_times_from_first_seen_caching(self):
+        self.tracker.update([node('io-0', 'caching')], at(10))
+        self.tracker.update([node('io-0', 'cached')], at(40))
+        self.assertEqual(30, self.tracker.expected_cache_time('io-0'))
+
+    def test_already_cached_not_timed(self):
+        self.assertEqual([], self.tracker.update([node('io-0', 'cached')],
+                                                 at(10)))
+        self.assertEqual({}, self.tracker.cache_times)
+
+    def test_moving_average(self):
+        self.cache('io-0', 100)
+        self.cache('io-0', 200, start=1000)
+        self.assertEqual(150, self.tracker.expected_cache_time('io-0'))
+
+    def test_failures_counted_until_success(self):
+        for start in (0, 100):
+            self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')],
+                                at(start))
+            self.tracker.update([node('io-0', 'caching')], at(start + 10))
+            outcomes = self.tracker.update([node('io-0', 'failed')],
+                                           at(start + 50))
+            self.assertEqual([('aaaa', None, False)],
+                             [(o.image_uuid, o.seconds, o.succeeded)
+                              for o in outcomes])
+        self.assertEqual(2, self.tracker.failures['io-0'])
+        # A stale failed status isn't counted again.
+        self.tracker.update([node('io-0', 'failed')], at(300))
+        self.assertEqual(2, self.tracker.failures['io-0'])
+        self.cache('io-0', 30, start=400)
+        self.assertNotIn('io-0', self.tracker.failures)
+
+    def test_stale_failure_after_reissue(self):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(0))
+        self.tracker.update([node('io-0', 'failed')], at(50))
+        self.assertEqual(1, self.tracker.failures['io-0'])
+        # Told to cache again, the node still reports its earlier failure
+        # on the first poll.
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(100))
+        self.assertEqual([], self.tracker.update([node('io-0', 'failed')],
+                                                 at(110)))
+        self.assertEqual(1, self.tracker.failures['io-0'])
+        self.tracker.update([node('io-0', 'caching')], at(120))
+        outcomes = self.tracker.update([node('io-0', 'cached')], at(160))
+        self.assertEqual([(60, True)],
+                         [(o.seconds, o.succeeded) for o in outcomes])
+        self.assertNotIn('io-0', self.tracker.failures)
+
+    def test_stale_failure_then_new_failure(self):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(0))
+        self.tracker.update([node('io-0', 'failed')], at(50))
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(100))
+        self.tracker.update([node('io-0', 'failed')], at(110))
+        self.tracker.update([node('io-0', 'caching')], at(120))
+        self.tracker.update([node('io-0', 'failed')], at(130))
+        self.assertEqual(2, self.tracker.failures['io-0'])
+
+    def test_repeated_failure_without_new_status(self):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(0))
+        self.tracker.update([node('io-0', 'failed')], at(50))
+        # Re-issued, the node fails again before it is next polled, so it
+        # never reports anything but 'failed'.
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(100))
+        self.assertEqual([], self.tracker.update([node('io-0', 'failed')],
+                                                 at(110)))
+        outcomes = self.tracker.update([node('io-0', 'failed')], at(170))
+        self.assertEqual([('aaaa', False)],
+                         [(o.image_uuid, o.succeeded) for o in outcomes])
+        self.assertEqual(2, self.tracker.failures['io-0'])
+        # Counted once.
+        self.tracker.update([node('io-0', 'failed')], at(230))
+        self.assertEqual(2, self.tracker.failures['io-0'])
+
+    def test_provisioned_stops_timing(self):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(0))
+        self.tracker.update([node('io-0', 'caching', provisioned=True)],
+                            at(10))
+        self.assertEqual({}, self.tracker.started)
+
+    def test_unobserved_nodes_are_typical(self):
+        for uuid, seconds in (('io-0', 10), ('io-1', 20), ('io-2', 60)):
+            self.cache(uuid, seconds)
+        self.assertEqual(20, self.tracker.typical_cache_time())
+        self.assertEqual(20, self.tracker.expected_cache_time('io-9'))
+        self.cache('io-3', 100)
+        self.assertEqual(40, self.tracker.typical_cache_time())
+
+    def test_no_observations(self):
+        self.assertEqual(0, self.tracker.expected_cache_time('io-0'))
+
+
+class TestFailureBackoff(test_base.TestCase):
+
+    def setUp(self):
+        super(TestFailureBackoff, self).setUp()
+        for name, value in (('failure_backoff', 100),
+                            ('max_failure_backoff', 300),
+                            ('quarantine_after_failures', 4)):
+            CONF.set_override(name, value, 'node_selection')
+            self.addCleanup(CONF.clear_override, name, 'node_selection')
+        self.tracker = cache_tracking.CacheTimeTracker()
+
+    def fail(self, when):
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(when))
+        self.tracker.update([node('io-0', 'caching')], at(when))
+        self.tracker.update([node('io-0', 'failed')], at(when))
+
+    def test_backoff_doubles_up_to_limit(self):
+        self.fail(0)
+        self.assertEqual(set(['io-0']), self.tracker.held_back(at(99)))
+        self.assertEqual(set(), self.tracker.held_back(at(100)))
+        self.fail(100)
+        self.assertEqual(set(['io-0']), self.tracker.held_back(at(299)))
+        self.assertEqual(set(), self.tracker.held_back(at(300)))
+        self.fail(300)
+        # Capped at max_failure_backoff rather than 400.
+        self.assertEqual(set(), self.tracker.held_back(at(600)))
+
+    def test_success_resets_backoff(self):
+        self.fail(0)
+        self.tracker.issued([sb.CacheNode('io-0', 'aaaa', 'abcd')], at(10))
+        self.tracker.update([node('io-0', 'cached')], at(20))
+        self.assertEqual(set(), self.tracker.held_back(at(20)))
+        self.assertNotIn('io-0', self.tracker.failures)
+
+    def test_quarantine(self):
+        for when in (0, 100, 300, 700):
+            self.fail(when)
+        self.assertEqual(4, self.tracker.quarantined['io-0']['failures'])
+        self.assertEqual(set(['io-0']), self.tracker.held_back(at(100000)))
+
+    def test_quarantine_disabled(self):
+        CONF.set_override('quarantine_after_failures', 0, 'node_selection')
+        for when in (0, 100, 300, 700, 1000):
+            self.fail(when)
+        self.assertEqual({}, self.tracker.quarantined)
+
+    def test_quarantine_file(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        filename = os.path.join(tempdir, 'quarantine.json')
+        # A missing file is an empty quarantine.
+        self.tracker.load_quarantine(filename)
+
+        for when in (0, 100, 300, 700):
+            self.fail(when)
+        self.tracker.write_quarantine(filename)
+        with open(filename) as infile:
+            self.assertEqual(['io-0'], list(json.load(infile)))
+
+        tracker = cache_tracking.CacheTimeTracker()
+        tracker.load_quarantine(filename)
+        self.assertEqual(set(['io-0']), tracker.held_back(at(0)))
+
+        # Operators release nodes by removing them from the file.
+        with open(filename, 'w') as outfile:
+            json.dump({}, outfile)
+        self.tracker.load_quarantine(filename)
+        self.assertEqual(set(), self.tracker.held_back(at(100000)))
+        self.assertNotIn('io-0', self.tracker.failures)
+
+
+class TestFastCacherNodeSelector(test_base.TestCase):
+
+    def test_prefers_fast_and_reliable_nodes(self):
+        tracker = cache_tracking.CacheTimeTracker()
+        tracker.cache_times = {'slow': 600, 'medium': 120, 'fast': 60,
+                               'failing': 30}
+        tracker.failures = {'failing': 2}
+        # Unobserved nodes take the median, 90 seconds.
+        nodes = [sb.NodeInput(uuid, 'IO') for uuid in
+                 ('slow', 'medium', 'fast', 'failing', 'new')]
+        nodes.append(sb.NodeInput('cached', 'IO', False, True, 'aaaa'))
+        selector = cache_tracking.FastCacherNodeSelector(tracker)
+        self.assertEqual(['fast', 'new', 'medium', 'slow', 'failing'],
+                         [n.node_uuid for n in selector.select(nodes, 6)])
+        self.assertEqual(['fast', 'new'],
+                         [n.node_uuid for n in selector.select(nodes, 2)])
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_churn
+----------------------------------
+
+Tests for churn-minimizing ejection.
+"""
+
+import datetime
+
+import mock
+
+from arsenal.common import util
+from arsenal.strategy import base as sb
+from arsenal.strategy import cache_tracking
+from arsenal.strategy import churn
+from arsenal.strategy import node_selection
+from arsenal.tests.unit import base as test_base
+
+IMAGES = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd'),
+          sb.ImageInput('CoreOS', 'bbbb', 'efgh')]
+
+
+def cached_nodes(**counts):
+    nodes = []
+    for uuid, count in sorted(counts.items()):
+        nodes.extend(sb.NodeInput('%s-%d' % (uuid, n), 'IO', False, True,
+                                  uuid) for n in range(count))
+    return nodes
+
+
+class TestRetirementDebouncer(test_base.TestCase):
+
+    def test_retires_after_consecutive_cycles(self):
+        debouncer = churn.RetirementDebouncer(3)
+        cached = set(['aaaa', 'gone'])
+        for _ in range(2):
+            self.assertEqual(set(), debouncer.observe(['aaaa'], cached))
+            self.assertEqual(set(['gone']), debouncer.pending())
+        self.assertEqual(set(['gone']), debouncer.observe(['aaaa'], cached))
+        self.assertEqual(set(), debouncer.pending())
+
+    def test_flapping_image_resets(self):
+        debouncer = churn.RetirementDebouncer(2)
+        cached = set(['aaaa'])
+        self.assertEqual(set(), debouncer.observe([], cached))
+        self.assertEqual(set(), debouncer.observe(['aaaa'], cached))
+        self.assertEqual(set(), debouncer.observe([], cached))
+        self.assertEqual(set(['aaaa']), debouncer.observe([], cached))
+
+    def test_one_cycle_retires_immediately(self):
+        debouncer = churn.RetirementDebouncer(1)
+        self.assertEqual(set(['gone']),
+                         debouncer.observe(['aaaa'], set(['gone'])))
+
+    def test_uncached_images_forgotten(self):
+        debouncer = churn.RetirementDebouncer(2)
+        self.assertEqual(set(), debouncer.observe([], set(['gone'])))
+        self.assertEqual(set(), debouncer.observe([], set()))
+        self.assertEqual(set(), debouncer.pending())
+        self.assertEqual(set(), debouncer.observe([], set(['gone'])))
+
+
+class TestPlanRebalance(test_base.TestCase):
+
+    def setUp(self):
+        super(TestPlanRebalance, self).setUp()
+        weights = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights',
+                                    {'Ubuntu': 1, 'CoreOS': 1})
+        weights.start()
+        self.addCleanup(weights.stop)
+
+    def plan(self, nodes, **kwargs):
+        return [node.node_uuid
+                for node in churn.plan_rebalance(IMAGES, nodes, **kwargs)]
+
+    def test_swaps_until_balanced(self):
+        self.assertEqual(['aaaa-0', 'aaaa-1', 'aaaa-2'],
+                         self.plan(cached_nodes(aaaa=8, bbbb=2)))
+
+    def test_limit(self):
+        self.assertEqual(['aaaa-0'],
+                         self.plan(cached_nodes(aaaa=8, bbbb=2), limit=1))
+
+    def test_balanced_is_left_alone(self):
+        self.assertEqual([], self.plan(cached_nodes(aaaa=5, bbbb=5)))
+        # Odd totals can't be balanced, swapping would just move the error.
+        self.assertEqual([], self.plan(cached_nodes(aaaa=6, bbbb=5)))
+
+    def test_hysteresis(self):
+        # Ubuntu's target is 5, 7 is within 50%.
+        self.assertEqual(
+            [], self.plan(cached_nodes(aaaa=7, bbbb=3), hysteresis=0.5))
+        # Ejection stops once back inside the band.
+        self.assertEqual(
+            ['aaaa-0'],
+            self.plan(cached_nodes(aaaa=8, bbbb=2), hysteresis=0.5))
+
+    def test_download_cost(self):
+        nodes = cached_nodes(aaaa=8, bbbb=2)
+        # A swap reduces the error by at most two nodes.
+        self.assertEqual([], self.plan(nodes, churn_cost=2.0))
+
+        # CoreOS is small, so cheap to download.
+        images = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd', 3000),
+                  sb.ImageInput('CoreOS', 'bbbb', 'efgh', 1000)]
+        planned = churn.plan_rebalance(images, nodes, churn_cost=2.0)
+        self.assertEqual(3, len(planned))
+
+    def test_unlisted_images_ignored(self):
+        self.assertEqual([], self.plan(cached_nodes(zzzz=10, bbbb=1)))
+
+
+class FirstNodesSelector(node_selection.NodeSelector):
+    """Chooses the first nodes available, so tests know which."""
+
+    def select(self, nodes, count):
+        return [node for node in nodes if node.can_cache()][:count]
+
+
+class TestStagedRollout(test_base.TestCase):
+
+    def setUp(self):
+        super(TestStagedRollout, self).setUp()
+        self.rollout = churn.StagedRollout(2)
+        self.new_images = [sb.ImageInput('Ubuntu', 'cccc', 'ijkl'),
+                           IMAGES[1]]
+        self.addCleanup(cache_tracking.cache_times.clear)
+
+    def step(self, old, new, free, downloading=0):
+        new_nodes = cached_nodes(cccc=new + downloading)
+        for n, node in enumerate(new_nodes):
+            node.cache_status = 'cached' if n < new else 'caching'
+        nodes = (cached_nodes(aaaa=old) + new_nodes +
+                 [sb.NodeInput('free-%d' % n, 'IO') for n in range(free)])
+        directives = self.rollout.directives({'IO': nodes}, self.new_images,
+                                             FirstNodesSelector())
+        cached = [d.node_uuid for d in directives
+                  if isinstance(d, sb.CacheNode)]
+        ejected = [d.node_uuid for d in directives
+                   if isinstance(d, sb.EjectNode)]
+        return cached, ejected
+
+    def test_make_before_break(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=3))
+        self.assertEqual(set(['aaaa']), self.rollout.retiring())
+
+        self.assertEqual((['free-0', 'free-1'], []), self.step(3, 0, 2))
+        self.assertEqual(([], ['aaaa-0', 'aaaa-1']), self.step(3, 2, 0))
+        self.assertEqual((['free-0'], []), self.step(1, 2, 2))
+        self.assertEqual(set(['aaaa']), self.rollout.retiring())
+        self.assertEqual(([], ['aaaa-0']), self.step(1, 3, 1))
+        self.assertEqual(set(), self.rollout.retiring())
+
+    def test_downloads_in_progress_not_relied_on(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=3))
+        # Two new copies are still downloading, so nothing more is cached
+        # for them, and only the finished copy lets an old one go.
+        self.assertEqual((['free-0'], []), self.step(3, 0, 2, downloading=2))
+        self.assertEqual(([], ['aaaa-0']), self.step(3, 1, 0, downloading=2))
+
+    def test_held_back_nodes_skipped(self):
+        cache_tracking.cache_times.retry_after['free-0'] = (
+            util.now() + datetime.timedelta(hours=1))
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=1))
+        self.assertEqual((['free-1'], []), self.step(1, 0, 2))
+
+    def test_uses_selector(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=2))
+        selector = mock.Mock()
+        selector.select.return_value = []
+        nodes = cached_nodes(aaaa=2) + [sb.NodeInput('free-0', 'IO')]
+        self.assertEqual([], self.rollout.directives(
+            {'IO': nodes}, self.new_images, selector))
+        selector.select.assert_called_once_with(nodes, 2)
+
+    def test_batch_size_bounds_retirement(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=3))
+        self.assertEqual(([], ['aaaa-0', 'aaaa-1']), self.step(3, 3, 0))
+
+    def test_cached_nodes_marked(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=1))
+        node = sb.NodeInput('free-0', 'IO')
+        self.rollout.directives({'IO': [node]}, self.new_images)
+        self.assertFalse(node.can_cache())
+        self.assertEqual('cccc', node.cached_image_uuid)
+
+    def test_unchanged_images_ignored(self):
+        self.rollout.start(IMAGES, IMAGES, cached_nodes(aaaa=3))
+        self.assertEqual({}, self.rollout.rollouts)
+
+    def test_retired_image_abandoned(self):
+        self.rollout.start(IMAGES, self.new_images, cached_nodes(aaaa=3))
+        self.assertEqual([], self.rollout.directives(
+            {'IO': cached_nodes(aaaa=3)}, IMAGES[1:]))
+        self.assertEqual(set(), self.rollout.retiring())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2016 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import composite_strategy
+from arsenal.tests.unit import base
+
+V1_NODES = [sb.NodeInput('node-1', 'flavor-v1')]
+V2_NODES = [sb.NodeInput('node-2', 'flavor-v2')]
+V1_IMAGES = [sb.ImageInput('Ubuntu', 'image-v1', 'a')]
+V1_FLAVORS = [sb.FlavorInput('flavor-v1', lambda n: True)]
+V2_FLAVORS = [sb.FlavorInput('flavor-v2', lambda n: True)]
+
+
+def fake_partition(nodes, images, flavors):
+    return [('v1', V1_NODES, V1_IMAGES, V1_FLAVORS),
+            ('v2', V2_NODES, [], V2_FLAVORS)]
+
+
+class TestCompositeStrategy(base.TestCase):
+
+    @mock.patch.object(sb, 'get_configured_strategy')
+    def setUp(self, get_strategy_mock):
+        super(TestCompositeStrategy, self).setUp()
+        get_strategy_mock.side_effect = lambda: mock.Mock()
+        self.strat = composite_strategy.CompositeStrategy(fake_partition,
+                                                          ['v1', 'v2'])
+        self.v1_strat = self.strat.strategies['v1']
+        self.v2_strat = self.strat.strategies['v2']
+
+    def test_update_current_state_partitions(self):
+        self.strat.update_current_state(V1_NODES + V2_NODES, V1_IMAGES,
+                                        V1_FLAVORS + V2_FLAVORS)
+        self.v1_strat.update_current_state.assert_called_once_with(
+            V1_NODES, V1_IMAGES, V1_FLAVORS)
+        self.v2_strat.update_current_state.assert_called_once_with(
+            V2_NODES, [], V2_FLAVORS)
+
+    def test_has_pending_work(self):
+        self.v1_strat.has_pending_work.return_value = False
+        self.v2_strat.has_pending_work.return_value = False
+        self.assertFalse(self.strat.has_pending_work())
+        self.v2_strat.has_pending_work.return_value = True
+        self.assertTrue(self.strat.has_pending_work())
+
+    def test_directives_skip_incomplete_fleets(self):
+        self.v1_strat.directives.return_value = [sb.EjectNode('node-1')]
+        self.strat.update_current_state(V1_NODES + V2_NODES, V1_IMAGES,
+                                        V1_FLAVORS + V2_FLAVORS)
+        directives = self.strat.directives()
+        self.assertEqual(['node-1'],
+                         [directive.node_uuid for directive in directives])
+        # The v2 fleet has no images, so its strategy isn't consulted.
+        self.assertFalse(self.v2_strat.directives.called)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_controller
+----------------------------------
+
+Tests for the cache target feedback controller.
+"""
+
+from arsenal.strategy import controller
+from arsenal.tests.unit import base as test_base
+
+
+class TestPIController(test_base.TestCase):
+
+    def make(self, **kwargs):
+        args = dict(setpoint=0.8, proportional_gain=0.5, integral_gain=0.1,
+                    initial_output=0.2, output_min=0.0, output_max=1.0)
+        args.update(kwargs)
+        return controller.PIController(**args)
+
+    def test_proportional_and_integral(self):
+        pi = self.make()
+        # Error 0.3: 0.2 + 0.5 * 0.3 + 0.1 * 0.3
+        self.assertAlmostEqual(0.38, pi.update(0.5))
+        # Same error again, integral doubles.
+        self.assertAlmostEqual(0.41, pi.update(0.5))
+
+    def test_on_target_holds(self):
+        pi = self.make()
+        for _ in range(5):
+            self.assertAlmostEqual(0.2, pi.update(0.8))
+
+    def test_bounded(self):
+        pi = self.make(output_max=0.3)
+        for _ in range(10):
+            self.assertEqual(0.3, pi.update(0.0))
+
+    def test_no_windup_while_saturated(self):
+        pi = self.make(output_max=0.3)
+        for _ in range(100):
+            pi.update(0.0)
+        # Demand met again: the output comes off the bound immediately
+        # instead of unwinding a hundred cycles of integral.
+        self.assertTrue(pi.update(1.0) < 0.3)
+
+    def test_max_step(self):
+        pi = self.make(max_step=0.05)
+        self.assertAlmostEqual(0.25, pi.update(0.0))
+        self.assertAlmostEqual(0.30, pi.update(0.0))
+
+    def test_smoothing(self):
+        pi = self.make(smoothing=0.5, integral_gain=0)
+        pi.update(0.8)
+        # Filtered measurement is 0.4, error 0.4.
+        self.assertAlmostEqual(0.4, pi.update(0.0))
+
+    def test_initial_output_clamped(self):
+        self.assertEqual(0.1, self.make(output_max=0.1).output)
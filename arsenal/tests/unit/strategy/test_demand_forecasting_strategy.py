@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_demand_forecasting_strategy
+----------------------------------
+
+Tests for the demand forecasting caching strategy.
+"""
+
+from __future__ import division
+
+import mock
+from oslo_config import cfg
+
+from arsenal.common import util
+from arsenal.strategy import base as sb
+from arsenal.strategy import demand_forecasting_strategy as dfs
+from arsenal.tests.unit import base as test_base
+
+CONF = cfg.CONF
+
+IMAGES = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd'),
+          sb.ImageInput('CoreOS', 'bbbb', 'efgh')]
+FLAVORS = [sb.FlavorInput('hot', lambda n: n.flavor == 'hot'),
+           sb.FlavorInput('cold', lambda n: n.flavor == 'cold')]
+
+
+def make_nodes(flavor, count, provisioned=0, cached=0):
+    nodes = []
+    for n in range(count):
+        is_provisioned = n < provisioned
+        is_cached = not is_provisioned and n < provisioned + cached
+        nodes.append(sb.NodeInput('%s-%d' % (flavor, n), flavor,
+                                  is_provisioned, is_cached,
+                                  'aaaa' if is_cached else ''))
+    return nodes
+
+
+class TestDemandForecastingStrategy(test_base.TestCase):
+
+    def setUp(self):
+        super(TestDemandForecastingStrategy, self).setUp()
+        for name, value in (('smoothing', 0.5), ('refill_time', 3600),
+                            ('safety_factor', 1.0)):
+            CONF.set_override(name, value, 'demand_forecasting_strategy')
+            self.addCleanup(CONF.clear_override, name,
+                            'demand_forecasting_strategy')
+        self.clock = util.VirtualClock()
+        clock = mock.patch.object(util.now, 'clock', self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.strat = dfs.DemandForecastingStrategy()
+
+    def update(self, hot_provisioned, cold_provisioned=0, seconds=600):
+        self.clock.advance(seconds)
+        self.strat.update_current_state(
+            make_nodes('hot', 100, hot_provisioned) +
+            make_nodes('cold', 100, cold_provisioned),
+            IMAGES, FLAVORS)
+
+    def test_no_caching_without_demand(self):
+        self.update(0)
+        self.assertEqual([], self.strat.directives())
+        self.update(0)
+        self.assertEqual([], self.strat.directives())
+
+    def test_estimates_arrival_rate(self):
+        self.update(0)
+        # 6 provisions in 10 minutes is 36 an hour.
+        self.update(6)
+        self.assertAlmostEqual(36, self.strat.arrival_rates['hot'] * 3600)
+        self.assertEqual(0, self.strat.arrival_rates['cold'])
+        # Nothing provisioned in the next 10 minutes halves the estimate.
+        self.update(6)
+        self.assertAlmostEqual(18, self.strat.arrival_rates['hot'] * 3600)
+
+    def test_caches_to_cover_refill_time(self):
+        self.update(0)
+        self.update(6)
+        directives = self.strat.directives()
+        self.assertEqual(36, len(directives))
+        self.assertTrue(all(node_uuid.startswith('hot-') for node_uuid in
+                            [d.node_uuid for d in directives]))
+
+    def test_counts_cached_nodes_towards_target(self):
+        self.update(0)
+        self.clock.advance(600)
+        self.strat.update_current_state(
+            make_nodes('hot', 100, 6, cached=30), IMAGES, FLAVORS)
+        self.assertEqual(6, len(self.strat.directives()))
+
+    def test_capped_by_max_percentage(self):
+        CONF.set_override('max_percentage_to_cache', 0.1,
+                          'demand_forecasting_strategy')
+        self.addCleanup(CONF.clear_override, 'max_percentage_to_cache',
+                        'demand_forecasting_strategy')
+        strat = dfs.DemandForecastingStrategy()
+        strat.update_current_state(make_nodes('hot', 100), IMAGES, FLAVORS)
+        self.clock.advance(600)
+        strat.update_current_state(make_nodes('hot', 100, 50), IMAGES,
+                                   FLAVORS)
+        # 10% of the 50 unprovisioned nodes.
+        self.assertEqual(5, len(strat.directives()))
+
+    def test_min_cached_per_flavor(self):
+        CONF.set_override('min_cached_per_flavor', 2,
+                          'demand_forecasting_strategy')
+        self.addCleanup(CONF.clear_override, 'min_cached_per_flavor',
+                        'demand_forecasting_strategy')
+        strat = dfs.DemandForecastingStrategy()
+        strat.update_current_state(make_nodes('cold', 10), IMAGES, FLAVORS)
+        self.assertEqual(2, len(strat.directives()))
+
+    def test_own_ejections_are_not_demand(self):
+        self.update(0)
+        nodes = make_nodes('hot', 100)
+        nodes[99].cached = True
+        nodes[99].cached_image_uuid = 'retired-image'
+        self.clock.advance(600)
+        self.strat.update_current_state(nodes, IMAGES, FLAVORS)
+        directives = self.strat.directives()
+        self.assertIn('hot-99', [d.node_uuid for d in directives
+                                 if isinstance(d, sb.EjectNode)])
+
+        # The ejected node shows up provisioned while it is cleaned.
+        nodes = make_nodes('hot', 100)
+        nodes[99].provisioned = True
+        self.clock.advance(600)
+        self.strat.update_current_state(nodes, IMAGES, FLAVORS)
+        self.assertEqual(0, self.strat.arrival_rates['hot'])
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_node_selection
+----------------------------------
+
+Tests for choosing which nodes to cache.
+"""
+
+import collections
+
+from oslo_config import cfg
+
+from arsenal.strategy import base as sb
+from arsenal.strategy import node_selection
+from arsenal.tests.unit import base as test_base
+
+CONF = cfg.CONF
+
+
+def rack_nodes(rack, free, cached=0, provisioned=0):
+    nodes = []
+    for n in range(free):
+        nodes.append(sb.NodeInput('%s-free-%d' % (rack, n), 'IO',
+                                  topology=rack))
+    for n in range(cached):
+        nodes.append(sb.NodeInput('%s-cached-%d' % (rack, n), 'IO', False,
+                                  True, 'aaaa', topology=rack))
+    for n in range(provisioned):
+        nodes.append(sb.NodeInput('%s-used-%d' % (rack, n), 'IO', True,
+                                  topology=rack))
+    return nodes
+
+
+def count_by_rack(nodes):
+    return collections.Counter(node.topology for node in nodes)
+
+
+class TestRandomNodeSelector(test_base.TestCase):
+
+    def test_selects_available_nodes(self):
+        nodes = rack_nodes('r1', 3, cached=2, provisioned=2)
+        chosen = node_selection.RandomNodeSelector().select(nodes, 5)
+        self.assertEqual(3, len(chosen))
+        self.assertTrue(all(node.can_cache() for node in chosen))
+
+    def test_selects_count(self):
+        nodes = rack_nodes('r1', 5)
+        self.assertEqual(
+            2, len(node_selection.RandomNodeSelector().select(nodes, 2)))
+
+
+class TestTopologySpreadingNodeSelector(test_base.TestCase):
+
+    def test_spreads_over_domains(self):
+        nodes = rack_nodes('r1', 6) + rack_nodes('r2', 6) + rack_nodes('r3', 6)
+        selector = node_selection.TopologySpreadingNodeSelector(0)
+        chosen = selector.select(nodes, 6)
+        self.assertEqual({'r1': 2, 'r2': 2, 'r3': 2}, count_by_rack(chosen))
+
+    def test_fills_least_cached_domains_first(self):
+        nodes = (rack_nodes('r1', 4, cached=3) + rack_nodes('r2', 4) +
+                 rack_nodes('r3', 4, cached=1, provisioned=3))
+        selector = node_selection.TopologySpreadingNodeSelector(0)
+        chosen = selector.select(nodes, 4)
+        self.assertEqual({'r2': 3, 'r3': 1}, count_by_rack(chosen))
+
+    def test_per_domain_limit(self):
+        nodes = rack_nodes('r1', 6) + rack_nodes('r2', 1)
+        selector = node_selection.TopologySpreadingNodeSelector(2)
+        chosen = selector.select(nodes, 5)
+        self.assertEqual({'r1': 2, 'r2': 1}, count_by_rack(chosen))
+
+    def test_nodes_without_topology_share_a_domain(self):
+        nodes = [sb.NodeInput('io-%d' % n, 'IO') for n in range(4)]
+        selector = node_selection.TopologySpreadingNodeSelector(3)
+        self.assertEqual(3, len(selector.select(nodes, 4)))
+
+    def test_domain_at_limit_gets_no_directive(self):
+        caching = [sb.NodeInput('r1-caching-%d' % n, 'IO', False, True,
+                                'aaaa', topology='r1', cache_status='caching')
+                   for n in range(2)]
+        nodes = rack_nodes('r1', 4) + caching + rack_nodes('r2', 4)
+        selector = node_selection.TopologySpreadingNodeSelector(2)
+        chosen = selector.select(nodes, 4)
+        self.assertEqual({'r2': 2}, count_by_rack(chosen))
+
+    def test_finished_downloads_free_the_domain(self):
+        done = [sb.NodeInput('r1-done-%d' % n, 'IO', False, True, 'aaaa',
+                             topology='r1', cache_status=status)
+                for n, status in enumerate(('cached', 'failed'))]
+        selector = node_selection.TopologySpreadingNodeSelector(2)
+        chosen = selector.select(rack_nodes('r1', 4) + done, 4)
+        self.assertEqual({'r1': 2}, count_by_rack(chosen))
+
+    def test_configured_limit(self):
+        CONF.set_override('max_caching_per_domain', 1, 'node_selection')
+        self.addCleanup(CONF.clear_override, 'max_caching_per_domain',
+                        'node_selection')
+        selector = node_selection.TopologySpreadingNodeSelector()
+        self.assertEqual(1, len(selector.select(rack_nodes('r1', 3), 3)))
+
+
+class TestGetConfiguredNodeSelector(test_base.TestCase):
+
+    def test_default(self):
+        self.assertIsInstance(node_selection.get_configured_node_selector(),
+                              node_selection.RandomNodeSelector)
+
+    def test_configured(self):
+        CONF.set_override('selector_class',
+                          'node_selection.TopologySpreadingNodeSelector',
+                          'node_selection')
+        self.addCleanup(CONF.clear_override, 'selector_class',
+                        'node_selection')
+        self.assertIsInstance(node_selection.get_configured_node_selector(),
+                              node_selection.TopologySpreadingNodeSelector)
@@ -22,13 +22,17 @@ behavior appears to be correct.
 
 from __future__ import division
 import copy
+import datetime
 import random
 
 import mock
 from oslo_config import cfg
 import six
 
+from arsenal.common import util
 from arsenal.strategy import base as sb
+from arsenal.strategy import cache_schedule
+from arsenal.strategy import cache_tracking
 from arsenal.strategy import simple_proportional_strategy as sps
 from arsenal.tests.unit import base as test_base
 from arsenal.tests.unit.strategy import test_strategy_base as sb_test
@@ -263,3 +267,542 @@ class TestSimpleProportionalStrategy(test_base.TestCase):
                               group='simple_proportional_strategy')
             self.assertRaises(sps.InvalidPercentageError,
                               sps.SimpleProportionalStrategy)
+
+
+class TestHitRateControl(test_base.TestCase):
+
+    def setUp(self):
+        super(TestHitRateControl, self).setUp()
+        for name, value in (('percentage_to_cache', 0.1),
+                            ('target_hit_rate', 0.8),
+                            ('controller_smoothing', 1.0),
+                            ('controller_max_step', 0.05)):
+            CONF.set_override(name, value, 'simple_proportional_strategy')
+            self.addCleanup(CONF.clear_override, name,
+                            'simple_proportional_strategy')
+        self.images = sb_test.TEST_IMAGES[:1]
+        self.image_uuid = self.images[0].uuid
+        self.flavors = [sb.FlavorInput('IO', lambda n: True)]
+        self.strat = sps.SimpleProportionalStrategy()
+
+    def nodes(self, cached, deployed_cached=0, deployed_cold=0):
+        """Build 100 nodes, deploying some cached and uncached ones."""
+        nodes = []
+        for n in range(100):
+            if n < deployed_cached + deployed_cold:
+                nodes.append(sb.NodeInput('io-%d' % n, 'IO', True, False,
+                                          '', self.image_uuid))
+            elif n < cached:
+                nodes.append(sb.NodeInput('io-%d' % n, 'IO', False, True,
+                                          self.image_uuid))
+            else:
+                nodes.append(sb.NodeInput('io-%d' % n, 'IO', False, False,
+                                          ''))
+        return nodes
+
+    def test_off_by_default(self):
+        CONF.clear_override('target_hit_rate', 'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(10), self.images, self.flavors)
+        strat.update_current_state(self.nodes(10, deployed_cold=10),
+                                   self.images, self.flavors)
+        self.assertEqual(0.1, strat.percentage_for('IO'))
+
+    def test_misses_raise_percentage(self):
+        # Nodes io-0 to io-4 were cached and are now deployed, and so are
+        # five which weren't cached.
+        self.strat.update_current_state(self.nodes(5), self.images,
+                                        self.flavors)
+        self.strat.update_current_state(
+            self.nodes(5, deployed_cached=5, deployed_cold=5),
+            self.images, self.flavors)
+        # A hit rate of 0.5 is 0.3 under target.
+        self.assertAlmostEqual(0.1 + 0.1 * 0.3 + 0.02 * 0.3,
+                               self.strat.percentage_for('IO'))
+
+    def test_hits_lower_percentage(self):
+        CONF.set_override('target_hit_rate', 0.5,
+                          'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(10), self.images,
+                                   self.flavors)
+        strat.update_current_state(self.nodes(10, deployed_cached=10),
+                                   self.images, self.flavors)
+        self.assertTrue(strat.percentage_for('IO') < 0.1)
+
+    def test_no_provisions_holds_percentage(self):
+        self.strat.update_current_state(self.nodes(5), self.images,
+                                        self.flavors)
+        self.strat.update_current_state(self.nodes(5), self.images,
+                                        self.flavors)
+        self.assertEqual(0.1, self.strat.percentage_for('IO'))
+
+    def test_own_ejections_are_not_provisions(self):
+        nodes = self.nodes(5)
+        nodes[0].cached_image_uuid = 'retired'
+        self.strat.update_current_state(nodes, self.images, self.flavors)
+        self.strat.directives()
+        nodes = self.nodes(0)
+        nodes[0].provisioned = True
+        self.strat.update_current_state(nodes, self.images, self.flavors)
+        self.assertEqual(0.1, self.strat.percentage_for('IO'))
+
+    def test_invalid_bounds(self):
+        CONF.set_override('min_percentage_to_cache', 0.6,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'min_percentage_to_cache',
+                        'simple_proportional_strategy')
+        self.assertRaises(sps.InvalidPercentageBoundsError,
+                          sps.SimpleProportionalStrategy)
+
+    def test_observe_consumption(self):
+        previous = {'a': 'image-1', 'b': 'image-1', 'c': '', 'd': 'image-1',
+                    'e': 'image-1'}
+        nodes = [sb.NodeInput('a', 'IO', True, False, '', 'image-1'),
+                 sb.NodeInput('b', 'IO', True, False, '', 'image-2'),
+                 sb.NodeInput('c', 'IO', True, False, '', 'image-1'),
+                 # Deployed image unknown, but the cache was consumed.
+                 sb.NodeInput('d', 'Memory', True),
+                 sb.NodeInput('e', 'Memory', True),
+                 sb.NodeInput('f', 'Memory', True, False, '', 'image-1')]
+        self.assertEqual({'IO': (3, 1), 'Memory': (1, 1)},
+                         sps.observe_consumption(nodes, previous, {'e'}))
+
+
+class TestScheduledPercentage(test_base.TestCase):
+
+    def setUp(self):
+        super(TestScheduledPercentage, self).setUp()
+        CONF.set_override('percentage_to_cache', 0.1,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+
+    def test_schedule_sets_percentage(self):
+        strat = sps.SimpleProportionalStrategy()
+        strat.schedule = cache_schedule.CacheSchedule({'IO': [0.4] * 24})
+        self.assertEqual(0.4, strat.percentage_for('IO'))
+        # Unscheduled flavors keep percentage_to_cache.
+        self.assertEqual(0.1, strat.percentage_for('Memory'))
+
+        nodes = [sb.NodeInput('io-%d' % n, 'IO') for n in range(10)]
+        strat.update_current_state(nodes, sb_test.TEST_IMAGES,
+                                   [sb.FlavorInput('IO', lambda n: True)])
+        self.assertEqual(4, len(strat.directives()))
+
+    def test_pending_before_scheduled_rise(self):
+        strat = sps.SimpleProportionalStrategy()
+        strat.schedule = cache_schedule.CacheSchedule(
+            {'IO': [0.1] * 12 + [0.4] * 12})
+        strat.update_current_state([], sb_test.TEST_IMAGES,
+                                   [sb.FlavorInput('IO', lambda n: True)])
+        # Mondays 2016-01-04 at 10:30, 11:30 and 12:30.
+        for hour, pending in ((10, False), (11, True), (12, False)):
+            clock = util.VirtualClock(
+                datetime.datetime(2016, 1, 4, hour, 30))
+            with util.use_clock(clock):
+                self.assertEqual(pending, strat.has_pending_work())
+
+    def test_controller_overrides_schedule(self):
+        strat = sps.SimpleProportionalStrategy()
+        strat.schedule = cache_schedule.CacheSchedule({'IO': [0.4] * 24})
+        strat.flavor_percentages['IO'] = 0.2
+        self.assertEqual(0.2, strat.percentage_for('IO'))
+
+
+class TestRetirementDebounce(test_base.TestCase):
+
+    def setUp(self):
+        super(TestRetirementDebounce, self).setUp()
+        CONF.set_override('percentage_to_cache', 0,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        CONF.set_override('retirement_debounce_cycles', 2,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'retirement_debounce_cycles',
+                        'simple_proportional_strategy')
+        self.flavors = [sb.FlavorInput('IO', lambda n: True)]
+
+    def directives(self, strat, images):
+        nodes = [sb.NodeInput('io-0', 'IO', False, True, INVALID_IMAGE.uuid)]
+        strat.update_current_state(nodes, images, self.flavors)
+        return strat.directives()
+
+    def test_missing_image_ejected_after_debounce(self):
+        strat = sps.SimpleProportionalStrategy()
+        self.assertEqual([], self.directives(strat, sb_test.TEST_IMAGES))
+        directives = self.directives(strat, sb_test.TEST_IMAGES)
+        self.assertEqual(['io-0'], [d.node_uuid for d in directives
+                                    if isinstance(d, sb.EjectNode)])
+
+    def test_pending_while_debouncing(self):
+        strat = sps.SimpleProportionalStrategy()
+        self.directives(strat, sb_test.TEST_IMAGES)
+        self.assertTrue(strat.has_pending_work())
+        self.directives(strat, sb_test.TEST_IMAGES)
+        self.assertFalse(strat.has_pending_work())
+
+    def test_flapping_image_not_ejected(self):
+        strat = sps.SimpleProportionalStrategy()
+        with_invalid = sb_test.TEST_IMAGES + [INVALID_IMAGE]
+        for images in (sb_test.TEST_IMAGES, with_invalid,
+                       sb_test.TEST_IMAGES, with_invalid):
+            self.assertEqual([], self.directives(strat, images))
+
+
+class TestStagedRollout(test_base.TestCase):
+
+    def setUp(self):
+        super(TestStagedRollout, self).setUp()
+        for name, value in (('percentage_to_cache', 0),
+                            ('staged_rollout', True)):
+            CONF.set_override(name, value, 'simple_proportional_strategy')
+            self.addCleanup(CONF.clear_override, name,
+                            'simple_proportional_strategy')
+        self.flavors = [sb.FlavorInput('IO', lambda n: True)]
+        self.old = sb.ImageInput('Ubuntu', 'aaaa', 'abcd')
+        self.new = sb.ImageInput('Ubuntu', 'bbbb', 'efgh')
+
+    def directives(self, strat, images, nodes):
+        strat.update_current_state(nodes, images, self.flavors)
+        return strat.directives()
+
+    def test_old_copies_kept_until_replaced(self):
+        strat = sps.SimpleProportionalStrategy()
+        self.directives(strat, [self.old],
+                        [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+                         sb.NodeInput('io-1', 'IO')])
+        directives = self.directives(
+            strat, [self.new],
+            [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+             sb.NodeInput('io-1', 'IO')])
+        self.assertEqual([('io-1', 'bbbb')],
+                         [(d.node_uuid, d.image_uuid) for d in directives])
+
+        directives = self.directives(
+            strat, [self.new],
+            [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+             sb.NodeInput('io-1', 'IO', False, True, 'bbbb',
+                          cache_status='caching')])
+        # The new copy is still downloading.
+        self.assertEqual([], directives)
+
+        directives = self.directives(
+            strat, [self.new],
+            [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+             sb.NodeInput('io-1', 'IO', False, True, 'bbbb',
+                          cache_status='cached')])
+        self.assertEqual(['io-0'], [d.node_uuid for d in directives
+                                    if isinstance(d, sb.EjectNode)])
+        self.assertIn('io-0', strat.ejected)
+
+        self.directives(
+            strat, [self.new],
+            [sb.NodeInput('io-0', 'IO'),
+             sb.NodeInput('io-1', 'IO', False, True, 'bbbb',
+                          cache_status='cached')])
+        # Ejections are only remembered for a cycle.
+        self.assertEqual(set(), strat.ejected)
+
+    def test_nodes_listed_only_during_rollout(self):
+        strat = sps.SimpleProportionalStrategy()
+        nodes = [sb.NodeInput('io-0', 'IO', False, True, 'aaaa')]
+        with mock.patch.object(strat.rollout, 'directives') as directives:
+            self.directives(strat, [self.old], copy.deepcopy(nodes))
+            self.assertFalse(directives.called)
+            directives.return_value = []
+            self.directives(strat, [self.new], copy.deepcopy(nodes))
+            self.assertEqual(set(['IO']),
+                             set(directives.call_args[0][0]))
+
+    def test_disabled_ejects_at_once(self):
+        CONF.set_override('staged_rollout', False,
+                          'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        nodes = [sb.NodeInput('io-0', 'IO', False, True, 'aaaa')]
+        self.directives(strat, [self.old], nodes)
+        directives = self.directives(
+            strat, [self.new],
+            [sb.NodeInput('io-0', 'IO', False, True, 'aaaa')])
+        self.assertEqual(['io-0'], [d.node_uuid for d in directives
+                                    if isinstance(d, sb.EjectNode)])
+
+
+class TestRebalancing(test_base.TestCase):
+
+    def setUp(self):
+        super(TestRebalancing, self).setUp()
+        patcher = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.images = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd'),
+                       sb.ImageInput('CoreOS', 'bbbb', 'efgh')]
+        self.flavors = [sb.FlavorInput('IO', lambda n: True)]
+
+    def nodes(self):
+        return ([sb.NodeInput('io-%d' % n, 'IO', False, True, 'aaaa')
+                 for n in range(4)] +
+                [sb.NodeInput('free-%d' % n, 'IO') for n in range(4)])
+
+    def test_rebalance_nodes(self):
+        nodes = self.nodes()
+        ejections = sps.rebalance_nodes(nodes, self.images, 5)
+        ejected = [ejection.node_uuid for ejection in ejections]
+        self.assertEqual(2, len(ejected))
+        for node in nodes:
+            self.assertEqual(node.node_uuid in ejected, node.provisioned)
+
+    def test_rebalance_nodes_bounded(self):
+        self.assertEqual(
+            1, len(sps.rebalance_nodes(self.nodes(), self.images, 1)))
+
+    def over_cached_nodes(self):
+        self.images.append(sb.ImageInput('Arch', 'cccc', 'ijkl'))
+        return ([sb.NodeInput('a-%d' % n, 'IO', False, True, 'aaaa')
+                 for n in range(5)] +
+                [sb.NodeInput('b-%d' % n, 'IO', False, True, 'bbbb')
+                 for n in range(4)])
+
+    def test_rebalance_several_over_cached_images(self):
+        ejections = sps.rebalance_nodes(self.over_cached_nodes(),
+                                        self.images, 5)
+        self.assertEqual(['a-0', 'a-1', 'b-0'],
+                         [ejection.node_uuid for ejection in ejections])
+
+    def test_weight_guided_order_stays_inside_gate(self):
+        nodes = self.over_cached_nodes()
+        with mock.patch.object(sb, 'image_weight_guided_ejection',
+                               return_value=[self.images[1]] * 3):
+            ejections = sps.rebalance_nodes(nodes, self.images, 5)
+        # Only one CoreOS copy is worth ejecting, however often the weights
+        # name it.
+        self.assertEqual(['b-0', 'a-0', 'a-1'],
+                         [ejection.node_uuid for ejection in ejections])
+
+    def test_balanced_cache_left_alone(self):
+        nodes = [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+                 sb.NodeInput('io-1', 'IO', False, True, 'bbbb')]
+        self.assertEqual([], sps.rebalance_nodes(nodes, self.images, 5))
+
+    def test_strategy_rebalances(self):
+        CONF.set_override('rebalance_ejections_per_cycle', 1,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'simple_proportional_strategy')
+        CONF.set_override('percentage_to_cache', 0.5,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        directives = strat.directives()
+        ejected = [d.node_uuid for d in directives
+                   if isinstance(d, sb.EjectNode)]
+        cached = [d.image_uuid for d in directives
+                  if isinstance(d, sb.CacheNode)]
+        self.assertEqual(1, len(ejected))
+        self.assertEqual(set(ejected), strat.ejected)
+        # 7 unprovisioned nodes remain, 3 of them cached.
+        self.assertEqual([], cached)
+
+    def test_strategy_weighs_download_cost(self):
+        CONF.set_override('rebalance_ejections_per_cycle', 5,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'simple_proportional_strategy')
+        CONF.set_override('percentage_to_cache', 0,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        # A swap reduces the distance from the weighted distribution by at
+        # most two nodes, so it isn't worth a download costing two.
+        CONF.set_override('rebalance_churn_cost', 2.0,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_churn_cost',
+                        'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        self.assertEqual([], strat.directives())
+
+        CONF.set_override('rebalance_churn_cost', 1.0,
+                          'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        self.assertEqual(2, len([d for d in strat.directives()
+                                 if isinstance(d, sb.EjectNode)]))
+
+    def test_weight_change_inside_band_left_alone(self):
+        for name, value in (('rebalance_ejections_per_cycle', 5),
+                            ('percentage_to_cache', 0)):
+            CONF.set_override(name, value, 'simple_proportional_strategy')
+            self.addCleanup(CONF.clear_override, name,
+                            'simple_proportional_strategy')
+        # Balanced for weights of 3 to 2, when they move to 11 to 9 Ubuntu
+        # is one node, within 10% of its target of 11, over.
+        nodes = ([sb.NodeInput('io-%d' % n, 'IO', False, True, 'aaaa')
+                  for n in range(12)] +
+                 [sb.NodeInput('core-%d' % n, 'IO', False, True, 'bbbb')
+                  for n in range(8)])
+        weights = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights',
+                                    {'Ubuntu': 11, 'CoreOS': 9})
+        weights.start()
+        self.addCleanup(weights.stop)
+
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(copy.deepcopy(nodes), self.images,
+                                   self.flavors)
+        self.assertEqual([], strat.directives())
+
+        CONF.set_override('rebalance_hysteresis', 0,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_hysteresis',
+                        'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(copy.deepcopy(nodes), self.images,
+                                   self.flavors)
+        self.assertEqual(1, len(strat.directives()))
+
+    def test_unchanged_flavor_not_rebalanced_again(self):
+        CONF.set_override('rebalance_ejections_per_cycle', 1,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'rebalance_ejections_per_cycle',
+                        'simple_proportional_strategy')
+        nodes = [sb.NodeInput('io-0', 'IO', False, True, 'aaaa'),
+                 sb.NodeInput('io-1', 'IO', False, True, 'bbbb'),
+                 sb.NodeInput('io-2', 'IO')]
+        strat = sps.SimpleProportionalStrategy()
+        with mock.patch.object(sps, 'rebalance_nodes',
+                               wraps=sps.rebalance_nodes) as rebalance:
+            strat.update_current_state(nodes, self.images, self.flavors)
+            strat.directives()
+            self.assertEqual(1, rebalance.call_count)
+
+            strat.apply_node_changes([], [], [])
+            strat.update_current_state(None, self.images, self.flavors)
+            strat.directives()
+            self.assertEqual(1, rebalance.call_count)
+
+            strat.apply_node_changes(
+                [], [sb.NodeInput('io-2', 'IO', False, True, 'aaaa')], [])
+            strat.update_current_state(None, self.images, self.flavors)
+            strat.directives()
+            self.assertEqual(2, rebalance.call_count)
+
+    def test_disabled_by_default(self):
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        self.assertEqual([], [d for d in strat.directives()
+                              if isinstance(d, sb.EjectNode)])
+
+
+class TestHeldBackNodes(test_base.TestCase):
+
+    def test_held_back_nodes_not_cached(self):
+        patcher = mock.patch.object(cache_tracking.cache_times, 'held_back',
+                                    return_value=set(['io-0', 'io-1']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        nodes = [sb.NodeInput('io-%d' % n, 'IO') for n in range(3)]
+        directives = sps.cache_nodes(nodes, 3, sb_test.TEST_IMAGES)
+        self.assertEqual(['io-2'], [d.node_uuid for d in directives])
+
+
+class TestNodeChanges(test_base.TestCase):
+
+    def setUp(self):
+        super(TestNodeChanges, self).setUp()
+        CONF.set_override('percentage_to_cache', 0.5,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'percentage_to_cache',
+                        'simple_proportional_strategy')
+        CONF.set_override('retirement_debounce_cycles', 1,
+                          'simple_proportional_strategy')
+        self.addCleanup(CONF.clear_override, 'retirement_debounce_cycles',
+                        'simple_proportional_strategy')
+        self.images = sb_test.TEST_IMAGES
+        self.image_uuid = self.images[0].uuid
+        self.flavors = [sb.FlavorInput('IO', lambda n: True)]
+
+    def nodes(self):
+        return ([sb.NodeInput('io-%d' % n, 'IO', False, True,
+                              self.image_uuid) for n in range(4)] +
+                [sb.NodeInput('free-%d' % n, 'IO') for n in range(6)])
+
+    def test_node_index(self):
+        index = sps.NodeIndex()
+        index.rebuild(self.nodes())
+        self.assertEqual((10, 4), (index.unprovisioned['IO'],
+                                   index.cached['IO']))
+        index.add(sb.NodeInput('io-0', 'IO', True))
+        index.add(sb.NodeInput('io-1', 'IO', False, True, 'retired'))
+        index.remove('free-0')
+        self.assertEqual((8, 3), (index.unprovisioned['IO'],
+                                  index.cached['IO']))
+        self.assertEqual(set([self.image_uuid, 'retired']),
+                         index.cached_image_uuids())
+        self.assertEqual(['io-1'], [node.node_uuid for node in
+                                    index.cached_without([self.image_uuid])])
+        self.assertEqual(9, len(index.flavor_nodes('IO')))
+
+    def test_changes_match_full_update(self):
+        full = sps.SimpleProportionalStrategy()
+        incremental = sps.SimpleProportionalStrategy()
+        incremental.update_current_state(self.nodes(), self.images,
+                                         self.flavors)
+        incremental.directives()
+
+        nodes = self.nodes()
+        nodes[0].cached_image_uuid = 'retired'
+        nodes[1].provisioned = True
+        nodes.append(sb.NodeInput('free-6', 'IO'))
+        incremental.apply_node_changes([nodes[-1]], nodes[:2], ['free-5'])
+        incremental.update_current_state(None, self.images, self.flavors)
+        del nodes[-2]
+        full.update_current_state(copy.deepcopy(nodes), self.images,
+                                  self.flavors)
+
+        def summary(directives):
+            return (set(d.node_uuid for d in directives
+                        if isinstance(d, sb.EjectNode)),
+                    len([d for d in directives
+                         if isinstance(d, sb.CacheNode)]))
+        # 8 unprovisioned nodes once io-0 is ejected, 2 of them cached.
+        self.assertEqual((set(['io-0']), 2), summary(full.directives()))
+        self.assertEqual((set(['io-0']), 2),
+                         summary(incremental.directives()))
+
+    def test_changes_unmark_nodes(self):
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        node = sb.NodeInput('io-0', 'IO', False, True, 'retired')
+        strat.apply_node_changes([], [node], [])
+        strat.update_current_state(None, self.images, self.flavors)
+        self.assertIn('io-0', [d.node_uuid for d in strat.directives()])
+        # Unchanged next cycle, the node is ejected again until it is.
+        self.assertFalse(node.provisioned)
+        strat.apply_node_changes([], [], [])
+        strat.update_current_state(None, self.images, self.flavors)
+        self.assertIn('io-0', [d.node_uuid for d in strat.directives()])
+
+    def test_hit_rate_from_changes(self):
+        for name, value in (('percentage_to_cache', 0.1),
+                            ('target_hit_rate', 0.8),
+                            ('controller_smoothing', 1.0),
+                            ('controller_max_step', 0.05)):
+            CONF.set_override(name, value, 'simple_proportional_strategy')
+            self.addCleanup(CONF.clear_override, name,
+                            'simple_proportional_strategy')
+        strat = sps.SimpleProportionalStrategy()
+        strat.update_current_state(self.nodes(), self.images, self.flavors)
+        # A cached and an uncached node were deployed.
+        strat.apply_node_changes(
+            [], [sb.NodeInput('io-0', 'IO', True, False, '',
+                              self.image_uuid),
+                 sb.NodeInput('free-0', 'IO', True, False, '',
+                              self.image_uuid)], [])
+        # A hit rate of 0.5 is 0.3 under target.
+        self.assertAlmostEqual(0.1 + 0.1 * 0.3 + 0.02 * 0.3,
+                               strat.percentage_for('IO'))
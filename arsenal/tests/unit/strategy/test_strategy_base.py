@@ -32,6 +32,7 @@ import mock
 from oslo_config import cfg
 import six
 
+from arsenal.common import util
 from arsenal.strategy import base as sb
 from arsenal.tests.unit import base as test_base
 
@@ -174,6 +175,16 @@ class TestStrategyBase(test_base.TestCase):
                          sb.find_flavor_differences(TEST_FLAVORS,
                                                     flavors_with_all_diffs))
 
+    def test_node_is_caching(self):
+        for status, provisioned, expected in (('', False, False),
+                                              ('caching', False, True),
+                                              ('cached', False, False),
+                                              ('failed', False, False),
+                                              ('caching', True, False)):
+            node = sb.NodeInput('io-0', 'IO', provisioned,
+                                cache_status=status)
+            self.assertEqual(expected, node.is_caching())
+
 
 class TestNodeStatistics(test_base.TestCase):
 
@@ -608,3 +619,63 @@ class TestImageWeights(test_base.TestCase):
             self.assertIn(image.name, expected_names,
                           "Found an unexpected image cached. Image had a "
                           "zero weight. Image name %s" % (image.name))
+
+
+class TestAdaptiveImageWeights(test_base.TestCase):
+
+    def setUp(self):
+        super(TestAdaptiveImageWeights, self).setUp()
+        CONF.set_override('adaptive_image_weights', True, 'strategy')
+        self.addCleanup(CONF.clear_override, 'adaptive_image_weights',
+                        'strategy')
+        CONF.set_override('image_demand_half_life', 3600, 'strategy')
+        self.addCleanup(CONF.clear_override, 'image_demand_half_life',
+                        'strategy')
+        weights = mock.patch.object(sb._load_image_weights_file,
+                                    'image_weights',
+                                    {'Ubuntu': 3, 'CoreOS': 1})
+        weights.start()
+        self.addCleanup(weights.stop)
+        sb.image_demand.clear()
+        self.addCleanup(sb.image_demand.clear)
+
+        self.clock = util.VirtualClock()
+        clock = mock.patch.object(util.now, 'clock', self.clock)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.images = [sb.ImageInput('Ubuntu', 'aaaa', 'abcd'),
+                       sb.ImageInput('CoreOS', 'bbbb', 'efgh')]
+
+    def deploy(self, image_uuid, count):
+        nodes = [sb.NodeInput('node-%d' % n, 'compute', True, False, '',
+                              image_uuid) for n in range(count)]
+        sb.image_demand.record(nodes, self.images)
+
+    def test_priors_without_demand(self):
+        self.assertEqual({'Ubuntu': 7.5, 'CoreOS': 2.5},
+                         sb.get_image_weights(['Ubuntu', 'CoreOS']))
+
+    def test_demand_blended_with_priors(self):
+        self.deploy('bbbb', 10)
+        # Deployments of unknown images are ignored.
+        self.deploy('zzzz', 10)
+        self.assertEqual({'Ubuntu': 7.5, 'CoreOS': 12.5},
+                         sb.get_image_weights(['Ubuntu', 'CoreOS']))
+
+    def test_demand_decays(self):
+        self.deploy('bbbb', 10)
+        self.clock.advance(3600)
+        self.deploy('bbbb', 5)
+        self.assertEqual({'CoreOS': 10.0}, sb.image_demand.current_counts())
+        self.clock.advance(7200)
+        self.assertEqual({'CoreOS': 2.5}, sb.image_demand.current_counts())
+
+    def test_off_by_default(self):
+        CONF.clear_override('adaptive_image_weights', 'strategy')
+        self.deploy('bbbb', 10)
+        self.assertEqual({'Ubuntu': 3, 'CoreOS': 1},
+                         sb.get_image_weights(['Ubuntu', 'CoreOS']))
+
+    def test_blend_all_zero_keeps_configured(self):
+        self.assertEqual({'Ubuntu': 0},
+                         sb.blend_image_weights({'Ubuntu': 0}, {}))